@@ -0,0 +1,397 @@
+# citas/agenda.py
+"""
+Cálculo de disponibilidad de la agenda de veterinarios.
+
+Las consultas ocupadas de cada veterinario se agrupan por día en listas
+ordenadas de intervalos (inicio, fin) ya fusionados, de modo que los huecos
+libres se obtienen recorriendo cada lista una sola vez.
+
+También centraliza la prevención de citas solapadas para un mismo
+veterinario: en PostgreSQL la garantía la da la restricción de exclusión
+``citas_consulta_sin_solape`` (ver migración 0003). Con la tabla particionada
+por año (ver core.particiones) esa restricción existe en cada partición y no
+ve citas de la partición vecina, así que las reservas que pueden cruzarse con
+una cita del otro lado de un 1 de enero se serializan además con un advisory
+lock por veterinario antes de buscar solapes. SQLite no la soporta y
+ahí las reservas de cada veterinario solo se serializan con un
+``threading.Lock`` del proceso: no protege entre procesos (varios workers o
+un comando en paralelo) y sirve solo para desarrollo y pruebas, no como
+garantía.
+"""
+import datetime
+import hashlib
+import threading
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from authentication.models import Rol
+from .models import Consulta
+
+HORARIO_INICIO = getattr(settings, 'CITAS_HORARIO_INICIO', datetime.time(9, 0))
+HORARIO_FIN = getattr(settings, 'CITAS_HORARIO_FIN', datetime.time(19, 0))
+# 0 = lunes ... 6 = domingo
+DIAS_ATENCION = getattr(settings, 'CITAS_DIAS_ATENCION', (0, 1, 2, 3, 4, 5))
+PASO_MINUTOS = getattr(settings, 'CITAS_PASO_MINUTOS', 15)
+MAX_DIAS_RANGO = getattr(settings, 'CITAS_MAX_DIAS_DISPONIBILIDAD', 62)
+# Ninguna consulta dura más que esto; acota cuánto mirar hacia atrás del rango
+MAX_DURACION_MINUTOS = getattr(settings, 'CITAS_MAX_DURACION_MINUTOS', 24 * 60)
+
+ESTADOS_LIBERAN_AGENDA = ('CANCELADA',)
+RESTRICCION_SOLAPE = 'citas_consulta_sin_solape'
+
+# Locks por veterinario (repartidos en franjas) para bases sin exclusión ni SELECT ... FOR UPDATE.
+# Son locales al proceso: dos procesos distintos pueden reservar el mismo horario.
+_BLOQUEOS_LOCALES = [threading.Lock() for _ in range(64)]
+# Primera clave de pg_advisory_xact_lock(clave, veterinario_id) cerca de un cambio de año
+CLAVE_BLOQUEO_CAMBIO_ANIO = 20030
+
+
+class SolapeAgenda(Exception):
+    """
+    La cita se cruza con otra cita activa del mismo veterinario.
+    """
+    def __init__(self, conflicto_id=None, conflictos=None):
+        self.conflicto_id = conflicto_id
+        self.conflictos = conflictos or []
+        super().__init__("El veterinario ya tiene una cita asignada en ese horario.")
+
+
+def fusionar_intervalos(intervalos):
+    """
+    Ordena y fusiona intervalos [inicio, fin) solapados o contiguos.
+    """
+    fusionados = []
+    for inicio, fin in sorted(intervalos):
+        if fusionados and inicio <= fusionados[-1][1]:
+            if fin > fusionados[-1][1]:
+                fusionados[-1][1] = fin
+        else:
+            fusionados.append([inicio, fin])
+    return [(inicio, fin) for inicio, fin in fusionados]
+
+
+def huecos_libres(ocupados, apertura, cierre):
+    """
+    Devuelve los huecos [inicio, fin) entre apertura y cierre que no están
+    cubiertos por los intervalos ocupados (ya fusionados y ordenados).
+    """
+    huecos = []
+    cursor = apertura
+    for inicio, fin in ocupados:
+        if fin <= cursor:
+            continue
+        if inicio >= cierre:
+            break
+        if inicio > cursor:
+            huecos.append((cursor, inicio))
+        cursor = max(cursor, fin)
+    if cursor < cierre:
+        huecos.append((cursor, cierre))
+    return huecos
+
+
+def generar_bloques(huecos, apertura, duracion, paso):
+    """
+    Genera los inicios de bloque alineados a la grilla de la jornada
+    (apertura + k * paso) en los que cabe una consulta de la duración pedida.
+    """
+    bloques = []
+    for inicio, fin in huecos:
+        desfase = (inicio - apertura) % paso
+        actual = inicio if not desfase else inicio + (paso - desfase)
+        while actual + duracion <= fin:
+            bloques.append(actual)
+            actual += paso
+    return bloques
+
+
+def jornada(dia, tz=None):
+    """
+    Devuelve la apertura y el cierre (aware) de la jornada de un día.
+    """
+    tz = tz or timezone.get_current_timezone()
+    apertura = timezone.make_aware(datetime.datetime.combine(dia, HORARIO_INICIO), tz)
+    cierre = timezone.make_aware(datetime.datetime.combine(dia, HORARIO_FIN), tz)
+    return apertura, cierre
+
+
+def veterinarios_activos(veterinario_id=None):
+    """
+    Devuelve {id: nombre} de los veterinarios a considerar en la agenda.
+    """
+    if veterinario_id is not None:
+        usuarios = get_user_model().objects.filter(pk=veterinario_id)
+    else:
+        usuarios = get_user_model().objects.filter(is_active=True, rol__nombre=Rol.VETERINARIO)
+    return {
+        fila['id']: f"{fila['first_name']} {fila['last_name']}".strip() or fila['username']
+        for fila in usuarios.values('id', 'first_name', 'last_name', 'username')
+    }
+
+
+def agenda_ocupada(veterinario_ids, desde, hasta, excluir_id=None):
+    """
+    Carga en una sola consulta las citas activas que tocan [desde, hasta) y las
+    devuelve como {veterinario_id: {fecha_local: [(inicio, fin), ...]}} con los
+    intervalos de cada día fusionados.
+    """
+    filas = Consulta.objects.filter(
+        veterinario_id__in=veterinario_ids,
+        fecha__gte=desde - datetime.timedelta(minutes=MAX_DURACION_MINUTOS),
+        fecha__lt=hasta,
+    ).exclude(
+        estado__in=ESTADOS_LIBERAN_AGENDA
+    )
+    if excluir_id is not None:
+        filas = filas.exclude(pk=excluir_id)
+
+    por_dia = defaultdict(lambda: defaultdict(list))
+    for veterinario_id, fecha, duracion in filas.values_list('veterinario_id', 'fecha', 'duracion_estimada'):
+        inicio = timezone.localtime(fecha)
+        fin = inicio + datetime.timedelta(minutes=duracion)
+        if fin <= desde:
+            continue
+        # Una consulta que cruza la medianoche ocupa ambos días
+        dia = inicio.date()
+        while dia <= fin.date():
+            por_dia[veterinario_id][dia].append((inicio, fin))
+            dia += datetime.timedelta(days=1)
+
+    return {
+        veterinario_id: {dia: fusionar_intervalos(intervalos) for dia, intervalos in dias.items()}
+        for veterinario_id, dias in por_dia.items()
+    }
+
+
+def calcular_disponibilidad(fecha_desde, fecha_hasta, duracion, veterinario_id=None, paso=None):
+    """
+    Calcula los bloques libres por veterinario y día en [fecha_desde, fecha_hasta].
+
+    Usa dos consultas a la base de datos: una para los veterinarios y otra para
+    las citas del rango; el resto del cálculo se hace en memoria.
+    """
+    paso = datetime.timedelta(minutes=paso or PASO_MINUTOS)
+    duracion = datetime.timedelta(minutes=duracion)
+    ahora = timezone.localtime()
+
+    veterinarios = veterinarios_activos(veterinario_id)
+    desde, _ = jornada(fecha_desde)
+    hasta = timezone.make_aware(
+        datetime.datetime.combine(fecha_hasta + datetime.timedelta(days=1), datetime.time.min)
+    )
+    ocupados = agenda_ocupada(list(veterinarios), desde, hasta)
+
+    dias_habiles = []
+    dia = fecha_desde
+    while dia <= fecha_hasta:
+        if dia.weekday() in DIAS_ATENCION:
+            dias_habiles.append(dia)
+        dia += datetime.timedelta(days=1)
+
+    resultado = []
+    for vet_id, nombre in veterinarios.items():
+        agenda_vet = ocupados.get(vet_id, {})
+        dias = []
+        for dia in dias_habiles:
+            apertura, cierre = jornada(dia)
+            inicio_util = max(apertura, ahora) if dia == ahora.date() else apertura
+            if dia < ahora.date() or inicio_util >= cierre:
+                continue
+            huecos = huecos_libres(agenda_vet.get(dia, []), inicio_util, cierre)
+            bloques = generar_bloques(huecos, apertura, duracion, paso)
+            if bloques:
+                dias.append({
+                    'fecha': dia.isoformat(),
+                    'bloques': [bloque.strftime('%H:%M') for bloque in bloques],
+                })
+        resultado.append({
+            'veterinario': vet_id,
+            'veterinario_nombre': nombre,
+            'dias': dias,
+        })
+    return resultado
+
+
+def buscar_solape(veterinario_id, inicio, duracion, excluir_id=None):
+    """
+    Devuelve el id de una cita activa del veterinario que se cruce con
+    [inicio, inicio + duracion), o None si el horario está libre.
+    """
+    fin = inicio + datetime.timedelta(minutes=duracion)
+    candidatas = Consulta.objects.filter(
+        veterinario_id=veterinario_id,
+        fecha__gte=inicio - datetime.timedelta(minutes=MAX_DURACION_MINUTOS),
+        fecha__lt=fin,
+    ).exclude(
+        estado__in=ESTADOS_LIBERAN_AGENDA
+    )
+    if excluir_id is not None:
+        candidatas = candidatas.exclude(pk=excluir_id)
+
+    for cita_id, fecha, minutos in candidatas.values_list('id', 'fecha', 'duracion_estimada'):
+        if fecha + datetime.timedelta(minutes=minutos) > inicio:
+            return cita_id
+    return None
+
+
+def cruza_cambio_de_anio(inicio, fin):
+    """
+    Indica si una cita en [inicio, fin) podría solaparse con una cita de otra
+    partición anual: si hay un 1 de enero (UTC, el límite de las particiones)
+    entre ``inicio`` menos la duración máxima de una consulta y ``fin``.
+    """
+    desde = (inicio - datetime.timedelta(minutes=MAX_DURACION_MINUTOS)).astimezone(datetime.timezone.utc)
+    hasta = fin.astimezone(datetime.timezone.utc)
+    return any(
+        datetime.datetime(anio, 1, 1, tzinfo=datetime.timezone.utc) < hasta
+        for anio in range(desde.year + 1, hasta.year + 1)
+    )
+
+
+@contextmanager
+def bloqueo_agenda(veterinario_id, inicio=None, fin=None):
+    """
+    Serializa las reservas de un mismo veterinario cuando la base de datos no
+    puede hacerlo por sí sola. En PostgreSQL la restricción de exclusión
+    rechaza la segunda reserva concurrente dentro de una partición; solo si
+    [inicio, fin) está cerca de un cambio de año se toma un advisory lock del
+    veterinario hasta el fin de la transacción. En SQLite el lock es del
+    proceso, así que solo evita solapes entre hilos del mismo proceso.
+    """
+    if connection.vendor == 'sqlite':
+        lock = _BLOQUEOS_LOCALES[veterinario_id % len(_BLOQUEOS_LOCALES)]
+    else:
+        lock = nullcontext()
+
+    with lock, transaction.atomic():
+        if connection.vendor == 'postgresql':
+            if inicio is not None and cruza_cambio_de_anio(inicio, fin):
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        "SELECT pg_advisory_xact_lock(%s, %s)", [CLAVE_BLOQUEO_CAMBIO_ANIO, veterinario_id]
+                    )
+        elif connection.features.has_select_for_update:
+            list(get_user_model().objects.select_for_update().filter(pk=veterinario_id).values_list('pk'))
+        yield
+
+
+def guardar_sin_solape(guardar, veterinario_id, inicio, duracion, estado=None, excluir_id=None):
+    """
+    Ejecuta ``guardar()`` solo si el horario del veterinario está libre.
+
+    Lanza SolapeAgenda tanto si el cruce se detecta antes de escribir como si
+    lo detecta la restricción de la base de datos por una reserva concurrente.
+    """
+    if estado in ESTADOS_LIBERAN_AGENDA:
+        return guardar()
+
+    try:
+        with bloqueo_agenda(veterinario_id, inicio, inicio + datetime.timedelta(minutes=duracion)):
+            conflicto_id = buscar_solape(veterinario_id, inicio, duracion, excluir_id)
+            if conflicto_id is not None:
+                raise SolapeAgenda(conflicto_id)
+            return guardar()
+    except IntegrityError as exc:
+        if RESTRICCION_SOLAPE in str(exc):
+            raise SolapeAgenda() from exc
+        raise
+
+
+def citas_en_ventana(desde, hasta, veterinario_id=None):
+    """
+    Citas cuyo inicio cae en la ventana [desde, hasta), opcionalmente de un veterinario.
+    """
+    citas = Consulta.objects.filter(fecha__gte=desde, fecha__lt=hasta)
+    if veterinario_id is not None:
+        citas = citas.filter(veterinario_id=veterinario_id)
+    return citas
+
+
+def etag_calendario(citas, *partes):
+    """
+    ETag de la ventana a partir de la última modificación y la cantidad de citas,
+    de modo que altas, cambios y bajas invaliden la respuesta en una sola consulta.
+    """
+    resumen = citas.aggregate(ultima=Max('updated_at'), total=Count('id'))
+    base = '|'.join(str(parte) for parte in (*partes, resumen['ultima'], resumen['total']))
+    return '"%s"' % hashlib.md5(base.encode()).hexdigest()
+
+
+def columnas_calendario(citas):
+    """
+    Devuelve las citas como columnas paralelas (un arreglo por campo) leídas con
+    una única consulta con joins a mascota y veterinario.
+    """
+    columnas = {
+        'id': [], 'inicio': [], 'fin': [], 'estado': [], 'tipo': [],
+        'mascota': [], 'mascota_nombre': [], 'veterinario': [], 'veterinario_nombre': [],
+    }
+    filas = citas.order_by('fecha', 'id').values_list(
+        'id', 'fecha', 'duracion_estimada', 'estado', 'tipo',
+        'mascota_id', 'mascota__nombre',
+        'veterinario_id', 'veterinario__first_name', 'veterinario__last_name', 'veterinario__username',
+    )
+    for (cita_id, fecha, duracion, estado, tipo, mascota_id, mascota_nombre,
+         veterinario_id, nombre, apellido, username) in filas:
+        inicio = timezone.localtime(fecha)
+        columnas['id'].append(cita_id)
+        columnas['inicio'].append(inicio.isoformat())
+        columnas['fin'].append((inicio + datetime.timedelta(minutes=duracion)).isoformat())
+        columnas['estado'].append(estado)
+        columnas['tipo'].append(tipo)
+        columnas['mascota'].append(mascota_id)
+        columnas['mascota_nombre'].append(mascota_nombre)
+        columnas['veterinario'].append(veterinario_id)
+        columnas['veterinario_nombre'].append(f"{nombre} {apellido}".strip() or username)
+    return columnas
+
+
+def guardar_serie_sin_solape(citas):
+    """
+    Inserta con un solo bulk_create una serie de citas (sin guardar) de un mismo
+    veterinario, validándolas contra su agenda con una única consulta de rango.
+
+    Lanza SolapeAgenda con el detalle de cada cita de la serie que se cruza con
+    una cita existente.
+    """
+    veterinario_id = citas[0].veterinario_id
+    intervalos = sorted(
+        (cita.fecha, cita.fecha + datetime.timedelta(minutes=cita.duracion_estimada))
+        for cita in citas
+    )
+    try:
+        with bloqueo_agenda(veterinario_id, intervalos[0][0], max(fin for _, fin in intervalos)):
+            existentes = Consulta.objects.filter(
+                veterinario_id=veterinario_id,
+                fecha__gte=intervalos[0][0] - datetime.timedelta(minutes=MAX_DURACION_MINUTOS),
+                fecha__lt=max(fin for _, fin in intervalos),
+            ).exclude(
+                estado__in=ESTADOS_LIBERAN_AGENDA
+            ).values_list('id', 'fecha', 'duracion_estimada')
+            ocupados = sorted(
+                (fecha, fecha + datetime.timedelta(minutes=minutos), cita_id)
+                for cita_id, fecha, minutos in existentes
+            )
+
+            conflictos = []
+            for inicio, fin in intervalos:
+                for ocupado_inicio, ocupado_fin, cita_id in ocupados:
+                    if ocupado_inicio >= fin:
+                        break
+                    if ocupado_fin > inicio:
+                        conflictos.append({'fecha': timezone.localtime(inicio).isoformat(), 'conflicto': cita_id})
+                        break
+            if conflictos:
+                raise SolapeAgenda(conflictos[0]['conflicto'], conflictos)
+
+            return Consulta.objects.bulk_create(citas)
+    except IntegrityError as exc:
+        if RESTRICCION_SOLAPE in str(exc):
+            raise SolapeAgenda() from exc
+        raise
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class CitasConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "citas"
+
+    def ready(self):
+        import citas.signals
@@ -0,0 +1,122 @@
+# citas/management/commands/benchmark_agenda.py
+import datetime
+import random
+import statistics
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from authentication.models import Rol
+from citas.agenda import SolapeAgenda, guardar_sin_solape, jornada
+from citas.models import Consulta
+from mascotas.models import Mascota
+
+MARCA = '[benchmark-agenda]'
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide la contención de reservas concurrentes sobre la agenda y verifica que "
+        "no queden citas solapadas. Crea citas marcadas en un día lejano y las "
+        "elimina al terminar (salvo --conservar)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hilos', type=int, default=8)
+        parser.add_argument('--reservas', type=int, default=50, help="Intentos por hilo")
+        parser.add_argument('--bloques', type=int, default=20,
+                            help="Bloques de 30 minutos en disputa por veterinario")
+        parser.add_argument('--conservar', action='store_true')
+
+    def handle(self, *args, **options):
+        mascota = Mascota.objects.first()
+        veterinarios = list(
+            get_user_model().objects.filter(rol__nombre=Rol.VETERINARIO).values_list('id', flat=True)
+        )
+        if mascota is None or not veterinarios:
+            raise CommandError("Se necesita al menos una mascota y un veterinario.")
+
+        dia = timezone.localdate() + datetime.timedelta(days=random.randint(3000, 4000))
+        apertura, _ = jornada(dia)
+        bloques = [apertura + datetime.timedelta(minutes=30 * i) for i in range(options['bloques'])]
+
+        resultados = {'ok': 0, 'conflictos': 0, 'errores': 0}
+        latencias = []
+        candado = threading.Lock()
+
+        def trabajador():
+            try:
+                for _ in range(options['reservas']):
+                    veterinario_id = random.choice(veterinarios)
+                    # Desfase de 0 o 15 minutos para forzar solapes parciales, no solo iguales
+                    inicio = random.choice(bloques) + datetime.timedelta(minutes=random.choice((0, 15)))
+                    t0 = time.perf_counter()
+                    try:
+                        guardar_sin_solape(
+                            lambda: Consulta.objects.create(
+                                mascota=mascota, veterinario_id=veterinario_id, fecha=inicio,
+                                duracion_estimada=30, motivo=MARCA, tipo='RUTINA',
+                            ),
+                            veterinario_id, inicio, 30,
+                        )
+                        clave = 'ok'
+                    except SolapeAgenda:
+                        clave = 'conflictos'
+                    except Exception as e:  # noqa: BLE001 - se reporta en el resumen
+                        clave = 'errores'
+                        self.stderr.write(f"Error: {e}")
+                    with candado:
+                        resultados[clave] += 1
+                        latencias.append(time.perf_counter() - t0)
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=trabajador) for _ in range(options['hilos'])]
+        inicio_total = time.perf_counter()
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        total = time.perf_counter() - inicio_total
+
+        creadas = Consulta.objects.filter(motivo=MARCA, fecha__date=dia)
+        solapes = self._contar_solapes(creadas)
+
+        latencias.sort()
+        intentos = len(latencias)
+        self.stdout.write(f"Motor: {connection.vendor}  hilos: {options['hilos']}  intentos: {intentos}")
+        self.stdout.write(
+            f"Reservadas: {resultados['ok']}  conflictos: {resultados['conflictos']}  "
+            f"errores: {resultados['errores']}"
+        )
+        if intentos:
+            self.stdout.write(
+                f"Throughput: {intentos / total:.1f} intentos/s  "
+                f"p50: {statistics.median(latencias) * 1000:.1f} ms  "
+                f"p95: {latencias[int(intentos * 0.95) - 1] * 1000:.1f} ms"
+            )
+        if solapes:
+            self.stdout.write(self.style.ERROR(f"Citas solapadas detectadas: {solapes}"))
+        else:
+            self.stdout.write(self.style.SUCCESS("Sin citas solapadas."))
+
+        if not options['conservar']:
+            creadas.delete()
+
+    def _contar_solapes(self, citas):
+        solapes = 0
+        por_veterinario = {}
+        for veterinario_id, fecha, duracion in citas.values_list('veterinario_id', 'fecha', 'duracion_estimada'):
+            por_veterinario.setdefault(veterinario_id, []).append(
+                (fecha, fecha + datetime.timedelta(minutes=duracion))
+            )
+        for intervalos in por_veterinario.values():
+            intervalos.sort()
+            for anterior, siguiente in zip(intervalos, intervalos[1:]):
+                if siguiente[0] < anterior[1]:
+                    solapes += 1
+        return solapes
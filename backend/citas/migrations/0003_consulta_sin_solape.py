@@ -0,0 +1,95 @@
+from django.db import migrations
+
+# Rango [fecha, fecha + duracion_estimada) mantenido por trigger, para que también
+# lo respeten las inserciones masivas y las escrituras hechas fuera del ORM.
+SQL_CREAR = [
+    "CREATE EXTENSION IF NOT EXISTS btree_gist",
+    "ALTER TABLE citas_consulta ADD COLUMN IF NOT EXISTS periodo tstzrange",
+    """
+    CREATE OR REPLACE FUNCTION citas_consulta_periodo() RETURNS trigger AS $$
+    BEGIN
+        NEW.periodo := tstzrange(
+            NEW.fecha, NEW.fecha + make_interval(mins => NEW.duracion_estimada), '[)'
+        );
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER citas_consulta_periodo
+    BEFORE INSERT OR UPDATE OF fecha, duracion_estimada ON citas_consulta
+    FOR EACH ROW EXECUTE FUNCTION citas_consulta_periodo()
+    """,
+    """
+    UPDATE citas_consulta
+    SET periodo = tstzrange(fecha, fecha + make_interval(mins => duracion_estimada), '[)')
+    """,
+]
+
+SQL_SOLAPES_EXISTENTES = """
+    SELECT a.id, b.id
+    FROM citas_consulta a
+    JOIN citas_consulta b
+      ON a.veterinario_id = b.veterinario_id
+     AND a.id < b.id
+     AND a.periodo && b.periodo
+    WHERE a.estado <> 'CANCELADA' AND b.estado <> 'CANCELADA'
+    LIMIT 20
+"""
+
+SQL_RESTRICCION = """
+    ALTER TABLE citas_consulta
+    ADD CONSTRAINT citas_consulta_sin_solape
+    EXCLUDE USING gist (veterinario_id WITH =, periodo WITH &&)
+    WHERE (estado <> 'CANCELADA')
+"""
+
+SQL_REVERTIR = [
+    "ALTER TABLE citas_consulta DROP CONSTRAINT IF EXISTS citas_consulta_sin_solape",
+    "DROP TRIGGER IF EXISTS citas_consulta_periodo ON citas_consulta",
+    "DROP FUNCTION IF EXISTS citas_consulta_periodo()",
+    "ALTER TABLE citas_consulta DROP COLUMN IF EXISTS periodo",
+]
+
+
+def crear_restriccion_solape(apps, schema_editor):
+    """
+    Crea la columna de rango y la restricción de exclusión (solo PostgreSQL).
+    En otros motores la prevención de solapes queda a cargo de citas.agenda.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    for sql in SQL_CREAR:
+        schema_editor.execute(sql)
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(SQL_SOLAPES_EXISTENTES)
+        solapes = cursor.fetchall()
+    if solapes:
+        pares = ', '.join(f"{a}/{b}" for a, b in solapes)
+        raise RuntimeError(
+            f"Existen citas solapadas para un mismo veterinario ({pares}). "
+            "Reprograme o cancele esas citas antes de aplicar esta migración."
+        )
+
+    schema_editor.execute(SQL_RESTRICCION)
+
+
+def eliminar_restriccion_solape(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    for sql in SQL_REVERTIR:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('citas', '0002_consulta_peso_consulta_sintomas_consulta_temperatura_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_restriccion_solape, eliminar_restriccion_solape),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.0.6 on 2026-10-18 00:13
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("citas", "0003_consulta_sin_solape"),
+        ("mascotas", "0001_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="consulta",
+            index=models.Index(
+                fields=["-fecha", "id"], name="citas_consulta_fecha_id_idx"
+            ),
+        ),
+    ]
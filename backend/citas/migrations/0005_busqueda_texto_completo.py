@@ -0,0 +1,70 @@
+# Generated by Django 5.0.6 on 2026-10-18 00:14
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+# Trigger del tsvector en español, índice GIN sobre él e índices de trigramas
+# para la búsqueda tolerante a errores de tipeo (solo PostgreSQL)
+SQL_CREAR = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """
+    CREATE OR REPLACE FUNCTION citas_consulta_busqueda() RETURNS trigger AS $$
+    BEGIN
+        NEW.busqueda := setweight(to_tsvector('spanish', coalesce(NEW.diagnostico, '')), 'A') ||
+            setweight(to_tsvector('spanish', coalesce(NEW.motivo, '')), 'B');
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER citas_consulta_busqueda
+    BEFORE INSERT OR UPDATE OF diagnostico, motivo ON citas_consulta
+    FOR EACH ROW EXECUTE FUNCTION citas_consulta_busqueda()
+    """,
+    """
+    UPDATE citas_consulta SET busqueda =
+        setweight(to_tsvector('spanish', coalesce(diagnostico, '')), 'A') ||
+        setweight(to_tsvector('spanish', coalesce(motivo, '')), 'B')
+    """,
+    "CREATE INDEX IF NOT EXISTS citas_consulta_busqueda_gin ON citas_consulta USING gin (busqueda)",
+    "CREATE INDEX IF NOT EXISTS citas_consulta_diagnostico_trgm ON citas_consulta USING gin (diagnostico gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS citas_consulta_motivo_trgm ON citas_consulta USING gin (motivo gin_trgm_ops)",
+]
+
+SQL_REVERTIR = [
+    "DROP TRIGGER IF EXISTS citas_consulta_busqueda ON citas_consulta",
+    "DROP FUNCTION IF EXISTS citas_consulta_busqueda()",
+    "DROP INDEX IF EXISTS citas_consulta_busqueda_gin",
+    "DROP INDEX IF EXISTS citas_consulta_diagnostico_trgm",
+    "DROP INDEX IF EXISTS citas_consulta_motivo_trgm",
+]
+
+
+def crear_indice_busqueda(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        for sql in SQL_CREAR:
+            schema_editor.execute(sql)
+
+
+def revertir_indice_busqueda(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        for sql in SQL_REVERTIR:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("citas", "0004_indices_paginacion_cursor"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="consulta",
+            name="busqueda",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        # Trigger del tsvector e índices GIN/trigramas (solo PostgreSQL)
+        migrations.RunPython(crear_indice_busqueda, revertir_indice_busqueda),
+    ]
@@ -1,6 +1,7 @@
 # backend/citas/models.py (corrección completa)
 from django.db import models
 from django.conf import settings
+from django.contrib.postgres.search import SearchVectorField
 from core.models import BaseModel
 from mascotas.models import Mascota
 from core.validators import validar_fecha_futura, validar_cantidad_positiva
@@ -44,15 +45,22 @@ class Consulta(BaseModel):
     sintomas = models.TextField(blank=True, null=True)
     tratamiento = models.TextField(blank=True, null=True)
     
+    # Vector de búsqueda (motivo + diagnóstico) que mantiene un trigger en PostgreSQL
+    busqueda = SearchVectorField(null=True, editable=False)
+    
     def __str__(self):
         return f"Consulta para {self.mascota.nombre} - {self.fecha}"
     
     class Meta:
         verbose_name = "Consulta"
         verbose_name_plural = "Consultas"
+        # En PostgreSQL la restricción de exclusión citas_consulta_sin_solape
+        # (migración 0003) impide citas solapadas para un mismo veterinario.
         indexes = [
             models.Index(fields=['mascota']),
             models.Index(fields=['veterinario']),
             models.Index(fields=['fecha']),
             models.Index(fields=['estado']),
+            # Paginación por cursor sobre el orden (-fecha, id) del listado
+            models.Index(fields=['-fecha', 'id'], name='citas_consulta_fecha_id_idx'),
         ]
\ No newline at end of file
@@ -43,4 +43,40 @@ class ConsultaSerializer(serializers.ModelSerializer):
         if 'peso_actual' in internal_data and internal_data['peso_actual'] is not None:
             internal_data['peso'] = internal_data.pop('peso_actual')
         
-        return super().to_internal_value(internal_data)
\ No newline at end of file
+        return super().to_internal_value(internal_data)
+
+class SerieConsultaSerializer(serializers.Serializer):
+    """
+    Parámetros de una serie de citas: o bien repeticiones cada N días,
+    o bien desfases fijos (en días) desde la primera cita.
+    """
+    repeticiones = serializers.IntegerField(min_value=2, max_value=52, required=False)
+    intervalo_dias = serializers.IntegerField(min_value=1, max_value=365, required=False)
+    desfases_dias = serializers.ListField(
+        child=serializers.IntegerField(min_value=1, max_value=730),
+        max_length=51,
+        required=False
+    )
+
+    def validate(self, data):
+        por_intervalo = 'repeticiones' in data or 'intervalo_dias' in data
+        if por_intervalo == ('desfases_dias' in data):
+            raise serializers.ValidationError(
+                "Indique 'repeticiones' e 'intervalo_dias', o bien 'desfases_dias'."
+            )
+        if por_intervalo and not ('repeticiones' in data and 'intervalo_dias' in data):
+            raise serializers.ValidationError(
+                "'repeticiones' e 'intervalo_dias' deben indicarse juntos."
+            )
+        if 'desfases_dias' in data and len(set(data['desfases_dias'])) != len(data['desfases_dias']):
+            raise serializers.ValidationError({'desfases_dias': "Los desfases no pueden repetirse."})
+        return data
+
+    def desfases(self):
+        """
+        Días de cada cita respecto de la primera, incluida la primera (0).
+        """
+        data = self.validated_data
+        if 'desfases_dias' in data:
+            return [0] + sorted(data['desfases_dias'])
+        return [k * data['intervalo_dias'] for k in range(data['repeticiones'])]
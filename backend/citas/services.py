@@ -0,0 +1,99 @@
+# citas/services.py
+"""
+Servicios de escritura de citas que involucran al historial médico.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from historial_medico.models import HistorialMedico, TipoConsulta, Consulta as HistorialConsulta
+from mascotas.cache import invalidar_historial
+from mascotas.models import Mascota
+
+TIPO_CONSULTA_POR_TIPO_CITA = {
+    'RUTINA': 'Control de rutina',
+    'EMERGENCIA': 'Emergencia',
+    'SEGUIMIENTO': 'Seguimiento',
+}
+
+CAMPOS_HISTORIAL = [
+    'veterinario', 'tipo_consulta', 'fecha', 'motivo_consulta', 'diagnostico',
+    'observaciones', 'sintomas', 'tratamiento', 'temperatura', 'peso', 'updated_at',
+]
+
+# nombre -> id de TipoConsulta; se limpia desde citas.signals al modificar tipos
+_tipos_consulta = {}
+
+
+def limpiar_cache_tipos_consulta():
+    _tipos_consulta.clear()
+
+
+def resolver_tipo_consulta(consulta):
+    """
+    Devuelve el id del TipoConsulta que corresponde al tipo de la cita,
+    creándolo la primera vez. Las siguientes llamadas no tocan la base de datos.
+    """
+    nombre = TIPO_CONSULTA_POR_TIPO_CITA.get(consulta.tipo, 'Control de rutina')
+    tipo_id = _tipos_consulta.get(nombre)
+    if tipo_id is None:
+        tipo = TipoConsulta.objects.filter(nombre=nombre).order_by('id').first()
+        if tipo is None:
+            tipo = TipoConsulta.objects.create(
+                nombre=nombre,
+                duracion_estimada=consulta.duracion_estimada,
+                descripcion=f'Tipo de consulta para {consulta.tipo.lower()}'
+            )
+        tipo_id = tipo.id
+        # Solo se cachea tras el commit: un id de una transacción revertida no debe quedar guardado
+        transaction.on_commit(lambda: _tipos_consulta.__setitem__(nombre, tipo_id))
+    return tipo_id
+
+
+@transaction.atomic(savepoint=False)
+def registrar_en_historial(consulta, datos):
+    """
+    Registra en el historial médico una cita ya marcada como completada.
+
+    ``consulta`` debe venir con mascota y veterinario cargados (select_related).
+    Cada cita tiene una sola entrada en el historial: completar de nuevo la
+    misma cita actualiza la entrada existente (también su fecha, que es la del
+    día en que se completa) en lugar de crear otra. La restricción única de la
+    tabla incluye la fecha porque está particionada (ver core.particiones), así
+    que la unicidad por cita se garantiza aquí, buscando la entrada con la
+    mascota bloqueada para que dos completados simultáneos no inserten ambos.
+    """
+    list(Mascota.objects.select_for_update().filter(pk=consulta.mascota_id).values_list('pk'))
+    historial, _ = HistorialMedico.objects.get_or_create(
+        mascota=consulta.mascota,
+        defaults={'veterinario': consulta.veterinario}
+    )
+    historial.mascota = consulta.mascota
+
+    entrada = HistorialConsulta(
+        historial=historial,
+        cita_relacionada=consulta.id,
+        veterinario=consulta.veterinario,
+        tipo_consulta_id=resolver_tipo_consulta(consulta),
+        fecha=timezone.localdate(),
+        motivo_consulta=consulta.motivo,
+        diagnostico=datos.get('diagnostico', ''),
+        observaciones=datos.get('observaciones', ''),
+        sintomas=datos.get('sintomas', ''),
+        tratamiento=datos.get('tratamiento', ''),
+        temperatura=consulta.temperatura,
+        peso=consulta.peso,
+        updated_at=timezone.now(),
+    )
+    entrada.pk = HistorialConsulta.objects.filter(
+        historial=historial, cita_relacionada=consulta.id
+    ).values_list('pk', flat=True).first()
+    # Sin save() ni señales: la invalidación del historial va abajo
+    if entrada.pk is None:
+        HistorialConsulta.objects.bulk_create([entrada])
+    else:
+        HistorialConsulta.objects.filter(pk=entrada.pk).update(**{
+            campo.attname: getattr(entrada, campo.attname)
+            for campo in (HistorialConsulta._meta.get_field(nombre) for nombre in CAMPOS_HISTORIAL)
+        })
+    invalidar_historial(consulta.mascota_id)
+    return entrada
@@ -0,0 +1,13 @@
+# citas/signals.py
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from historial_medico.models import TipoConsulta
+from .services import limpiar_cache_tipos_consulta
+
+@receiver(post_save, sender=TipoConsulta)
+@receiver(post_delete, sender=TipoConsulta)
+def invalidar_tipos_consulta(sender, **kwargs):
+    """
+    Descarta la resolución cacheada de tipos de consulta cuando cambia alguno
+    """
+    limpiar_cache_tipos_consulta()
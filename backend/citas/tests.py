@@ -1,3 +1,158 @@
-from django.test import TestCase
+import datetime
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from authentication.models import Rol
+from clientes.models import Cliente
+from mascotas.models import Especie, Raza, Mascota
+from historial_medico.models import Consulta as HistorialConsulta, TipoConsulta
+from .agenda import SolapeAgenda, cruza_cambio_de_anio, guardar_sin_solape
+from .models import Consulta
+from .services import limpiar_cache_tipos_consulta
+
+
+class CompletarConsultaTests(APITestCase):
+    def setUp(self):
+        rol = Rol.objects.get_or_create(nombre=Rol.VETERINARIO)[0]
+        self.veterinario = get_user_model().objects.create_user('vet', 'vet@tailpet.cl', 'clave', rol=rol)
+        self.client.force_authenticate(self.veterinario)
+        cliente = Cliente.objects.create(
+            nombre='Juan', apellido='Pérez', rut='12.345.678-9', telefono='123', email='juan@tailpet.cl'
+        )
+        especie = Especie.objects.create(nombre='Perro')
+        raza = Raza.objects.create(nombre='Mestizo', especie=especie)
+        mascota = Mascota.objects.create(
+            cliente=cliente, nombre='Toby', especie=especie, raza=raza,
+            fecha_nacimiento=datetime.date(2020, 1, 1), sexo='M'
+        )
+        self.consulta = Consulta.objects.create(
+            mascota=mascota, veterinario=self.veterinario, fecha=timezone.now() + datetime.timedelta(days=1),
+            duracion_estimada=30, motivo='Control anual', tipo='RUTINA'
+        )
+        self.url = f'/api/citas/consultas/{self.consulta.id}/completar/'
+        self.datos = {'diagnostico': 'Sano', 'temperatura': '38.5', 'peso_actual': '12.30'}
+        limpiar_cache_tipos_consulta()
+        self.addCleanup(limpiar_cache_tipos_consulta)
+
+    def test_completar_registra_en_historial(self):
+        response = self.client.patch(self.url, self.datos, format='json')
+
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['consulta']['estado'], 'COMPLETADA')
+        self.assertEqual(response.data['historial_consulta']['mascota_nombre'], 'Toby')
+        entrada = HistorialConsulta.objects.get(cita_relacionada=self.consulta.id)
+        self.assertEqual(entrada.diagnostico, 'Sano')
+        self.assertEqual(str(entrada.peso), '12.30')
+        self.assertEqual(entrada.tipo_consulta.nombre, 'Control de rutina')
+
+    def test_completar_con_historial_y_tipo_existentes_tiene_consultas_acotadas(self):
+        # Calienta el historial de la mascota y la caché de tipos de consulta
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(self.url, self.datos, format='json')
+        Consulta.objects.filter(pk=self.consulta.pk).update(estado='EN_CURSO')
+
+        # get_object + UPDATE de la cita + lock de la mascota + historial + búsqueda y
+        # UPDATE de la entrada, más el savepoint de la transacción
+        with self.assertNumQueries(8):
+            response = self.client.patch(self.url, {**self.datos, 'diagnostico': 'Otitis'}, format='json')
+
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(HistorialConsulta.objects.filter(cita_relacionada=self.consulta.id).count(), 1)
+        self.assertEqual(HistorialConsulta.objects.get(cita_relacionada=self.consulta.id).diagnostico, 'Otitis')
+        self.assertEqual(TipoConsulta.objects.count(), 1)
+
+    def test_completar_de_nuevo_otro_dia_no_duplica_la_entrada(self):
+        self.client.patch(self.url, self.datos, format='json')
+        # Completada otro día y luego reabierta (p. ej. tras reagendarla)
+        HistorialConsulta.objects.filter(cita_relacionada=self.consulta.id).update(
+            fecha=timezone.localdate() - datetime.timedelta(days=40)
+        )
+        Consulta.objects.filter(pk=self.consulta.pk).update(
+            estado='EN_CURSO', fecha=self.consulta.fecha + datetime.timedelta(days=3)
+        )
+
+        response = self.client.patch(self.url, {**self.datos, 'diagnostico': 'Otitis'}, format='json')
+
+        self.assertEqual(response.status_code, 200, response.data)
+        entrada = HistorialConsulta.objects.get(cita_relacionada=self.consulta.id)
+        self.assertEqual(response.data['historial_consulta']['id'], entrada.id)
+        self.assertEqual(entrada.diagnostico, 'Otitis')
+        self.assertEqual(entrada.fecha, timezone.localdate())
+
+
+class GuardarSinSolapeTests(APITestCase):
+    def setUp(self):
+        rol = Rol.objects.get_or_create(nombre=Rol.VETERINARIO)[0]
+        self.veterinario = get_user_model().objects.create_user('vet', 'vet@tailpet.cl', 'clave', rol=rol)
+        cliente = Cliente.objects.create(
+            nombre='Juan', apellido='Pérez', rut='12.345.678-9', telefono='123', email='juan@tailpet.cl'
+        )
+        especie = Especie.objects.create(nombre='Perro')
+        raza = Raza.objects.create(nombre='Mestizo', especie=especie)
+        self.mascota = Mascota.objects.create(
+            cliente=cliente, nombre='Toby', especie=especie, raza=raza,
+            fecha_nacimiento=datetime.date(2020, 1, 1), sexo='M'
+        )
+        self.inicio = (timezone.now() + datetime.timedelta(days=1)).replace(second=0, microsecond=0)
+        self.existente = self.reservar(self.inicio, 60)
+
+    def reservar(self, fecha, duracion, estado='PROGRAMADA'):
+        def guardar():
+            return Consulta.objects.create(
+                mascota=self.mascota, veterinario=self.veterinario, fecha=fecha,
+                duracion_estimada=duracion, motivo='Control', tipo='RUTINA', estado=estado
+            )
+        return guardar_sin_solape(guardar, self.veterinario.id, fecha, duracion, estado=estado)
+
+    def test_rechaza_cita_solapada(self):
+        with self.assertRaises(SolapeAgenda) as contexto:
+            self.reservar(self.inicio + datetime.timedelta(minutes=30), 30)
+
+        self.assertEqual(contexto.exception.conflicto_id, self.existente.id)
+        self.assertEqual(Consulta.objects.count(), 1)
+
+    def test_rechaza_cita_que_contiene_a_otra(self):
+        with self.assertRaises(SolapeAgenda):
+            self.reservar(self.inicio - datetime.timedelta(minutes=15), 120)
+
+    def test_acepta_citas_contiguas(self):
+        # Los intervalos son [inicio, fin): terminar justo cuando empieza otra no es solape
+        despues = self.reservar(self.inicio + datetime.timedelta(minutes=60), 30)
+        antes = self.reservar(self.inicio - datetime.timedelta(minutes=30), 30)
+
+        self.assertEqual(Consulta.objects.filter(pk__in=[despues.pk, antes.pk]).count(), 2)
+
+    def test_ignora_citas_canceladas(self):
+        Consulta.objects.filter(pk=self.existente.pk).update(estado='CANCELADA')
+
+        cita = self.reservar(self.inicio, 60)
+
+        self.assertEqual(cita.estado, 'PROGRAMADA')
+
+    def test_cita_cancelada_no_ocupa_agenda(self):
+        cancelada = self.reservar(self.inicio + datetime.timedelta(minutes=15), 30, estado='CANCELADA')
+
+        self.assertEqual(cancelada.estado, 'CANCELADA')
+        self.assertEqual(Consulta.objects.count(), 2)
+
+    def test_rechaza_solape_a_traves_del_cambio_de_anio(self):
+        anio_nuevo = datetime.datetime(self.inicio.year + 1, 1, 1, tzinfo=datetime.timezone.utc)
+        self.reservar(anio_nuevo - datetime.timedelta(minutes=30), 60)
+
+        with self.assertRaises(SolapeAgenda):
+            self.reservar(anio_nuevo, 30)
+
+    def test_detecta_citas_cerca_del_cambio_de_anio(self):
+        utc = datetime.timezone.utc
+        anio_nuevo = datetime.datetime(2026, 1, 1, tzinfo=utc)
+        hora = datetime.timedelta(hours=1)
+
+        # Termina después del 1 de enero, o empieza antes de que termine una cita del 31
+        self.assertTrue(cruza_cambio_de_anio(anio_nuevo - hora, anio_nuevo + hora))
+        self.assertTrue(cruza_cambio_de_anio(anio_nuevo, anio_nuevo + hora))
+        self.assertTrue(cruza_cambio_de_anio(anio_nuevo + hora, anio_nuevo + 2 * hora))
+        self.assertFalse(cruza_cambio_de_anio(anio_nuevo - 2 * hora, anio_nuevo))
+        self.assertFalse(cruza_cambio_de_anio(datetime.datetime(2026, 6, 1, tzinfo=utc),
+                                              datetime.datetime(2026, 6, 1, 1, tzinfo=utc)))
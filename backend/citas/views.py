@@ -1,28 +1,215 @@
 # backend/citas/views.py (corregido con manejo de campos inconsistentes)
+import datetime
 import logging
 from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from django.db import transaction
-from rest_framework import viewsets, status, filters
+from rest_framework import viewsets, status, filters, serializers
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
+from core.busqueda import BusquedaClinicaMixin
 from .models import Consulta
-from .serializers import ConsultaSerializer
-from historial_medico.models import HistorialMedico, Consulta as HistorialConsulta, TipoConsulta
+from .serializers import ConsultaSerializer, SerieConsultaSerializer
+from .agenda import (calcular_disponibilidad, guardar_sin_solape, guardar_serie_sin_solape,
+                     SolapeAgenda, MAX_DIAS_RANGO, citas_en_ventana, etag_calendario,
+                     columnas_calendario)
+from .services import registrar_en_historial
+from historial_medico.models import Consulta as HistorialConsulta, Receta, DetalleReceta
 from historial_medico.serializers import ConsultaSerializer as HistorialConsultaSerializer
-from django.shortcuts import get_object_or_404
+from inventario.models import Medicamento
+from inventario.services import registrar_salidas, StockInsuficiente
 
 logger = logging.getLogger(__name__)
 
-class ConsultaViewSet(viewsets.ModelViewSet):
-    queryset = Consulta.objects.all().order_by('-fecha', 'id')
+
+def _parsear_limite(valor):
+    """
+    Convierte 'YYYY-MM-DD' o una fecha-hora ISO en un datetime aware (None si no es válido).
+    """
+    try:
+        fecha_hora = parse_datetime(valor)
+        if fecha_hora is None:
+            fecha = parse_date(valor)
+            if fecha is None:
+                return None
+            fecha_hora = datetime.datetime.combine(fecha, datetime.time.min)
+    except ValueError:
+        return None
+    if timezone.is_naive(fecha_hora):
+        fecha_hora = timezone.make_aware(fecha_hora)
+    return fecha_hora
+
+class ConsultaViewSet(BusquedaClinicaMixin, viewsets.ModelViewSet):
+    queryset = Consulta.objects.select_related('mascota__cliente', 'veterinario').order_by('-fecha', 'id')
     serializer_class = ConsultaSerializer
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['mascota', 'veterinario', 'fecha', 'estado', 'tipo']
     search_fields = ['motivo', 'diagnostico']
+    busqueda_campos = ['diagnostico', 'motivo']
     ordering_fields = ['fecha', 'id', 'mascota__nombre', 'estado']
     ordering = ['-fecha', 'id']
     
+    @action(detail=False, methods=['get'], url_path='calendario')
+    def calendario(self, request):
+        """
+        Feed compacto para las vistas de mes/semana: citas con inicio en [desde, hasta),
+        en columnas, sin los campos clínicos. Soporta If-None-Match para que los
+        refrescos sin cambios cuesten una sola consulta.
+        """
+        params = request.query_params
+        desde = _parsear_limite(params.get('desde', ''))
+        hasta = _parsear_limite(params.get('hasta', ''))
+        try:
+            veterinario = int(params['veterinario']) if params.get('veterinario') else None
+        except ValueError:
+            desde = None
+        
+        if desde is None or hasta is None or hasta <= desde:
+            return Response(
+                {"error": "Debe indicar un rango válido con 'desde' y 'hasta'."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if (hasta - desde).days > MAX_DIAS_RANGO:
+            return Response(
+                {"error": f"El rango no puede superar {MAX_DIAS_RANGO} días."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        citas = citas_en_ventana(desde, hasta, veterinario)
+        etag = etag_calendario(citas, desde.isoformat(), hasta.isoformat(), veterinario)
+        if etag in [e.strip() for e in request.headers.get('If-None-Match', '').split(',')]:
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+        
+        return Response(
+            {
+                'desde': desde.isoformat(),
+                'hasta': hasta.isoformat(),
+                'citas': columnas_calendario(citas),
+            },
+            headers={'ETag': etag}
+        )
+    
+    @action(detail=False, methods=['post'], url_path='serie')
+    def crear_serie(self, request):
+        """
+        Crea una serie de citas (controles periódicos o post-operatorios) en una sola
+        petición. Recibe los campos de la primera cita más 'repeticiones' e
+        'intervalo_dias', o 'desfases_dias'. Se crean todas o ninguna.
+        """
+        serie = SerieConsultaSerializer(data=request.data)
+        serie.is_valid(raise_exception=True)
+        base = self.get_serializer(data=request.data)
+        base.is_valid(raise_exception=True)
+        datos = base.validated_data
+        
+        primera = timezone.localtime(datos['fecha'])
+        citas = [
+            Consulta(**{
+                **datos,
+                'fecha': timezone.make_aware(primera.replace(tzinfo=None) + datetime.timedelta(days=dias)),
+            })
+            for dias in serie.desfases()
+        ]
+        duracion = datetime.timedelta(minutes=datos['duracion_estimada'])
+        if any(b.fecha < a.fecha + duracion for a, b in zip(citas, citas[1:])):
+            return Response(
+                {"error": "Las citas de la serie se solapan entre sí."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            citas = guardar_serie_sin_solape(citas)
+        except SolapeAgenda as e:
+            return self._respuesta_solape(e)
+        
+        return Response(
+            self.get_serializer(citas, many=True).data,
+            status=status.HTTP_201_CREATED
+        )
+    
+    def create(self, request, *args, **kwargs):
+        try:
+            return super().create(request, *args, **kwargs)
+        except SolapeAgenda as e:
+            return self._respuesta_solape(e)
+    
+    def update(self, request, *args, **kwargs):
+        try:
+            return super().update(request, *args, **kwargs)
+        except SolapeAgenda as e:
+            return self._respuesta_solape(e)
+    
+    def perform_create(self, serializer):
+        datos = serializer.validated_data
+        guardar_sin_solape(
+            serializer.save,
+            datos['veterinario'].pk,
+            datos['fecha'],
+            datos['duracion_estimada'],
+            estado=datos.get('estado'),
+        )
+    
+    def perform_update(self, serializer):
+        consulta = serializer.instance
+        datos = serializer.validated_data
+        guardar_sin_solape(
+            serializer.save,
+            datos['veterinario'].pk if 'veterinario' in datos else consulta.veterinario_id,
+            datos.get('fecha', consulta.fecha),
+            datos.get('duracion_estimada', consulta.duracion_estimada),
+            estado=datos.get('estado', consulta.estado),
+            excluir_id=consulta.pk,
+        )
+    
+    def _respuesta_solape(self, error):
+        return Response(
+            {"error": str(error), "conflicto": error.conflicto_id, "conflictos": error.conflictos},
+            status=status.HTTP_409_CONFLICT
+        )
+    
+    @action(detail=False, methods=['get'], url_path='disponibilidad')
+    def disponibilidad(self, request):
+        """
+        Devuelve los bloques libres por veterinario y día para un rango de fechas.
+        Parámetros: veterinario (opcional), desde, hasta (YYYY-MM-DD) y duracion en minutos.
+        """
+        params = request.query_params
+        hoy = timezone.localdate()
+        
+        try:
+            desde = parse_date(params['desde']) if params.get('desde') else hoy
+            hasta = parse_date(params['hasta']) if params.get('hasta') else None
+            duracion = int(params.get('duracion', 30))
+            paso = int(params['paso']) if params.get('paso') else None
+            veterinario = int(params['veterinario']) if params.get('veterinario') else None
+        except ValueError:
+            desde = None
+        
+        if desde is None or (params.get('hasta') and hasta is None):
+            return Response(
+                {"error": "Parámetros inválidos. Use fechas YYYY-MM-DD y valores numéricos."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        hasta = hasta or desde + datetime.timedelta(days=30)
+        if hasta < desde or (hasta - desde).days >= MAX_DIAS_RANGO:
+            return Response(
+                {"error": f"El rango debe ser válido y de máximo {MAX_DIAS_RANGO} días."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if duracion <= 0 or (paso is not None and paso <= 0):
+            return Response(
+                {"error": "La duración y el paso deben ser positivos."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        return Response({
+            'desde': desde.isoformat(),
+            'hasta': hasta.isoformat(),
+            'duracion': duracion,
+            'veterinarios': calcular_disponibilidad(desde, hasta, duracion, veterinario, paso),
+        })
+    
     @transaction.atomic
     @action(detail=True, methods=['patch'], url_path='completar')
     def completar_consulta(self, request, pk=None):
@@ -43,124 +230,59 @@ class ConsultaViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
+        # Obtener todos los datos clínicos del request
+        update_data = {
+            'estado': 'COMPLETADA',
+            'diagnostico': request.data.get('diagnostico', ''),
+            'observaciones': request.data.get('observaciones', ''),
+            'sintomas': request.data.get('sintomas', ''),
+            'tratamiento': request.data.get('tratamiento', ''),
+        }
+        
+        # Añadir campos numéricos solo si son válidos
+        temperatura = request.data.get('temperatura')
+        # El frontend envía 'peso_actual' pero el modelo usa 'peso'
+        peso = request.data.get('peso_actual') or request.data.get('peso')
+        if temperatura is not None:
+            update_data['temperatura'] = temperatura
+        if peso is not None:
+            update_data['peso'] = peso
+        
+        serializer = self.get_serializer(consulta, data=update_data, partial=True)
+        serializer.is_valid(raise_exception=True)
+        
         try:
-            # Obtener todos los datos clínicos del request
-            diagnostico = request.data.get('diagnostico', '')
-            observaciones = request.data.get('observaciones', '')
-            
-            # Corregir nombre de campos inconsistentes entre frontend y backend
-            temperatura = request.data.get('temperatura')
-            # El frontend envía 'peso_actual' pero el modelo usa 'peso'
-            peso = request.data.get('peso_actual') or request.data.get('peso')
-            sintomas = request.data.get('sintomas', '')
-            tratamiento = request.data.get('tratamiento', '')
-            
-            # Crear estructura de datos para actualizar
-            update_data = {
-                'estado': 'COMPLETADA',
-                'diagnostico': diagnostico,
-                'observaciones': observaciones,
-                'sintomas': sintomas,
-                'tratamiento': tratamiento
-            }
-            
-            # Añadir campos numéricos solo si son válidos
-            if temperatura is not None:
-                update_data['temperatura'] = temperatura
-            if peso is not None:
-                update_data['peso'] = peso
-                
-            # Log para debug
-            logger.info(f"Actualizando consulta {pk} con datos: {update_data}")
-            
-            # Actualizar datos de la consulta
-            serializer = self.get_serializer(consulta, data=update_data, partial=True)
-            serializer.is_valid(raise_exception=True)
             consulta = serializer.save()
-            
-            # Buscar o crear historial médico para la mascota
-            historial, created = HistorialMedico.objects.get_or_create(
-                mascota=consulta.mascota,
-                defaults={'veterinario': consulta.veterinario}
-            )
-            
-            # Verificar si ya existe una consulta en el historial para esta cita
-            consulta_existente = HistorialConsulta.objects.filter(
-                historial=historial,
-                cita_relacionada=consulta.id
-            ).first()
-            
-            # Buscar o crear tipo de consulta basado en el tipo de cita
-            tipo_consulta_mapping = {
-                'RUTINA': 'Control de rutina',
-                'EMERGENCIA': 'Emergencia',
-                'SEGUIMIENTO': 'Seguimiento'
-            }
-            
-            tipo_consulta, _ = TipoConsulta.objects.get_or_create(
-                nombre=tipo_consulta_mapping.get(consulta.tipo, 'Control de rutina'),
-                defaults={
-                    'duracion_estimada': consulta.duracion_estimada,
-                    'descripcion': f'Tipo de consulta para {consulta.tipo.lower()}'
-                }
-            )
-            
-            # Preparar datos para el historial
-            historial_data = {
-                'veterinario': consulta.veterinario,
-                'tipo_consulta': tipo_consulta,
-                'fecha': timezone.now().date(),
-                'motivo_consulta': consulta.motivo,
-                'diagnostico': diagnostico,
-                'observaciones': observaciones,
-                'sintomas': sintomas,
-                'tratamiento': tratamiento,
-            }
-            
-            # Añadir campos numéricos solo si son válidos
-            if temperatura is not None:
-                historial_data['temperatura'] = temperatura
-            if peso is not None:
-                historial_data['peso'] = peso
-            
-            if consulta_existente:
-                # Actualizar la consulta existente
-                for key, value in historial_data.items():
-                    setattr(consulta_existente, key, value)
-                consulta_existente.save()
-                
-                historial_consulta_data = HistorialConsultaSerializer(consulta_existente).data
-                mensaje = "Consulta completada y actualizada en el historial médico."
-            else:
-                # Crear una nueva entrada en el historial médico
-                historial_data['historial'] = historial
-                historial_data['cita_relacionada'] = consulta.id
-                
-                historial_consulta = HistorialConsulta.objects.create(**historial_data)
-                historial_consulta_data = HistorialConsultaSerializer(historial_consulta).data
-                mensaje = "Consulta completada y registrada en el historial médico."
-            
-            return Response({
-                "consulta": serializer.data,
-                "historial_consulta": historial_consulta_data,
-                "message": mensaje
-            })
-            
+            historial_consulta = registrar_en_historial(consulta, update_data)
         except Exception as e:
             logger.error(f"Error al completar consulta {pk}: {str(e)}")
             return Response(
                 {"error": f"Error al completar la consulta: {str(e)}"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+        
+        return Response({
+            "consulta": serializer.data,
+            "historial_consulta": HistorialConsultaSerializer(historial_consulta).data,
+            "message": "Consulta completada y registrada en el historial médico."
+        })
     
-    @transaction.atomic
     @action(detail=True, methods=['post'], url_path='medicamentos')
     def registrar_medicamentos(self, request, pk=None):
         """
         Registra medicamentos recetados durante la consulta.
+        Con 'dispensar': true la receta queda completada y se descuenta el stock.
         """
         consulta = self.get_object()
         medicamentos_data = request.data.get('medicamentos', [])
+        try:
+            # Acepta true/false, 1/0, "true"/"false"... como los campos booleanos de DRF
+            dispensar = serializers.BooleanField().to_internal_value(request.data.get('dispensar', False))
+        except serializers.ValidationError:
+            return Response(
+                {"error": "'dispensar' debe ser verdadero o falso."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
         if not medicamentos_data:
             return Response(
@@ -168,65 +290,100 @@ class ConsultaViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
+        campos = ('medicamento', 'dosis', 'frecuencia', 'duracion', 'cantidad')
         try:
-            # Buscar historial médico
-            historial = get_object_or_404(HistorialMedico, mascota=consulta.mascota)
-            
-            # Buscar la consulta en el historial
-            historial_consulta = HistorialConsulta.objects.filter(
-                historial=historial,
-                cita_relacionada=consulta.id
-            ).first()
-            
-            if not historial_consulta:
-                return Response(
-                    {"error": "No se encontró la consulta en el historial médico."},
-                    status=status.HTTP_404_NOT_FOUND
-                )
-            
-            # Registrar medicamentos
-            from historial_medico.models import Receta, DetalleReceta
-            
-            # Crear receta
-            receta = Receta.objects.create(
-                mascota=consulta.mascota,
-                veterinario=consulta.veterinario,
-                fecha_emision=timezone.now().date(),
-                fecha_vencimiento=timezone.now().date() + timezone.timedelta(days=30),
-                estado='ACTIVA',
-                observaciones=f"Receta generada desde consulta #{consulta.id}"
-            )
-            
-            # Registrar medicamentos
-            detalles_creados = []
-            for med_data in medicamentos_data:
-                detalle = DetalleReceta.objects.create(
-                    receta=receta,
-                    medicamento_id=med_data['medicamento'],
-                    dosis=med_data['dosis'],
-                    frecuencia=med_data['frecuencia'],
-                    duracion=med_data['duracion'],
-                    cantidad=med_data['cantidad'],
-                    instrucciones=f"Seguir indicaciones - {med_data['dosis']} {med_data['frecuencia']} por {med_data['duracion']}"
+            lineas = [{campo: med_data[campo] for campo in campos} for med_data in medicamentos_data]
+            for linea in lineas:
+                linea['medicamento'] = int(linea['medicamento'])
+                linea['cantidad'] = int(linea['cantidad'])
+                if linea['cantidad'] <= 0:
+                    raise ValueError
+        except (KeyError, TypeError, ValueError):
+            return Response(
+                {"error": f"Cada medicamento debe indicar {', '.join(campos)} (cantidad positiva)."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # Buscar la consulta en el historial
+        en_historial = HistorialConsulta.objects.filter(
+            historial__mascota=consulta.mascota,
+            cita_relacionada=consulta.id
+        ).exists()
+        if not en_historial:
+            return Response(
+                {"error": "No se encontró la consulta en el historial médico."},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        medicamentos = Medicamento.objects.in_bulk({linea['medicamento'] for linea in lineas})
+        no_encontrados = sorted({linea['medicamento'] for linea in lineas} - set(medicamentos))
+        if no_encontrados:
+            return Response(
+                {"error": f"Medicamentos no encontrados: {no_encontrados}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        hoy = timezone.now().date()
+        try:
+            with transaction.atomic():
+                receta = Receta.objects.create(
+                    mascota=consulta.mascota,
+                    veterinario=consulta.veterinario,
+                    fecha_emision=hoy,
+                    fecha_vencimiento=hoy + timezone.timedelta(days=30),
+                    estado='COMPLETADA' if dispensar else 'ACTIVA',
+                    observaciones=f"Receta generada desde consulta #{consulta.id}"
                 )
-                detalles_creados.append({
+                
+                # Un solo INSERT para todos los detalles (bulk_create no dispara las señales por fila)
+                detalles = DetalleReceta.objects.bulk_create([
+                    DetalleReceta(
+                        receta=receta,
+                        medicamento=medicamentos[linea['medicamento']],
+                        dosis=linea['dosis'],
+                        frecuencia=linea['frecuencia'],
+                        duracion=linea['duracion'],
+                        cantidad=linea['cantidad'],
+                        instrucciones=f"Seguir indicaciones - {linea['dosis']} {linea['frecuencia']} por {linea['duracion']}"
+                    )
+                    for linea in lineas
+                ])
+                
+                movimientos = []
+                if dispensar:
+                    movimientos = registrar_salidas(
+                        [(detalle.medicamento, detalle.cantidad) for detalle in detalles],
+                        usuario=consulta.veterinario,
+                        motivo=f"Receta {receta.id} para {consulta.mascota.nombre}"
+                    )
+        except StockInsuficiente as e:
+            return Response(
+                {"error": str(e), "faltantes": e.faltantes},
+                status=status.HTTP_409_CONFLICT
+            )
+        except Exception as e:
+            logger.error(f"Error al registrar medicamentos para consulta {pk}: {str(e)}")
+            return Response(
+                {"error": f"Error al registrar medicamentos: {str(e)}"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+        
+        return Response({
+            "receta_id": receta.id,
+            "medicamentos": [
+                {
                     'id': detalle.id,
                     'medicamento': detalle.medicamento.nombre,
                     'dosis': detalle.dosis,
                     'frecuencia': detalle.frecuencia,
                     'duracion': detalle.duracion,
                     'cantidad': detalle.cantidad
-                })
-            
-            return Response({
-                "receta_id": receta.id,
-                "medicamentos": detalles_creados,
-                "message": "Medicamentos registrados correctamente."
-            })
-            
-        except Exception as e:
-            logger.error(f"Error al registrar medicamentos para consulta {pk}: {str(e)}")
-            return Response(
-                {"error": f"Error al registrar medicamentos: {str(e)}"},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
\ No newline at end of file
+                }
+                for detalle in detalles
+            ],
+            "movimientos": [
+                {'medicamento': m.medicamento_id, 'lote': m.lote_id, 'cantidad': m.cantidad}
+                for m in movimientos
+            ],
+            "message": "Medicamentos registrados correctamente."
+        })
@@ -0,0 +1,114 @@
+# core/almacenamiento.py
+"""
+Almacenamiento direccionado por contenido.
+
+Cada archivo se guarda una sola vez bajo su hash SHA-256
+(``<prefijo>/ab/abcdef...``, sin extensión). La subida se copia por bloques a
+un archivo temporal mientras se calcula el hash y luego se mueve con un rename
+atómico; si ya existía un archivo con el mismo contenido, el temporal se
+descarta. El nombre devuelto depende solo del contenido, así que el mismo PDF
+subido varias veces, con cualquier nombre, termina apuntando al mismo archivo
+en disco. El tipo de archivo se decide por el nombre original, que guarda
+quien usa el almacenamiento (p. ej. Documento.nombre_archivo).
+
+Como un archivo compartido se puede borrar cuando deja de tener referencias,
+antes de decidir si se reutiliza se llama a la función ``reservar`` (ruta
+importable), que debe serializar con ese borrado hasta el fin de la
+transacción (ver historial_medico.archivos).
+"""
+import hashlib
+import os
+import re
+import tempfile
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+from django.utils.module_loading import import_string
+
+PATRON_HASH = re.compile(r'^[0-9a-f]{64}$')
+
+
+@deconstructible
+class AlmacenamientoPorContenido(FileSystemStorage):
+    def __init__(self, prefijo='', reservar=None, **kwargs):
+        self.prefijo = prefijo.strip('/')
+        self.reservar = reservar
+        super().__init__(**kwargs)
+
+    def nombre_para(self, sha256):
+        """
+        Nombre con que se guarda un contenido de hash ``sha256``.
+        """
+        return '/'.join(p for p in (self.prefijo, sha256[:2], sha256) if p)
+
+    def hash_de(self, name):
+        """
+        Devuelve el SHA-256 codificado en ``name`` o None si el archivo no fue
+        guardado por este almacenamiento (p. ej. archivos anteriores con nombre
+        uuid). También reconoce los nombres con extensión de versiones
+        anteriores, que ``deduplicar_documentos`` renombra.
+        """
+        if not name:
+            return None
+        base = os.path.splitext(os.path.basename(name))[0]
+        return base if PATRON_HASH.match(base) else None
+
+    def get_available_name(self, name, max_length=None):
+        # El nombre definitivo se decide en _save según el contenido
+        return name
+
+    def importar(self, ruta, sha256):
+        """
+        Incorpora un archivo ya escrito en disco (p. ej. una subida por partes)
+        moviéndolo a su ruta final sin copiarlo. ``sha256`` debe ser el hash
+        del archivo; si el contenido ya existía, ``ruta`` se elimina.
+        """
+        nombre = self.nombre_para(sha256)
+        if self.reservar:
+            import_string(self.reservar)(sha256, nombre, os.path.getsize(ruta))
+        destino = self.path(nombre)
+        if os.path.exists(destino):
+            os.remove(ruta)
+        else:
+            os.makedirs(os.path.dirname(destino), exist_ok=True)
+            if self.file_permissions_mode is not None:
+                os.chmod(ruta, self.file_permissions_mode)
+            os.replace(ruta, destino)
+        return nombre
+
+    def _save(self, name, content):
+        directorio_temporal = self.path('.tmp')
+        os.makedirs(directorio_temporal, exist_ok=True)
+
+        sha256 = hashlib.sha256()
+        descriptor, temporal = tempfile.mkstemp(dir=directorio_temporal)
+        try:
+            with os.fdopen(descriptor, 'wb') as destino:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for bloque in content.chunks():
+                    sha256.update(bloque)
+                    destino.write(bloque)
+
+            nombre = self.importar(temporal, sha256.hexdigest())
+        except BaseException:
+            if os.path.exists(temporal):
+                os.remove(temporal)
+            raise
+        return nombre
+
+
+def calcular_sha256(ruta, tamano_bloque=64 * 1024):
+    sha256 = hashlib.sha256()
+    with open(ruta, 'rb') as archivo:
+        for bloque in iter(lambda: archivo.read(tamano_bloque), b''):
+            sha256.update(bloque)
+    return sha256.hexdigest()
+
+
+def almacenamiento_documentos():
+    return AlmacenamientoPorContenido(
+        prefijo=getattr(settings, 'DOCUMENTOS_PREFIJO_CONTENIDO', 'documentos/sha256'),
+        reservar='historial_medico.archivos.reservar_archivo',
+    )
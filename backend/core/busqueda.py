@@ -0,0 +1,128 @@
+# core/busqueda.py
+"""
+Búsqueda de texto completo sobre campos clínicos.
+
+En PostgreSQL cada tabla tiene una columna ``busqueda`` (tsvector en español)
+que mantiene un trigger, indexada con GIN, más índices de trigramas sobre los
+campos de texto para tolerar errores de tipeo. En otros motores se recurre a
+``icontains``. El trigger y los índices los crea el SQL de la migración de
+cada app, que no depende de este módulo: la configuración ('spanish') y los
+pesos de los campos deben coincidir con los de ahí.
+"""
+from functools import reduce
+from operator import or_
+
+from django.contrib.postgres.search import (SearchHeadline, SearchQuery, SearchRank,
+                                           TrigramWordSimilarity)
+from django.db import connection, transaction
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.functions import Concat, Greatest, Left
+from django.utils.html import escape
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+CONFIGURACION = 'spanish'
+UMBRAL_TRIGRAMA = 0.3
+# Delimitadores del resaltado de ts_headline; se cambian por <mark> después de
+# escapar el fragmento, para que el texto clínico nunca se interprete como HTML
+INICIO_RESALTADO = '\x02'
+FIN_RESALTADO = '\x03'
+
+
+def buscar_texto_clinico(queryset, texto, campos, campos_trigramas=None):
+    """
+    Filtra y ordena el queryset por relevancia para ``texto``.
+
+    La búsqueda por trigramas recorre solo ``campos_trigramas`` (por defecto
+    ``campos``): los textos largos conviene dejarlos solo en el tsvector.
+
+    Devuelve (queryset, modo) donde modo es 'texto_completo', 'trigramas'
+    (si la búsqueda exacta no encontró nada) o 'contiene' (motores sin soporte).
+    Las filas traen anotados ``rango`` y ``fragmento`` (texto sin escapar; ver
+    fragmento_html).
+
+    El umbral de los trigramas se fija solo para la transacción en curso, así
+    que el queryset debe evaluarse dentro de la misma transaction.atomic().
+    """
+    if connection.vendor != 'postgresql':
+        filtro = reduce(or_, [Q(**{f'{campo}__icontains': texto}) for campo in campos])
+        return queryset.filter(filtro).annotate(
+            rango=Value(None, output_field=FloatField()), fragmento=Left(campos[0], 200)
+        ), 'contiene'
+
+    consulta = SearchQuery(texto, config=CONFIGURACION, search_type='websearch')
+    resultados = queryset.filter(busqueda=consulta)
+    if resultados.exists():
+        texto_completo = Concat(*[part for campo in campos for part in (F(campo), Value(' … '))][:-1])
+        return resultados.annotate(
+            rango=SearchRank(F('busqueda'), consulta),
+            fragmento=SearchHeadline(
+                texto_completo, consulta, config=CONFIGURACION,
+                start_sel=INICIO_RESALTADO, stop_sel=FIN_RESALTADO, max_fragments=2,
+            ),
+        ).order_by('-rango', 'id'), 'texto_completo'
+
+    # El operador <% (lookup trigram_word_similar) puede usar los índices GIN de
+    # trigramas; la similitud para ordenar se calcula solo sobre las coincidencias.
+    # El umbral es local a la transacción (true) para no quedar en la conexión
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT set_config('pg_trgm.word_similarity_threshold', %s, true)", [str(UMBRAL_TRIGRAMA)]
+        )
+    campos_trigramas = campos_trigramas or campos
+    filtro = reduce(or_, [Q(**{f'{campo}__trigram_word_similar': texto}) for campo in campos_trigramas])
+    similitudes = [TrigramWordSimilarity(texto, campo) for campo in campos_trigramas]
+    similitud = Greatest(*similitudes) if len(similitudes) > 1 else similitudes[0]
+    return queryset.filter(filtro).annotate(
+        rango=similitud, fragmento=Left(campos_trigramas[0], 200)
+    ).order_by('-rango', 'id'), 'trigramas'
+
+
+def fragmento_html(fragmento):
+    """
+    Escapa el fragmento para HTML y marca las coincidencias con <mark>.
+    """
+    if fragmento is None:
+        return None
+    return escape(fragmento).replace(INICIO_RESALTADO, '<mark>').replace(FIN_RESALTADO, '</mark>')
+
+
+class BusquedaClinicaMixin:
+    """
+    Agrega GET .../buscar/?q=texto a un ViewSet: resultados paginados y
+    ordenados por relevancia, con fragmentos resaltados. El ViewSet define
+    ``busqueda_campos`` con los campos de texto, el más relevante primero, y
+    opcionalmente ``busqueda_campos_trigramas`` con los que tienen índice de
+    trigramas si no son todos.
+    """
+    busqueda_campos = []
+    busqueda_campos_trigramas = None
+
+    @action(detail=False, methods=['get'], url_path='buscar')
+    def buscar(self, request):
+        texto = request.query_params.get('q', '').strip()
+        if len(texto) < 2:
+            return Response(
+                {"error": "Indique un texto de búsqueda de al menos 2 caracteres en 'q'."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # El umbral de trigramas solo vale dentro de esta transacción
+        with transaction.atomic():
+            queryset, modo = buscar_texto_clinico(
+                self.filter_queryset(self.get_queryset()), texto, self.busqueda_campos,
+                self.busqueda_campos_trigramas
+            )
+            page = self.paginate_queryset(queryset)
+            filas = page if page is not None else list(queryset)
+        data = [
+            {**item, 'rango': fila.rango, 'fragmento': fragmento_html(fila.fragmento)}
+            for fila, item in zip(filas, self.get_serializer(filas, many=True).data)
+        ]
+        if page is not None:
+            response = self.get_paginated_response(data)
+        else:
+            response = Response({'results': data})
+        response.data['modo'] = modo
+        return response
@@ -0,0 +1,179 @@
+# core/descargas.py
+"""
+Descarga autenticada de archivos subidos (documentos, fotos).
+
+El archivo se envía por bloques con StreamingHttpResponse, nunca se lee
+completo en memoria, y se atienden peticiones ``Range`` (206) para que un
+cliente pueda reanudar una descarga cortada. Se responden ``ETag`` y
+``Last-Modified`` y las peticiones condicionales reciben 304.
+
+Si hay un servidor web delante se le puede delegar el envío:
+``DESCARGAS_X_ACCEL_REDIRECT`` (prefijo interno de nginx que apunta a
+MEDIA_ROOT) o ``DESCARGAS_X_SENDFILE = True`` (Apache/lighttpd).
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from rest_framework import permissions, status
+from rest_framework.decorators import action
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.response import Response
+
+TAMANO_BLOQUE = 64 * 1024
+PATRON_RANGO = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RendererDescarga(BaseRenderer):
+    """
+    Acepta cualquier Accept (p. ej. application/pdf) para que la negociación
+    de DRF no rechace la descarga; los errores se devuelven como JSON.
+    """
+    media_type = '*/*'
+    format = None
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return JSONRenderer().render(data)
+
+
+def leer_bloques(ruta, inicio, largo, tamano_bloque=TAMANO_BLOQUE):
+    with open(ruta, 'rb') as archivo:
+        archivo.seek(inicio)
+        restante = largo
+        while restante > 0:
+            bloque = archivo.read(min(tamano_bloque, restante))
+            if not bloque:
+                break
+            restante -= len(bloque)
+            yield bloque
+
+
+def interpretar_rango(cabecera, tamano):
+    """
+    Devuelve (inicio, fin) inclusivo para un único rango ``bytes=``, None si la
+    cabecera no aplica (ausente, mal formada o con varios rangos: se envía el
+    archivo completo) y lanza ValueError si el rango no es satisfacible.
+    """
+    coincidencia = PATRON_RANGO.match(cabecera.strip()) if cabecera else None
+    if not coincidencia or coincidencia.groups() == ('', ''):
+        return None
+    desde, hasta = coincidencia.groups()
+    if desde == '':
+        # bytes=-N: los últimos N bytes
+        sufijo = int(hasta)
+        if sufijo == 0:
+            raise ValueError('Rango vacío')
+        return max(tamano - sufijo, 0), tamano - 1
+    inicio = int(desde)
+    fin = min(int(hasta), tamano - 1) if hasta else tamano - 1
+    if inicio >= tamano or fin < inicio:
+        raise ValueError('Rango fuera del archivo')
+    return inicio, fin
+
+
+def _coincide_etag(cabecera, etag):
+    etiquetas = [e.strip() for e in cabecera.split(',')]
+    return '*' in etiquetas or etag in etiquetas or f'W/{etag}' in etiquetas
+
+
+def respuesta_archivo(request, archivo, nombre_descarga=None, etag=None):
+    """
+    Construye la respuesta de descarga para un FieldFile guardado en disco.
+    ``etag`` (sin comillas) puede venir del hash del contenido; si no se
+    deriva del tamaño y la fecha de modificación.
+    """
+    ruta = archivo.path
+    estado = os.stat(ruta)
+    tamano = estado.st_size
+    modificado = int(estado.st_mtime)
+    etag = quote_etag(etag or f'{tamano:x}-{modificado:x}')
+    ultima_modificacion = http_date(modificado)
+
+    si_no_coincide = request.headers.get('If-None-Match')
+    desde_fecha = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    if (si_no_coincide and _coincide_etag(si_no_coincide, etag)) or (
+        not si_no_coincide and desde_fecha is not None and modificado <= desde_fecha
+    ):
+        respuesta = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        respuesta['ETag'] = etag
+        respuesta['Last-Modified'] = ultima_modificacion
+        return respuesta
+
+    rango_cabecera = request.headers.get('Range')
+    si_rango = request.headers.get('If-Range')
+    if si_rango and si_rango != etag and si_rango != ultima_modificacion:
+        # El archivo cambió desde la descarga parcial: se envía completo
+        rango_cabecera = None
+    try:
+        rango = interpretar_rango(rango_cabecera, tamano)
+    except ValueError:
+        respuesta = HttpResponse(status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+        respuesta['Content-Range'] = f'bytes */{tamano}'
+        return respuesta
+
+    tipo_contenido, codificacion = mimetypes.guess_type(nombre_descarga or ruta)
+    if codificacion:
+        # Un .gz se entrega tal cual, no como contenido comprimido en tránsito
+        tipo_contenido = None
+    nombre_descarga = nombre_descarga or os.path.basename(ruta)
+
+    prefijo_accel = getattr(settings, 'DESCARGAS_X_ACCEL_REDIRECT', None)
+    if prefijo_accel or getattr(settings, 'DESCARGAS_X_SENDFILE', False):
+        # El servidor web atiende Range y envía el archivo
+        respuesta = HttpResponse()
+        if prefijo_accel:
+            respuesta['X-Accel-Redirect'] = prefijo_accel.rstrip('/') + '/' + quote(archivo.name)
+        else:
+            respuesta['X-Sendfile'] = ruta
+    elif rango is not None:
+        inicio, fin = rango
+        respuesta = StreamingHttpResponse(
+            leer_bloques(ruta, inicio, fin - inicio + 1),
+            status=status.HTTP_206_PARTIAL_CONTENT
+        )
+        respuesta['Content-Range'] = f'bytes {inicio}-{fin}/{tamano}'
+        respuesta['Content-Length'] = str(fin - inicio + 1)
+    else:
+        respuesta = StreamingHttpResponse(leer_bloques(ruta, 0, tamano))
+        respuesta['Content-Length'] = str(tamano)
+
+    respuesta['Content-Type'] = tipo_contenido or 'application/octet-stream'
+    respuesta['Accept-Ranges'] = 'bytes'
+    respuesta['ETag'] = etag
+    respuesta['Last-Modified'] = ultima_modificacion
+    respuesta['Cache-Control'] = 'private, no-cache'
+    respuesta['Content-Disposition'] = f"attachment; filename*=UTF-8''{quote(nombre_descarga)}"
+    return respuesta
+
+
+class DescargaArchivoMixin:
+    """
+    Agrega GET .../{id}/descargar/ a un ViewSet. El ViewSet define
+    ``campo_archivo`` y opcionalmente ``nombre_descarga(obj)`` y ``etag_descarga(obj)``.
+    """
+    campo_archivo = None
+
+    def nombre_descarga(self, obj):
+        return None
+
+    def etag_descarga(self, obj):
+        return None
+
+    @action(detail=True, methods=['get'], permission_classes=[permissions.IsAuthenticated],
+            renderer_classes=[JSONRenderer, RendererDescarga])
+    def descargar(self, request, pk=None):
+        obj = self.get_object()
+        archivo = getattr(obj, self.campo_archivo)
+        if not archivo or not archivo.storage.exists(archivo.name):
+            return Response(
+                {"error": "El archivo no está disponible."},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return respuesta_archivo(
+            request, archivo, self.nombre_descarga(obj), self.etag_descarga(obj)
+        )
@@ -0,0 +1,150 @@
+# core/management/commands/particiones.py
+import datetime
+import os
+import re
+import subprocess
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.particiones import (TABLAS, adjuntar_particion, crear_particion, desprender_particion,
+                              es_particionada, nombre_particion, particiones)
+
+PATRON_ARCHIVO = re.compile(r'^(?P<tabla>\w+)_p(?P<anio>\d{4})\.dump$')
+
+
+def _conexion_cliente():
+    """
+    Argumentos y entorno para pg_dump/pg_restore con la base de datos de Django.
+    """
+    ajustes = connection.settings_dict
+    argumentos = ['--dbname', ajustes['NAME']]
+    for opcion, clave in (('--host', 'HOST'), ('--port', 'PORT'), ('--username', 'USER')):
+        if ajustes.get(clave):
+            argumentos += [opcion, str(ajustes[clave])]
+    entorno = dict(os.environ)
+    if ajustes.get('PASSWORD'):
+        entorno['PGPASSWORD'] = ajustes['PASSWORD']
+    return argumentos, entorno
+
+
+class Command(BaseCommand):
+    help = (
+        "Administra las particiones anuales de consultas, citas y movimientos de inventario. "
+        "'crear' agrega las particiones de los próximos años; 'archivar' desprende las de años "
+        "anteriores a --antes-de, las vuelca con pg_dump (formato custom comprimido) y las "
+        "elimina; 'restaurar' carga un volcado y vuelve a adjuntar la partición. Los movimientos "
+        "de inventario solo se archivan si hay un cierre de stock posterior al corte, porque el "
+        "kardex y el stock histórico parten de él."
+    )
+
+    def add_arguments(self, parser):
+        acciones = parser.add_subparsers(dest='accion', required=True)
+        acciones.add_parser('listar')
+
+        crear = acciones.add_parser('crear')
+        crear.add_argument('--anios', type=int, default=2,
+                           help="Años a futuro con partición creada (por defecto 2).")
+
+        archivar = acciones.add_parser('archivar')
+        archivar.add_argument('--antes-de', type=int, required=True, dest='antes_de',
+                              help="Archiva las particiones de los años anteriores a este.")
+        archivar.add_argument('--directorio', required=True)
+        archivar.add_argument('--tabla', choices=sorted(TABLAS), action='append', dest='tablas')
+        archivar.add_argument('--conservar', action='store_true',
+                              help="Desprende y vuelca, pero no elimina la tabla de la partición.")
+
+        restaurar = acciones.add_parser('restaurar')
+        restaurar.add_argument('archivo', help="Volcado <tabla>_p<año>.dump generado por 'archivar'.")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("El particionamiento solo está disponible en PostgreSQL")
+        with connection.cursor() as cursor:
+            no_particionadas = [tabla for tabla in TABLAS if not es_particionada(cursor, tabla)]
+        if no_particionadas:
+            raise CommandError(f"Tablas sin particionar: {', '.join(no_particionadas)}; aplique las migraciones")
+        getattr(self, f"_{options['accion']}")(options)
+
+    def _listar(self, options):
+        with connection.cursor() as cursor:
+            for tabla in TABLAS:
+                self.stdout.write(self.style.MIGRATE_HEADING(tabla))
+                for nombre, _, filas, tamano in particiones(cursor, tabla):
+                    self.stdout.write(f"  {nombre:<45} ~{filas:>10} filas  {tamano / 1024 ** 2:>9.1f} MB")
+
+    def _crear(self, options):
+        actual = timezone.localdate().year
+        creadas = []
+        with transaction.atomic(), connection.cursor() as cursor:
+            for tabla in TABLAS:
+                for anio in range(actual, actual + max(options['anios'], 0) + 1):
+                    if crear_particion(cursor, tabla, anio):
+                        creadas.append(nombre_particion(tabla, anio))
+        self.stdout.write(self.style.SUCCESS(
+            f"Particiones creadas: {', '.join(creadas)}" if creadas else "Las particiones ya existían"
+        ))
+
+    def _archivar(self, options):
+        if options['antes_de'] > timezone.localdate().year:
+            raise CommandError("No se puede archivar el año en curso")
+        tablas = options['tablas'] or list(TABLAS)
+        if 'inventario_movimientoinventario' in tablas:
+            # Mismo límite que las particiones: 1 de enero UTC
+            corte = datetime.datetime(options['antes_de'], 1, 1, tzinfo=datetime.timezone.utc)
+            CierreStock = apps.get_model('inventario', 'CierreStock')
+            if not CierreStock.objects.filter(fecha__gte=corte).exists():
+                raise CommandError(
+                    f"No hay un cierre de stock desde {corte:%Y-%m-%d}: sin él el kardex y el stock "
+                    "histórico quedarían mal al archivar movimientos. Ejecute primero "
+                    "'manage.py cierre_stock'."
+                )
+        os.makedirs(options['directorio'], exist_ok=True)
+        argumentos, entorno = _conexion_cliente()
+
+        for tabla in tablas:
+            with connection.cursor() as cursor:
+                anios = [anio for _, anio, _, _ in particiones(cursor, tabla)
+                         if anio is not None and anio < options['antes_de']]
+            for anio in anios:
+                particion = nombre_particion(tabla, anio)
+                destino = os.path.join(options['directorio'], f'{particion}.dump')
+                with transaction.atomic(), connection.cursor() as cursor:
+                    desprender_particion(cursor, tabla, anio)
+
+                # pg_dump lee en otra sesión: la partición ya debe estar desprendida
+                resultado = subprocess.run(
+                    ['pg_dump', *argumentos, '--format=custom', '--compress=9',
+                     '--table', particion, '--file', destino + '.tmp'],
+                    env=entorno, capture_output=True, text=True
+                )
+                if resultado.returncode != 0:
+                    with transaction.atomic(), connection.cursor() as cursor:
+                        adjuntar_particion(cursor, tabla, anio)
+                    raise CommandError(f"pg_dump falló para {particion}: {resultado.stderr.strip()}")
+                os.replace(destino + '.tmp', destino)
+
+                if not options['conservar']:
+                    with connection.cursor() as cursor:
+                        cursor.execute(f"DROP TABLE {particion}")
+                self.stdout.write(self.style.SUCCESS(f"{particion} archivada en {destino}"))
+
+    def _restaurar(self, options):
+        archivo = options['archivo']
+        coincidencia = PATRON_ARCHIVO.match(os.path.basename(archivo))
+        if not coincidencia or coincidencia['tabla'] not in TABLAS:
+            raise CommandError("El nombre del archivo debe ser <tabla>_p<año>.dump")
+        tabla, anio = coincidencia['tabla'], int(coincidencia['anio'])
+
+        argumentos, entorno = _conexion_cliente()
+        resultado = subprocess.run(
+            ['pg_restore', *argumentos, '--no-owner', archivo],
+            env=entorno, capture_output=True, text=True
+        )
+        if resultado.returncode != 0:
+            raise CommandError(f"pg_restore falló: {resultado.stderr.strip()}")
+        with transaction.atomic(), connection.cursor() as cursor:
+            adjuntar_particion(cursor, tabla, anio)
+        self.stdout.write(self.style.SUCCESS(f"{nombre_particion(tabla, anio)} restaurada y adjuntada"))
@@ -0,0 +1,208 @@
+# core/pagination.py
+import base64
+import datetime
+import decimal
+import json
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import F, OrderBy, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class OrdenNoSoportado(Exception):
+    """
+    El orden del queryset no sirve para paginar por cursor.
+    """
+
+
+class PaginacionKeyset:
+    """
+    Paginación por cursor (keyset) sobre el orden compuesto del queryset,
+    p. ej. ('-fecha', 'id'). En vez de COUNT(*) + OFFSET, cada página filtra
+    las filas posteriores a la última fila vista, por lo que el costo no crece
+    con la profundidad.
+
+    Solo admite ordenar por campos del modelo (o de relaciones hacia uno) que
+    no aceptan nulos, o por anotaciones, que deben ser no nulas; cualquier
+    otro orden (expresiones, campos nulos, '?') lanza OrdenNoSoportado, porque
+    el cursor dejaría de identificar una única posición.
+    """
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Cursor inválido.'
+
+    def __init__(self, page_size):
+        self.page_size = page_size
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.orden = self.obtener_orden(queryset)
+
+        valores, reverso = self.decodificar_cursor(request)
+        orden = [(campo, not desc) for campo, desc in self.orden] if reverso else self.orden
+        queryset = queryset.order_by(*[('-' if desc else '') + campo for campo, desc in orden])
+        if valores is not None:
+            queryset = queryset.filter(self.filtro_posterior(orden, valores))
+
+        filas = list(queryset[:self.page_size + 1])
+        hay_mas = len(filas) > self.page_size
+        filas = filas[:self.page_size]
+        if reverso:
+            filas.reverse()
+
+        self.cursor_siguiente = self.cursor_anterior = None
+        if filas:
+            if hay_mas or reverso:
+                self.cursor_siguiente = self.codificar_cursor(filas[-1], False)
+            if valores is not None and (hay_mas or not reverso):
+                self.cursor_anterior = self.codificar_cursor(filas[0], True)
+        return filas
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.enlace(self.cursor_siguiente),
+            'previous': self.enlace(self.cursor_anterior),
+            'results': data,
+        })
+
+    def obtener_orden(self, queryset):
+        """
+        Devuelve [(campo, descendente), ...] con 'id' como desempate final.
+        Lanza OrdenNoSoportado si algún criterio no sirve para el cursor.
+        """
+        orden = []
+        for expresion in queryset.query.order_by or ['-id']:
+            campo, desc = self.campo_orden(expresion)
+            campo = 'id' if campo == 'pk' else campo
+            orden.append((campo, desc))
+            if campo == 'id':
+                # Lo que venga después del id no cambia el orden
+                break
+            self.validar_campo(queryset, campo)
+        if orden[-1][0] != 'id':
+            orden.append(('id', False))
+        return orden
+
+    def campo_orden(self, expresion):
+        if isinstance(expresion, str):
+            if expresion == '?' or '.' in expresion:
+                raise OrdenNoSoportado(f"No se puede paginar por cursor ordenando por '{expresion}'.")
+            return expresion.lstrip('-'), expresion.startswith('-')
+        if isinstance(expresion, F):
+            return expresion.name, False
+        if (isinstance(expresion, OrderBy) and isinstance(expresion.expression, F)
+                and not expresion.nulls_first and not expresion.nulls_last):
+            return expresion.expression.name, expresion.descending
+        raise OrdenNoSoportado(f"No se puede paginar por cursor ordenando por {expresion!r}.")
+
+    def validar_campo(self, queryset, campo):
+        """
+        Verifica que ``campo`` sea una anotación o un campo concreto que no
+        admite nulos, llegando a él solo por relaciones hacia un único objeto.
+        """
+        if campo in queryset.query.annotations:
+            return
+        modelo = queryset.model
+        partes = campo.split('__')
+        for i, parte in enumerate(partes):
+            try:
+                field = modelo._meta.get_field(parte)
+            except FieldDoesNotExist:
+                raise OrdenNoSoportado(f"No se puede paginar por cursor ordenando por '{campo}'.")
+            # Las partes intermedias deben ser relaciones y la última un campo simple
+            ultimo = i == len(partes) - 1
+            if field.null or field.many_to_many or field.one_to_many or ultimo == field.is_relation:
+                raise OrdenNoSoportado(
+                    f"No se puede paginar por cursor ordenando por '{campo}': debe ser un campo no nulo."
+                )
+            modelo = field.related_model
+
+    def filtro_posterior(self, orden, valores):
+        """
+        Construye c1 >= v1 AND ((c1 > v1) OR (c1 = v1 AND c2 > v2) OR ...)
+        según la dirección de cada campo. La primera condición es redundante,
+        pero sin ella PostgreSQL no puede iniciar el recorrido del índice en el
+        cursor y lee todas las filas anteriores.
+        """
+        condiciones = []
+        for i, (campo, desc) in enumerate(orden):
+            iguales = {orden[j][0]: valores[j] for j in range(i)}
+            lookup = f"{campo}__{'lt' if desc else 'gt'}"
+            condiciones.append(Q(**iguales, **{lookup: valores[i]}))
+        primero, desc = orden[0]
+        return Q(**{f"{primero}__{'lte' if desc else 'gte'}": valores[0]}) & reduce(or_, condiciones)
+
+    def valor_campo(self, fila, campo):
+        valor = fila
+        for parte in campo.split('__'):
+            valor = getattr(valor, parte)
+        if isinstance(valor, (datetime.datetime, datetime.date)):
+            return valor.isoformat()
+        if isinstance(valor, decimal.Decimal):
+            return str(valor)
+        return valor
+
+    def codificar_cursor(self, fila, reverso):
+        # Los valores se guardan en el orden "hacia adelante" de self.orden
+        contenido = {
+            'v': [self.valor_campo(fila, campo) for campo, _ in self.orden],
+            'r': int(reverso),
+        }
+        return base64.urlsafe_b64encode(json.dumps(contenido).encode()).decode()
+
+    def decodificar_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None, False
+        try:
+            contenido = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            valores = contenido['v']
+            if len(valores) != len(self.orden):
+                raise ValueError
+            return valores, bool(contenido.get('r'))
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def enlace(self, cursor):
+        if cursor is None:
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+
+class PaginacionHibrida(PageNumberPagination):
+    """
+    Paginación por número de página (por defecto) o por cursor cuando la
+    petición trae ?paginacion=cursor o un ?cursor=, para que cada pantalla
+    pueda migrar a keyset de forma independiente. Si el orden pedido no sirve
+    para un cursor (ver PaginacionKeyset) se responde por número de página.
+    """
+    modo_query_param = 'paginacion'
+
+    def usa_cursor(self, request):
+        return (
+            request.query_params.get(self.modo_query_param) == 'cursor'
+            or PaginacionKeyset.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.usa_cursor(request):
+            keyset = PaginacionKeyset(self.get_page_size(request))
+            try:
+                filas = keyset.paginate_queryset(queryset, request, view)
+            except OrdenNoSoportado:
+                pass
+            else:
+                self.keyset = keyset
+                return filas
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -0,0 +1,160 @@
+# core/particiones.py
+"""
+Particionamiento por año de las tablas que crecen sin límite (PostgreSQL).
+
+Las consultas del historial, las citas y los movimientos de inventario se
+consultan casi siempre por fecha, así que se particionan por rango anual sobre
+esa columna: ``<tabla>_p2025`` guarda [2025-01-01, 2026-01-01) y las filas sin
+partición caen en ``<tabla>_pdefault``. Con un filtro por fecha PostgreSQL
+descarta al planificar las particiones que no pueden tener filas, y un
+``ORDER BY fecha DESC LIMIT n`` recorre las particiones en orden y se detiene
+en las recientes.
+
+En una tabla particionada toda restricción única debe incluir la clave de
+partición, así que la clave primaria pasa a ser (id, fecha); para Django la
+clave sigue siendo ``id``, que sigue saliendo de una secuencia. Las
+restricciones de exclusión tampoco se pueden declarar en la tabla
+particionada y se crean en cada partición (se copian de la partición default).
+Por eso ``citas_consulta_sin_solape`` no detecta el cruce entre una cita que
+empieza antes de un 1 de enero (UTC) y termina después y otra que empieza
+después en la partición del año siguiente; citas.agenda.guardar_sin_solape
+cubre ese hueco buscando solapes en ambas particiones con un advisory lock
+del veterinario tomado cerca de cada cambio de año.
+
+Las migraciones que particionan cada tabla llevan su propio SQL; este módulo
+lo usa ``manage.py particiones`` para crear las particiones de los años
+siguientes y desprender y archivar las antiguas.
+"""
+import re
+
+# tabla -> columna de fecha por la que se particiona
+TABLAS = {
+    'historial_medico_consulta': 'fecha',
+    'citas_consulta': 'fecha',
+    'inventario_movimientoinventario': 'fecha',
+}
+
+PATRON_PARTICION = re.compile(r'_p(\d{4})$')
+
+
+def nombre_particion(tabla, anio):
+    return f'{tabla}_p{anio}'
+
+
+def nombre_default(tabla):
+    return f'{tabla}_pdefault'
+
+
+def _filas(cursor, sql, parametros=None):
+    cursor.execute(sql, parametros)
+    return cursor.fetchall()
+
+
+def _limite(cursor, tabla, columna, anio):
+    tipo = _filas(cursor, """
+        SELECT format_type(atttypid, atttypmod) FROM pg_attribute
+        WHERE attrelid = %s::regclass AND attname = %s
+    """, [tabla, columna])[0][0]
+    if tipo == 'date':
+        return f"'{anio}-01-01'"
+    return f"'{anio}-01-01 00:00:00+00'"
+
+
+def es_particionada(cursor, tabla):
+    return bool(_filas(cursor, "SELECT 1 FROM pg_class WHERE oid = %s::regclass AND relkind = 'p'", [tabla]))
+
+
+def particiones(cursor, tabla):
+    """
+    Devuelve [(nombre, año o None para la default, filas estimadas, bytes)].
+    """
+    resultado = []
+    for nombre, filas, tamano in _filas(cursor, """
+        SELECT c.relname, c.reltuples::bigint, pg_total_relation_size(c.oid)
+        FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = %s::regclass
+        ORDER BY c.relname
+    """, [tabla]):
+        coincidencia = PATRON_PARTICION.search(nombre)
+        resultado.append((nombre, int(coincidencia.group(1)) if coincidencia else None, max(filas, 0), tamano))
+    return resultado
+
+
+def _definiciones(cursor, tabla):
+    """
+    Índices, restricciones (únicas, foráneas y de exclusión) y triggers
+    declarados sobre ``tabla``, como SQL para recrearlos.
+    """
+    indices = [fila[0] for fila in _filas(cursor, """
+        SELECT pg_get_indexdef(i.indexrelid) FROM pg_index i
+        WHERE i.indrelid = %s::regclass
+          AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.indexrelid AND c.conrelid = i.indrelid)
+    """, [tabla])]
+    restricciones = _filas(cursor, """
+        SELECT conname, contype, pg_get_constraintdef(oid) FROM pg_constraint
+        WHERE conrelid = %s::regclass AND contype IN ('u', 'f', 'x')
+        ORDER BY conname
+    """, [tabla])
+    triggers = [fila[0] for fila in _filas(cursor, """
+        SELECT pg_get_triggerdef(oid) FROM pg_trigger WHERE tgrelid = %s::regclass AND NOT tgisinternal
+    """, [tabla])]
+    return indices, restricciones, triggers
+
+
+def _exclusiones(cursor, tabla, prefijo):
+    """
+    Restricciones de exclusión de ``tabla`` como [(sufijo, definición)], donde
+    el sufijo es el nombre sin ``prefijo``.
+    """
+    return [
+        (nombre[len(prefijo):] if nombre.startswith(prefijo) else nombre, definicion)
+        for nombre, tipo, definicion in _definiciones(cursor, tabla)[1] if tipo == 'x'
+    ]
+
+
+def _crear_particion(cursor, tabla, columna, anio, exclusiones):
+    particion = nombre_particion(tabla, anio)
+    cursor.execute(
+        f"CREATE TABLE {particion} PARTITION OF {tabla} FOR VALUES "
+        f"FROM ({_limite(cursor, tabla, columna, anio)}) TO ({_limite(cursor, tabla, columna, anio + 1)})"
+    )
+    for sufijo, definicion in exclusiones:
+        cursor.execute(f"ALTER TABLE {particion} ADD CONSTRAINT {particion}_{sufijo} {definicion}")
+
+
+def crear_particion(cursor, tabla, anio):
+    """
+    Crea la partición del año si no existe. Las filas de ese año que hayan
+    caído en la partición default se mueven a la nueva. Devuelve True si la creó.
+    """
+    columna = TABLAS[tabla]
+    particion = nombre_particion(tabla, anio)
+    if _filas(cursor, "SELECT 1 FROM pg_class WHERE relname = %s", [particion]):
+        return False
+    default = nombre_default(tabla)
+    exclusiones = _exclusiones(cursor, default, f'{default}_')
+    rango = (
+        f"{columna} >= {_limite(cursor, tabla, columna, anio)} "
+        f"AND {columna} < {_limite(cursor, tabla, columna, anio + 1)}"
+    )
+    if _filas(cursor, f"SELECT 1 FROM {default} WHERE {rango} LIMIT 1"):
+        cursor.execute(f"ALTER TABLE {tabla} DETACH PARTITION {default}")
+        _crear_particion(cursor, tabla, columna, anio, exclusiones)
+        cursor.execute(f"INSERT INTO {tabla} SELECT * FROM {default} WHERE {rango}")
+        cursor.execute(f"DELETE FROM {default} WHERE {rango}")
+        cursor.execute(f"ALTER TABLE {tabla} ATTACH PARTITION {default} DEFAULT")
+    else:
+        _crear_particion(cursor, tabla, columna, anio, exclusiones)
+    return True
+
+
+def desprender_particion(cursor, tabla, anio):
+    cursor.execute(f"ALTER TABLE {tabla} DETACH PARTITION {nombre_particion(tabla, anio)}")
+
+
+def adjuntar_particion(cursor, tabla, anio):
+    columna = TABLAS[tabla]
+    cursor.execute(
+        f"ALTER TABLE {tabla} ATTACH PARTITION {nombre_particion(tabla, anio)} FOR VALUES "
+        f"FROM ({_limite(cursor, tabla, columna, anio)}) TO ({_limite(cursor, tabla, columna, anio + 1)})"
+    )
@@ -1,3 +1,132 @@
+from django.db.models import F, Q
 from django.test import TestCase
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
 
-# Create your tests here.
+from clientes.models import Cliente, DireccionCliente
+from .pagination import OrdenNoSoportado, PaginacionHibrida, PaginacionKeyset
+
+
+class PaginacionKeysetTests(TestCase):
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        cliente = Cliente.objects.create(
+            nombre='Juan', apellido='Pérez', rut='12.345.678-9', telefono='123', email='juan@tailpet.cl'
+        )
+        # Varias direcciones por ciudad para que el orden tenga empates
+        for i, ciudad in enumerate(['Talca', 'Arica', 'Talca', 'Osorno', 'Arica', 'Talca', 'Arica']):
+            DireccionCliente.objects.create(
+                cliente=cliente, calle='Calle', numero=str(i), ciudad=ciudad, region='Región'
+            )
+
+    def pagina(self, queryset, url='/direcciones/', tamano=2):
+        paginacion = PaginacionKeyset(tamano)
+        filas = paginacion.paginate_queryset(queryset, Request(self.factory.get(url)))
+        return paginacion, [fila.id for fila in filas]
+
+    def recorrer(self, queryset, tamano=2):
+        """
+        Recorre todas las páginas hacia adelante y luego vuelve hacia atrás
+        desde la última, devolviendo los ids en el orden en que aparecen.
+        """
+        adelante, paginas = [], []
+        paginacion, ids = self.pagina(queryset, tamano=tamano)
+        adelante.extend(ids)
+        paginas.append(ids)
+        while paginacion.cursor_siguiente:
+            paginacion, ids = self.pagina(queryset, paginacion.enlace(paginacion.cursor_siguiente), tamano)
+            adelante.extend(ids)
+            paginas.append(ids)
+
+        atras = []
+        while paginacion.cursor_anterior:
+            paginacion, ids = self.pagina(queryset, paginacion.enlace(paginacion.cursor_anterior), tamano)
+            atras.append(ids)
+        return adelante, paginas, atras
+
+    def test_recorre_empates_sin_saltar_ni_repetir(self):
+        queryset = DireccionCliente.objects.order_by('ciudad')
+        esperado = list(queryset.order_by('ciudad', 'id').values_list('id', flat=True))
+
+        adelante, paginas, atras = self.recorrer(queryset)
+
+        self.assertEqual(adelante, esperado)
+        self.assertEqual(atras, paginas[-2::-1])
+
+    def test_orden_descendente(self):
+        queryset = DireccionCliente.objects.order_by('-ciudad', '-id')
+        esperado = list(queryset.values_list('id', flat=True))
+
+        adelante, paginas, atras = self.recorrer(queryset, tamano=3)
+
+        self.assertEqual(adelante, esperado)
+        self.assertEqual(atras, paginas[-2::-1])
+
+    def test_acepta_expresiones_f(self):
+        queryset = DireccionCliente.objects.order_by(F('ciudad').desc(), 'id')
+        esperado = list(queryset.values_list('id', flat=True))
+
+        adelante, _, _ = self.recorrer(queryset)
+
+        self.assertEqual(adelante, esperado)
+
+    def test_cursor_conserva_la_posicion(self):
+        queryset = DireccionCliente.objects.order_by('ciudad')
+        paginacion, primera = self.pagina(queryset)
+        cursor = paginacion.cursor_siguiente
+
+        # Una fila nueva antes del cursor no desplaza la página siguiente
+        DireccionCliente.objects.create(
+            cliente=Cliente.objects.get(), calle='Calle', numero='0', ciudad='Antofagasta', region='Región'
+        )
+        _, segunda = self.pagina(queryset, paginacion.enlace(cursor))
+
+        esperado = [i for i in queryset.order_by('ciudad', 'id').values_list('id', flat=True) if i not in primera]
+        self.assertEqual(segunda, esperado[1:3])
+
+    def test_paginas_estables_y_sin_superposicion(self):
+        queryset = DireccionCliente.objects.order_by('-ciudad', 'id')
+        esperado = list(queryset.values_list('id', flat=True))
+
+        _, paginas, _ = self.recorrer(queryset, tamano=2)
+        # Recorrer de nuevo con los mismos cursores da las mismas páginas
+        _, otra_vez, _ = self.recorrer(queryset, tamano=2)
+
+        self.assertEqual(len(paginas), 4)
+        self.assertEqual(paginas, otra_vez)
+        self.assertEqual([i for pagina in paginas for i in pagina], esperado)
+        self.assertEqual(len({i for pagina in paginas for i in pagina}), len(esperado))
+
+    def test_filtro_acota_el_primer_campo(self):
+        paginacion = PaginacionKeyset(2)
+        filtro = paginacion.filtro_posterior([('ciudad', True), ('id', False)], ['Osorno', 3])
+
+        # La cota sobre el primer campo permite empezar el recorrido del índice en el cursor
+        self.assertIn(('ciudad__lte', 'Osorno'), filtro.children)
+        self.assertEqual(
+            list(DireccionCliente.objects.filter(filtro).order_by('-ciudad', 'id').values_list('ciudad', 'id')),
+            list(DireccionCliente.objects.filter(Q(ciudad__lt='Osorno') | Q(ciudad='Osorno', id__gt=3))
+                 .order_by('-ciudad', 'id').values_list('ciudad', 'id'))
+        )
+
+    def test_rechaza_ordenes_no_soportados(self):
+        for queryset in (
+            DireccionCliente.objects.order_by('departamento'),
+            DireccionCliente.objects.order_by('cliente'),
+            DireccionCliente.objects.order_by('created_at__year'),
+            DireccionCliente.objects.order_by('?'),
+            DireccionCliente.objects.order_by(F('ciudad').asc(nulls_last=True)),
+            Cliente.objects.order_by('direcciones__ciudad'),
+        ):
+            with self.subTest(orden=queryset.query.order_by), self.assertRaises(OrdenNoSoportado):
+                self.pagina(queryset)
+
+    def test_paginacion_hibrida_usa_paginas_si_el_orden_no_sirve(self):
+        paginacion = PaginacionHibrida()
+        request = Request(self.factory.get('/direcciones/', {'paginacion': 'cursor'}))
+
+        filas = paginacion.paginate_queryset(DireccionCliente.objects.order_by('departamento', 'id'), request)
+
+        self.assertIsNone(paginacion.keyset)
+        self.assertEqual(len(filas), 7)
+        self.assertIn('count', paginacion.get_paginated_response([]).data)
@@ -1,7 +1,8 @@
 # historial_medico/admin.py
 from django.contrib import admin
 from .models import (HistorialMedico, TipoConsulta, Consulta, 
-                     Tratamiento, TipoDocumento, Documento, Vacuna, MascotaVacuna)
+                     Tratamiento, TipoDocumento, Documento, Vacuna, MascotaVacuna,
+                     ArchivoAlmacenado)
 
 @admin.register(HistorialMedico)
 class HistorialMedicoAdmin(admin.ModelAdmin):
@@ -34,6 +35,11 @@ class DocumentoAdmin(admin.ModelAdmin):
     search_fields = ('mascota__nombre', 'nombre_archivo')
     list_filter = ('tipo_documento', 'fecha_subida')
 
+@admin.register(ArchivoAlmacenado)
+class ArchivoAlmacenadoAdmin(admin.ModelAdmin):
+    list_display = ('sha256', 'archivo', 'tamano', 'referencias', 'created_at')
+    search_fields = ('sha256', 'archivo')
+
 @admin.register(Vacuna)
 class VacunaAdmin(admin.ModelAdmin):
     list_display = ('nombre', 'especie', 'tipo', 'intervalo_revacunacion')
@@ -0,0 +1,105 @@
+# historial_medico/archivos.py
+"""
+Conteo de referencias de los archivos direccionados por contenido de Documento.
+
+El registro ArchivoAlmacenado de cada contenido también hace de lock, para
+que una subida nunca reutilice un archivo que se está borrando:
+
+- al guardar, el almacenamiento llama a reservar_archivo, que bloquea (o crea
+  sin referencias) el registro antes de decidir si reutiliza el archivo
+  existente; el lock dura hasta el fin de la transacción en que se crea el
+  Documento y post_save suma la referencia;
+- al quedar en cero referencias el registro se conserva y, después de
+  confirmar, borrar_si_sin_referencias lo bloquea y borra archivo y registro
+  solo si nadie volvió a referenciarlo.
+
+Un archivo escrito en una transacción que se revierte queda sin registro; lo
+elimina descartar_sin_registro (Documento.save lo llama si falla) o el
+comando ``limpiar_archivos``.
+"""
+from django.db import transaction
+from django.db.models import F
+
+from .models import ArchivoAlmacenado
+
+
+def _bloquear(sha256, nombre, tamano):
+    """
+    Bloquea hasta el fin de la transacción el registro de ``sha256``,
+    creándolo sin referencias si no existe. Devuelve (registro, creado).
+    """
+    return ArchivoAlmacenado.objects.select_for_update().get_or_create(
+        sha256=sha256, defaults={'archivo': nombre, 'tamano': tamano, 'referencias': 0}
+    )
+
+
+def reservar_archivo(sha256, nombre, tamano):
+    """
+    Llamada por el almacenamiento antes de escribir o reutilizar el archivo
+    ``nombre`` (ver core.almacenamiento.AlmacenamientoPorContenido).
+    """
+    with transaction.atomic():
+        _bloquear(sha256, nombre, tamano)
+
+
+def agregar_referencia(archivo):
+    """
+    Suma una referencia al blob de ``archivo`` (un FieldFile ya guardado).
+    """
+    sha256 = archivo.storage.hash_de(archivo.name)
+    if sha256 is None:
+        return
+    actualizados = ArchivoAlmacenado.objects.filter(pk=sha256).update(referencias=F('referencias') + 1)
+    if not actualizados:
+        registro, creado = ArchivoAlmacenado.objects.get_or_create(
+            sha256=sha256,
+            defaults={'archivo': archivo.name, 'tamano': archivo.storage.size(archivo.name), 'referencias': 1}
+        )
+        if not creado:
+            ArchivoAlmacenado.objects.filter(pk=sha256).update(referencias=F('referencias') + 1)
+
+
+def quitar_referencia(storage, nombre):
+    """
+    Resta una referencia y, si era la última, programa el borrado del archivo
+    para cuando se confirme la transacción.
+    """
+    sha256 = storage.hash_de(nombre)
+    if sha256 is None:
+        return
+    ArchivoAlmacenado.objects.filter(pk=sha256, referencias__gt=0).update(referencias=F('referencias') - 1)
+    if ArchivoAlmacenado.objects.filter(pk=sha256, referencias=0).exists():
+        transaction.on_commit(lambda: borrar_si_sin_referencias(storage, sha256, nombre))
+
+
+def borrar_si_sin_referencias(storage, sha256, nombre=None):
+    """
+    Borra el archivo y su registro si este sigue sin referencias, con el
+    registro bloqueado para que ninguna subida lo reutilice mientras tanto.
+    """
+    with transaction.atomic():
+        registro = ArchivoAlmacenado.objects.select_for_update().filter(pk=sha256, referencias=0).first()
+        if registro is None:
+            return False
+        # Un nombre con extensión de una versión anterior puede no estar en el registro
+        for archivo in {registro.archivo, nombre or registro.archivo}:
+            storage.delete(archivo)
+        registro.delete()
+    return True
+
+
+def descartar_sin_registro(storage, nombre):
+    """
+    Borra el archivo ``nombre`` si ningún registro lo respalda, p. ej. porque
+    se escribió en una transacción que se revirtió.
+    """
+    sha256 = storage.hash_de(nombre)
+    if sha256 is None:
+        return False
+    with transaction.atomic():
+        registro, creado = _bloquear(sha256, nombre, 0)
+        if not creado:
+            return False
+        storage.delete(nombre)
+        registro.delete()
+    return True
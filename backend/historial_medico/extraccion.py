@@ -0,0 +1,157 @@
+# historial_medico/extraccion.py
+"""
+Extracción de texto de documentos (DOCX, PDF, TXT) para la búsqueda.
+
+La extracción corre fuera del ciclo de la petición: al confirmarse la
+transacción que crea (o reemplaza el archivo de) un Documento, se encola en
+un pool de hilos del proceso. Con ``DOCUMENTOS_EXTRACCION_HILOS = 0`` no se
+encola nada y los pendientes los procesa ``manage.py extraer_texto_documentos``
+(útil como worker aparte o para procesar documentos antiguos).
+
+El texto se guarda en ``Documento.texto_extraido``; en PostgreSQL un trigger
+lo incorpora al tsvector ``busqueda``.
+"""
+import logging
+import os
+import re
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from xml.etree import ElementTree
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .models import Documento
+
+try:
+    from pypdf import PdfReader
+except ImportError:  # pragma: no cover - dependencia opcional
+    PdfReader = None
+
+logger = logging.getLogger(__name__)
+
+HILOS = getattr(settings, 'DOCUMENTOS_EXTRACCION_HILOS', 2)
+# Un tsvector de PostgreSQL no puede superar 1 MB
+MAXIMO_CARACTERES = getattr(settings, 'DOCUMENTOS_EXTRACCION_MAXIMO_CARACTERES', 200_000)
+
+NS_WORD = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+_pool = None
+_candado_pool = threading.Lock()
+
+
+class FormatoNoSoportado(Exception):
+    pass
+
+
+def extraer_docx(ruta):
+    partes = []
+    with zipfile.ZipFile(ruta) as archivo:
+        with archivo.open('word/document.xml') as xml:
+            for _, elemento in ElementTree.iterparse(xml):
+                if elemento.tag == NS_WORD + 't' and elemento.text:
+                    partes.append(elemento.text)
+                elif elemento.tag in (NS_WORD + 'p', NS_WORD + 'tab', NS_WORD + 'br'):
+                    partes.append('\n' if elemento.tag == NS_WORD + 'p' else ' ')
+                    elemento.clear()
+    return ''.join(partes)
+
+
+def extraer_pdf(ruta):
+    if PdfReader is None:
+        raise FormatoNoSoportado('Instale pypdf para extraer texto de PDF')
+    lector = PdfReader(ruta)
+    partes = []
+    largo = 0
+    for pagina in lector.pages:
+        texto = pagina.extract_text() or ''
+        partes.append(texto)
+        largo += len(texto)
+        if largo >= MAXIMO_CARACTERES:
+            break
+    return '\n'.join(partes)
+
+
+def extraer_txt(ruta):
+    with open(ruta, 'rb') as archivo:
+        crudo = archivo.read(MAXIMO_CARACTERES * 4)
+    try:
+        return crudo.decode('utf-8')
+    except UnicodeDecodeError:
+        return crudo.decode('latin-1')
+
+
+EXTRACTORES = {
+    '.docx': extraer_docx,
+    '.pdf': extraer_pdf,
+    '.txt': extraer_txt,
+}
+
+
+def extraer_texto(ruta, nombre):
+    """
+    Devuelve el texto normalizado del archivo; el formato se decide por la
+    extensión de ``nombre`` (el nombre original) o de ``ruta``.
+    """
+    extension = os.path.splitext(nombre or ruta)[1].lower() or os.path.splitext(ruta)[1].lower()
+    extractor = EXTRACTORES.get(extension)
+    if extractor is None:
+        raise FormatoNoSoportado(f'Formato {extension or "desconocido"} no soportado')
+    texto = extractor(ruta).replace('\x00', '')
+    texto = re.sub(r'[ \t\r\f\v]+', ' ', texto)
+    texto = re.sub(r'\n\s*\n+', '\n', texto).strip()
+    return texto[:MAXIMO_CARACTERES]
+
+
+def procesar_documento(documento_id):
+    """
+    Extrae y guarda el texto de un documento. El UPDATE se condiciona al
+    archivo leído para no pisar el resultado si el archivo se reemplazó
+    mientras tanto.
+    """
+    documento = Documento.objects.filter(pk=documento_id).only('id', 'url_archivo', 'nombre_archivo').first()
+    if documento is None or not documento.url_archivo:
+        return None
+    nombre_archivo = documento.url_archivo.name
+
+    # Mismo contenido ya procesado en otro documento: se reutiliza el texto
+    previo = Documento.objects.filter(
+        url_archivo=nombre_archivo, estado_extraccion='PROCESADO'
+    ).exclude(pk=documento_id).values_list('texto_extraido', flat=True).first()
+    if previo is not None:
+        texto, estado = previo, 'PROCESADO'
+    else:
+        try:
+            texto, estado = extraer_texto(documento.url_archivo.path, documento.nombre_archivo), 'PROCESADO'
+        except FormatoNoSoportado:
+            texto, estado = None, 'NO_SOPORTADO'
+        except Exception:
+            logger.exception('No se pudo extraer el texto del documento %s', documento_id)
+            texto, estado = None, 'ERROR'
+
+    Documento.objects.filter(pk=documento_id, url_archivo=nombre_archivo).update(
+        texto_extraido=texto, estado_extraccion=estado
+    )
+    return estado
+
+
+def _procesar_en_hilo(documento_id):
+    try:
+        procesar_documento(documento_id)
+    finally:
+        connection.close()
+
+
+def encolar_extraccion(documento_id):
+    """
+    Programa la extracción para después del commit. Sin hilos configurados
+    el documento queda PENDIENTE para el comando de management.
+    """
+    global _pool
+    if HILOS <= 0:
+        return
+    with _candado_pool:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=HILOS, thread_name_prefix='extraccion-documentos')
+    transaction.on_commit(lambda: _pool.submit(_procesar_en_hilo, documento_id))
@@ -0,0 +1,527 @@
+# historial_medico/importacion.py
+"""
+Importación masiva de registros históricos (clientes, mascotas, consultas,
+vacunaciones y pesos) desde archivos CSV o JSONL.
+
+El archivo se lee fila a fila y se inserta por lotes: en PostgreSQL cada lote
+se envía con un solo COPY y en otros motores con bulk_create. Las referencias
+se resuelven con diccionarios armados una vez al comenzar (RUT → cliente,
+microchip → mascota, nombre → vacuna, usuario → veterinario...), así que
+convertir una fila no consulta la base de datos.
+
+Ni COPY ni bulk_create disparan las señales por fila; lo que estas mantienen
+se actualiza en bloque al terminar: la aplicación vigente de cada vacuna y la
+caché de historial_completo. Las vacunaciones históricas no descuentan stock,
+ese consumo ya ocurrió en el sistema anterior.
+
+Las filas inválidas no detienen la importación: se informan como rechazos con
+su número de línea y el motivo. Todo el archivo se importa en una transacción.
+"""
+import csv
+import io
+import json
+import os
+from dataclasses import dataclass
+from datetime import date, datetime
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db import DataError, IntegrityError, connection, models, transaction
+
+from clientes.models import Cliente
+from inventario.models import LoteMedicamento
+from mascotas.cache import invalidar_historial
+from mascotas.models import Especie, Mascota, Raza, RegistroPeso
+from .models import Consulta, HistorialMedico, MascotaVacuna, TipoConsulta, Vacuna
+from .vacunas import actualizar_vigentes, calcular_fecha_proxima
+
+FORMATOS = ('csv', 'jsonl')
+TAMANO_LOTE = getattr(settings, 'IMPORTACION_TAMANO_LOTE', 5000)
+
+FORMATOS_FECHA = ('%d/%m/%Y', '%d-%m-%Y')
+VALORES_BOOLEANOS = {
+    'si': True, 'sí': True, 's': True, 'true': True, '1': True,
+    'no': False, 'n': False, 'false': False, '0': False,
+}
+
+
+class FilaInvalida(Exception):
+    pass
+
+
+@dataclass
+class ResultadoImportacion:
+    leidas: int = 0
+    importadas: int = 0
+    rechazadas: int = 0
+
+
+def detectar_formato(nombre):
+    extension = os.path.splitext(nombre or '')[1].lower()
+    return 'jsonl' if extension in ('.jsonl', '.ndjson', '.json') else 'csv'
+
+
+def leer_filas(archivo, formato):
+    """
+    Recorre un archivo binario y entrega (línea, fila, error) sin cargarlo
+    completo en memoria. Una línea JSON ilegible llega como ``{'_crudo': ...}``
+    con su error.
+    """
+    texto = io.TextIOWrapper(archivo, encoding='utf-8-sig', newline='')
+    if formato == 'csv':
+        lector = csv.DictReader(texto)
+        for fila in lector:
+            fila.pop(None, None)
+            yield lector.line_num, fila, None
+        return
+
+    for numero, linea in enumerate(texto, 1):
+        if not linea.strip():
+            continue
+        try:
+            fila = json.loads(linea)
+        except ValueError:
+            yield numero, {'_crudo': linea.rstrip('\r\n')}, 'JSON inválido'
+            continue
+        if not isinstance(fila, dict):
+            yield numero, {'_crudo': linea.rstrip('\r\n')}, 'Se esperaba un objeto JSON'
+        else:
+            yield numero, fila, None
+
+
+def _clave(valor):
+    return str(valor).strip().lower() if valor is not None else ''
+
+
+def _fecha(texto):
+    try:
+        return date.fromisoformat(texto)
+    except ValueError:
+        pass
+    for formato in FORMATOS_FECHA:
+        try:
+            return datetime.strptime(texto, formato).date()
+        except ValueError:
+            pass
+    # Se deja que el campo informe el error
+    return texto
+
+
+def _valor(modelo, nombre, crudo):
+    """
+    Convierte y valida un valor de la fila con las reglas del campo del modelo
+    (tipo, largo máximo, dígitos, choices, nulos). Acepta fechas dd/mm/aaaa,
+    decimales con coma y sí/no en los booleanos.
+    """
+    campo = modelo._meta.get_field(nombre)
+    if isinstance(crudo, str):
+        crudo = crudo.strip() or None
+    if crudo is None and campo.has_default():
+        return campo.get_default()
+    if isinstance(crudo, str):
+        if isinstance(campo, models.DateField) and not isinstance(campo, models.DateTimeField):
+            crudo = _fecha(crudo)
+        elif isinstance(campo, models.DecimalField):
+            crudo = crudo.replace(',', '.')
+        elif isinstance(campo, models.BooleanField):
+            crudo = VALORES_BOOLEANOS.get(crudo.lower(), crudo)
+    try:
+        return campo.clean(crudo, None)
+    except ValidationError as exc:
+        raise FilaInvalida(f"{nombre}: {' '.join(exc.messages)}")
+
+
+def _valores(modelo, fila, campos):
+    return {campo: _valor(modelo, campo, fila.get(campo)) for campo in campos}
+
+
+def _literal_copy(valor):
+    if valor is None:
+        return '\\N'
+    if isinstance(valor, bool):
+        return 't' if valor else 'f'
+    return '"' + str(valor).replace('"', '""') + '"'
+
+
+def _copiar(modelo, instancias):
+    """
+    Inserta las instancias con COPY ... FROM STDIN (CSV en memoria).
+    """
+    campos = [campo for campo in modelo._meta.concrete_fields if not isinstance(campo, models.AutoField)]
+    buffer = io.StringIO()
+    for instancia in instancias:
+        buffer.write(','.join(
+            _literal_copy(campo.get_db_prep_save(campo.pre_save(instancia, True), connection))
+            for campo in campos
+        ))
+        buffer.write('\n')
+    buffer.seek(0)
+    quote_name = connection.ops.quote_name
+    columnas = ', '.join(quote_name(campo.column) for campo in campos)
+    with connection.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY {quote_name(modelo._meta.db_table)} ({columnas}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+            buffer
+        )
+
+
+def _usar_copy():
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        # psycopg2; con otro driver se usa bulk_create
+        return hasattr(cursor.cursor, 'copy_expert')
+
+
+class Importador:
+    """
+    Convierte filas en instancias de ``modelo``. Las subclases arman sus
+    diccionarios de búsqueda en ``preparar`` y actualizan en ``finalizar`` lo
+    que normalmente mantienen las señales.
+    """
+    modelo = None
+
+    def __init__(self, veterinario=None):
+        self.veterinario_defecto = veterinario
+        self.mascota_ids = set()
+
+    def preparar(self):
+        pass
+
+    def convertir(self, fila):
+        raise NotImplementedError
+
+    def antes_de_escribir(self, instancias):
+        """
+        Completa el lote antes de insertarlo (fuera del savepoint del lote).
+        """
+
+    def finalizar(self):
+        invalidar_historial(*self.mascota_ids)
+
+
+class ImportadorConMascota(Importador):
+    """
+    Base de los registros que pertenecen a una mascota, identificada por
+    ``microchip`` o, si no tiene, por ``mascota_id``.
+    """
+    requiere_veterinario = False
+
+    def preparar(self):
+        self.mascotas = {}
+        self.especies_por_mascota = {}
+        for mascota_id, microchip, especie_id in Mascota.objects.values_list(
+                'id', 'microchip', 'especie_id').iterator(chunk_size=10000):
+            if microchip:
+                self.mascotas[_clave(microchip)] = mascota_id
+            self.especies_por_mascota[mascota_id] = especie_id
+
+        if self.requiere_veterinario:
+            self.veterinarios = {}
+            for usuario_id, username, email in get_user_model().objects.values_list('id', 'username', 'email'):
+                if email:
+                    self.veterinarios.setdefault(_clave(email), usuario_id)
+                self.veterinarios[_clave(username)] = usuario_id
+            if self.veterinario_defecto is not None:
+                defecto = self.veterinarios.get(_clave(self.veterinario_defecto))
+                if defecto is None:
+                    raise ValueError(f"No existe el usuario {self.veterinario_defecto}")
+                self.veterinario_defecto = defecto
+
+    def mascota(self, fila):
+        microchip = _clave(fila.get('microchip'))
+        if microchip:
+            mascota_id = self.mascotas.get(microchip)
+            if mascota_id is None:
+                raise FilaInvalida(f"No existe una mascota con microchip {fila['microchip']}")
+        else:
+            try:
+                mascota_id = int(fila.get('mascota_id') or '')
+            except (TypeError, ValueError):
+                raise FilaInvalida('Indique microchip o mascota_id')
+            if mascota_id not in self.especies_por_mascota:
+                raise FilaInvalida(f"No existe la mascota {mascota_id}")
+        self.mascota_ids.add(mascota_id)
+        return mascota_id
+
+    def veterinario(self, fila):
+        veterinario = _clave(fila.get('veterinario'))
+        if not veterinario:
+            if self.veterinario_defecto is None:
+                raise FilaInvalida('Falta veterinario')
+            return self.veterinario_defecto
+        usuario_id = self.veterinarios.get(veterinario)
+        if usuario_id is None:
+            raise FilaInvalida(f"No existe el usuario {fila['veterinario']}")
+        return usuario_id
+
+
+class ImportadorClientes(Importador):
+    modelo = Cliente
+    campos = ('nombre', 'apellido', 'rut', 'telefono', 'email', 'activo')
+
+    def preparar(self):
+        self.ruts = set()
+        self.emails = set()
+        for rut, email in Cliente.objects.values_list('rut', 'email').iterator(chunk_size=10000):
+            self.ruts.add(_clave(rut))
+            self.emails.add(_clave(email))
+
+    def convertir(self, fila):
+        valores = _valores(Cliente, fila, self.campos)
+        rut, email = _clave(valores['rut']), _clave(valores['email'])
+        if rut in self.ruts:
+            raise FilaInvalida(f"El RUT {valores['rut']} ya está registrado")
+        if email in self.emails:
+            raise FilaInvalida(f"El email {valores['email']} ya está registrado")
+        self.ruts.add(rut)
+        self.emails.add(email)
+        return Cliente(**valores)
+
+
+class ImportadorMascotas(Importador):
+    modelo = Mascota
+    campos = ('nombre', 'fecha_nacimiento', 'esterilizado', 'activo')
+
+    def preparar(self):
+        self.clientes = {
+            _clave(rut): cliente_id
+            for rut, cliente_id in Cliente.objects.values_list('rut', 'id').iterator(chunk_size=10000)
+        }
+        self.especies = {
+            _clave(nombre): especie_id for especie_id, nombre in Especie.objects.values_list('id', 'nombre')
+        }
+        self.razas = {
+            (especie_id, _clave(nombre)): raza_id
+            for raza_id, especie_id, nombre in Raza.objects.values_list('id', 'especie_id', 'nombre')
+        }
+        self.microchips = {
+            _clave(microchip) for microchip in
+            Mascota.objects.exclude(microchip=None).values_list('microchip', flat=True).iterator(chunk_size=10000)
+        }
+
+    def convertir(self, fila):
+        cliente_id = self.clientes.get(_clave(fila.get('cliente_rut')))
+        if cliente_id is None:
+            raise FilaInvalida(f"No existe un cliente con RUT {fila.get('cliente_rut')}")
+        especie_id = self.especies.get(_clave(fila.get('especie')))
+        if especie_id is None:
+            raise FilaInvalida(f"Especie desconocida: {fila.get('especie')}")
+        raza_id = self.razas.get((especie_id, _clave(fila.get('raza'))))
+        if raza_id is None:
+            raise FilaInvalida(f"Raza desconocida para la especie: {fila.get('raza')}")
+
+        valores = _valores(Mascota, fila, self.campos)
+        # Macho/Hembra -> M/H
+        valores['sexo'] = _valor(Mascota, 'sexo', _clave(fila.get('sexo'))[:1].upper())
+        valores['microchip'] = _valor(Mascota, 'microchip', fila.get('microchip'))
+        if valores['microchip']:
+            microchip = _clave(valores['microchip'])
+            if microchip in self.microchips:
+                raise FilaInvalida(f"El microchip {valores['microchip']} ya está registrado")
+            self.microchips.add(microchip)
+        return Mascota(cliente_id=cliente_id, especie_id=especie_id, raza_id=raza_id, **valores)
+
+
+class ImportadorConsultas(ImportadorConMascota):
+    modelo = Consulta
+    requiere_veterinario = True
+    campos = ('fecha', 'motivo_consulta', 'diagnostico', 'observaciones',
+              'temperatura', 'peso', 'sintomas', 'tratamiento')
+
+    def preparar(self):
+        super().preparar()
+        self.tipos = {_clave(nombre): tipo_id for tipo_id, nombre in TipoConsulta.objects.values_list('id', 'nombre')}
+        self.historiales = dict(HistorialMedico.objects.values_list('mascota_id', 'id').iterator(chunk_size=10000))
+
+    def convertir(self, fila):
+        tipo_id = self.tipos.get(_clave(fila.get('tipo_consulta')))
+        if tipo_id is None:
+            raise FilaInvalida(f"Tipo de consulta desconocido: {fila.get('tipo_consulta')}")
+        consulta = Consulta(
+            tipo_consulta_id=tipo_id,
+            veterinario_id=self.veterinario(fila),
+            **_valores(Consulta, fila, self.campos)
+        )
+        consulta._mascota_id = self.mascota(fila)
+        return consulta
+
+    def antes_de_escribir(self, instancias):
+        # Historial de las mascotas que aún no tienen uno, en un solo INSERT
+        faltantes = {}
+        for consulta in instancias:
+            if consulta._mascota_id not in self.historiales:
+                faltantes.setdefault(consulta._mascota_id, consulta.veterinario_id)
+        if faltantes:
+            HistorialMedico.objects.bulk_create([
+                HistorialMedico(mascota_id=mascota_id, veterinario_id=veterinario_id)
+                for mascota_id, veterinario_id in faltantes.items()
+            ])
+            self.historiales.update(HistorialMedico.objects.filter(
+                mascota_id__in=faltantes
+            ).values_list('mascota_id', 'id'))
+        for consulta in instancias:
+            consulta.historial_id = self.historiales[consulta._mascota_id]
+
+
+class ImportadorVacunaciones(ImportadorConMascota):
+    modelo = MascotaVacuna
+    requiere_veterinario = True
+
+    def preparar(self):
+        super().preparar()
+        self.vacunas = {}
+        for vacuna_id, nombre, especie_id, intervalo in Vacuna.objects.values_list(
+                'id', 'nombre', 'especie_id', 'intervalo_revacunacion'):
+            self.vacunas[(_clave(nombre), especie_id)] = (vacuna_id, intervalo)
+        self.lotes = {}
+        for lote_id, numero, medicamento in LoteMedicamento.objects.values_list(
+                'id', 'numero_lote', 'medicamento__nombre').iterator(chunk_size=10000):
+            self.lotes.setdefault(_clave(numero), []).append((lote_id, _clave(medicamento)))
+
+    def lote(self, fila):
+        candidatos = self.lotes.get(_clave(fila.get('lote')), [])
+        medicamento = _clave(fila.get('medicamento'))
+        if medicamento:
+            candidatos = [candidato for candidato in candidatos if candidato[1] == medicamento]
+        if not candidatos:
+            raise FilaInvalida(f"Lote desconocido: {fila.get('lote')}")
+        if len(candidatos) > 1:
+            raise FilaInvalida(f"El lote {fila.get('lote')} existe para varios medicamentos; indique medicamento")
+        return candidatos[0][0]
+
+    def convertir(self, fila):
+        mascota_id = self.mascota(fila)
+        vacuna = self.vacunas.get((_clave(fila.get('vacuna')), self.especies_por_mascota[mascota_id]))
+        if vacuna is None:
+            raise FilaInvalida(f"Vacuna desconocida para la especie de la mascota: {fila.get('vacuna')}")
+        vacuna_id, intervalo = vacuna
+
+        valores = _valores(MascotaVacuna, fila, ('fecha_aplicacion', 'fecha_proxima', 'observaciones'))
+        valores['fecha_proxima_calculada'] = valores['fecha_proxima'] is None
+        if valores['fecha_proxima_calculada']:
+            valores['fecha_proxima'] = calcular_fecha_proxima(valores['fecha_aplicacion'], intervalo)
+        return MascotaVacuna(
+            mascota_id=mascota_id,
+            vacuna_id=vacuna_id,
+            veterinario_id=self.veterinario(fila),
+            lote_id=self.lote(fila),
+            **valores
+        )
+
+    def finalizar(self):
+        actualizar_vigentes(self.mascota_ids)
+        super().finalizar()
+
+
+class ImportadorPesos(ImportadorConMascota):
+    modelo = RegistroPeso
+
+    def convertir(self, fila):
+        if not fila.get('fecha_registro') and fila.get('fecha'):
+            fila = dict(fila, fecha_registro=fila['fecha'])
+        return RegistroPeso(
+            mascota_id=self.mascota(fila),
+            **_valores(RegistroPeso, fila, ('peso', 'fecha_registro', 'notas'))
+        )
+
+
+IMPORTADORES = {
+    'clientes': ImportadorClientes,
+    'mascotas': ImportadorMascotas,
+    'consultas': ImportadorConsultas,
+    'vacunaciones': ImportadorVacunaciones,
+    'pesos': ImportadorPesos,
+}
+
+
+def importar(tipo, archivo, formato='csv', al_rechazar=None, veterinario=None, tamano_lote=TAMANO_LOTE):
+    """
+    Importa las filas de ``archivo`` (abierto en modo binario) como registros
+    de ``tipo``. ``al_rechazar(linea, fila, motivo)`` recibe cada fila
+    descartada y ``veterinario`` (usuario o email) se usa en las filas que no
+    indican uno. Devuelve un ResultadoImportacion.
+    """
+    importador = IMPORTADORES[tipo](veterinario=veterinario)
+    resultado = ResultadoImportacion()
+    usar_copy = _usar_copy()
+
+    def rechazar(linea, fila, motivo):
+        resultado.rechazadas += 1
+        if al_rechazar is not None:
+            al_rechazar(linea, fila, motivo)
+
+    def escribir(pendientes):
+        instancias = [instancia for _, _, instancia in pendientes]
+        importador.antes_de_escribir(instancias)
+        try:
+            with transaction.atomic():
+                if usar_copy:
+                    _copiar(importador.modelo, instancias)
+                else:
+                    importador.modelo.objects.bulk_create(instancias)
+            resultado.importadas += len(instancias)
+            return
+        except (IntegrityError, DataError):
+            pass
+        # Alguna fila choca con la base (p. ej. un duplicado): se reintenta de a una
+        for linea, fila, instancia in pendientes:
+            try:
+                with transaction.atomic():
+                    importador.modelo.objects.bulk_create([instancia])
+                resultado.importadas += 1
+            except (IntegrityError, DataError) as exc:
+                rechazar(linea, fila, str(exc).strip())
+
+    with transaction.atomic():
+        importador.preparar()
+        pendientes = []
+        for linea, fila, error in leer_filas(archivo, formato):
+            resultado.leidas += 1
+            if error:
+                rechazar(linea, fila, error)
+                continue
+            try:
+                pendientes.append((linea, fila, importador.convertir(fila)))
+            except FilaInvalida as exc:
+                rechazar(linea, fila, str(exc))
+                continue
+            if len(pendientes) >= tamano_lote:
+                escribir(pendientes)
+                pendientes = []
+        if pendientes:
+            escribir(pendientes)
+        importador.finalizar()
+    return resultado
+
+
+class EscritorRechazos:
+    """
+    Escribe las filas rechazadas en el mismo formato del archivo importado,
+    con las columnas ``_linea`` y ``_motivo`` agregadas, para corregirlas y
+    volver a importarlas. El archivo se crea con el primer rechazo.
+    """
+    def __init__(self, ruta, formato):
+        self.ruta = ruta
+        self.formato = formato
+        self.archivo = None
+        self.escritor = None
+
+    def __call__(self, linea, fila, motivo):
+        if self.archivo is None:
+            self.archivo = open(self.ruta, 'w', encoding='utf-8', newline='')
+            if self.formato == 'csv':
+                self.escritor = csv.DictWriter(
+                    self.archivo, fieldnames=['_linea', '_motivo', *fila], extrasaction='ignore'
+                )
+                self.escritor.writeheader()
+        registro = {'_linea': linea, '_motivo': motivo, **fila}
+        if self.escritor is not None:
+            self.escritor.writerow(registro)
+        else:
+            self.archivo.write(json.dumps(registro, ensure_ascii=False, default=str) + '\n')
+
+    def cerrar(self):
+        if self.archivo is not None:
+            self.archivo.close()
@@ -0,0 +1,60 @@
+# historial_medico/management/commands/deduplicar_documentos.py
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+
+from historial_medico.models import ArchivoAlmacenado, Documento
+
+
+class Command(BaseCommand):
+    help = (
+        "Pasa al almacenamiento por contenido los archivos de documentos guardados con otro "
+        "nombre (uuid de versiones anteriores o hash con extensión): cada archivo se vuelve a "
+        "guardar bajo su SHA-256, los documentos que lo usaban pasan a apuntar al blob "
+        "compartido y el archivo anterior se borra. Se puede ejecutar de nuevo sin efecto."
+    )
+
+    def handle(self, *args, **options):
+        storage = Documento._meta.get_field('url_archivo').storage
+        anteriores = (
+            Documento.objects.exclude(url_archivo='')
+            .values_list('url_archivo', flat=True).distinct().order_by('url_archivo')
+        )
+
+        migrados = documentos = faltantes = 0
+        for anterior in anteriores.iterator():
+            sha256 = storage.hash_de(anterior)
+            if sha256 is not None and anterior == storage.nombre_para(sha256):
+                continue
+            if not storage.exists(anterior):
+                self.stderr.write(f"No existe el archivo {anterior}")
+                faltantes += 1
+                continue
+            documentos += self.migrar(storage, anterior)
+            migrados += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Archivos migrados: {migrados} ({documentos} documentos); {faltantes} no encontrados"
+        ))
+
+    def migrar(self, storage, anterior):
+        """
+        Guarda ``anterior`` bajo su hash y mueve a él los documentos que lo
+        usan. Devuelve la cantidad de documentos actualizados.
+        """
+        with transaction.atomic():
+            # save reserva (y bloquea) el registro del contenido, igual que una subida
+            with storage.open(anterior) as contenido:
+                nuevo = storage.save(anterior, contenido)
+            sha256 = storage.hash_de(nuevo)
+            # Sin señales: el contenido no cambia, así que el texto extraído sigue valiendo
+            actualizados = Documento.objects.filter(url_archivo=anterior).update(url_archivo=nuevo)
+            if storage.hash_de(anterior) == sha256:
+                # Hash con extensión: sus referencias ya estaban contadas en el registro
+                ArchivoAlmacenado.objects.filter(pk=sha256).update(archivo=nuevo)
+            else:
+                ArchivoAlmacenado.objects.filter(pk=sha256).update(
+                    archivo=nuevo, referencias=F('referencias') + actualizados
+                )
+            transaction.on_commit(lambda: storage.delete(anterior))
+        return actualizados
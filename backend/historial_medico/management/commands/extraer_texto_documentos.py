@@ -0,0 +1,54 @@
+# historial_medico/management/commands/extraer_texto_documentos.py
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from historial_medico.extraccion import procesar_documento
+from historial_medico.models import Documento
+
+
+def _inicializar_proceso():
+    # Cada proceso hijo abre sus propias conexiones
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        "Extrae el texto de los documentos pendientes usando un pool de procesos. "
+        "Con --continuo queda corriendo como worker y revisa la cola cada --intervalo segundos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--procesos', type=int, default=2)
+        parser.add_argument('--lote', type=int, default=100)
+        parser.add_argument('--reintentar-errores', action='store_true')
+        parser.add_argument('--continuo', action='store_true')
+        parser.add_argument('--intervalo', type=int, default=10)
+
+    def handle(self, *args, **options):
+        estados = ['PENDIENTE'] + (['ERROR'] if options['reintentar_errores'] else [])
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=options['procesos'], initializer=_inicializar_proceso) as pool:
+            while True:
+                resumen = Counter()
+                ultimo_id = 0
+                while True:
+                    ids = list(
+                        Documento.objects.filter(estado_extraccion__in=estados, id__gt=ultimo_id)
+                        .order_by('id').values_list('id', flat=True)[:options['lote']]
+                    )
+                    if not ids:
+                        break
+                    ultimo_id = ids[-1]
+                    resumen.update(estado for estado in pool.map(procesar_documento, ids) if estado)
+                    connections.close_all()
+
+                if resumen or not options['continuo']:
+                    detalle = ', '.join(f"{estado}: {total}" for estado, total in sorted(resumen.items()))
+                    self.stdout.write(self.style.SUCCESS(f"Documentos procesados. {detalle or 'Sin pendientes'}"))
+                if not options['continuo']:
+                    break
+                time.sleep(options['intervalo'])
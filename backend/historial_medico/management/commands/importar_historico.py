@@ -0,0 +1,58 @@
+# historial_medico/management/commands/importar_historico.py
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from historial_medico.importacion import (FORMATOS, IMPORTADORES, TAMANO_LOTE, EscritorRechazos,
+                                          detectar_formato, importar)
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa registros históricos desde un archivo CSV o JSONL. Importe en orden "
+        "clientes, mascotas y luego consultas, vacunaciones y pesos. Las filas rechazadas "
+        "se escriben junto al archivo (<archivo>.rechazos.<ext>) o en --rechazos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('tipo', choices=sorted(IMPORTADORES))
+        parser.add_argument('archivo')
+        parser.add_argument('--formato', choices=FORMATOS,
+                            help="Por defecto se deduce de la extensión del archivo.")
+        parser.add_argument('--rechazos', help="Ruta del archivo de rechazos.")
+        parser.add_argument('--veterinario',
+                            help="Usuario o email asignado a las filas sin veterinario.")
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE)
+
+    def handle(self, *args, **options):
+        ruta = options['archivo']
+        if not os.path.isfile(ruta):
+            raise CommandError(f"No existe el archivo {ruta}")
+        formato = options['formato'] or detectar_formato(ruta)
+        ruta_rechazos = options['rechazos'] or f"{ruta}.rechazos.{formato}"
+        rechazos = EscritorRechazos(ruta_rechazos, formato)
+
+        inicio = time.monotonic()
+        try:
+            with open(ruta, 'rb') as archivo:
+                resultado = importar(
+                    options['tipo'], archivo, formato,
+                    al_rechazar=rechazos,
+                    veterinario=options['veterinario'],
+                    tamano_lote=max(options['lote'], 1),
+                )
+        except ValueError as e:
+            raise CommandError(str(e))
+        finally:
+            rechazos.cerrar()
+
+        segundos = time.monotonic() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f"{resultado.importadas} de {resultado.leidas} filas importadas en {segundos:.1f} s "
+            f"({resultado.importadas / max(segundos, 0.001):.0f} filas/s)"
+        ))
+        if resultado.rechazadas:
+            self.stdout.write(self.style.WARNING(
+                f"{resultado.rechazadas} filas rechazadas, ver {ruta_rechazos}"
+            ))
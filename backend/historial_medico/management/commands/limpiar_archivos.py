@@ -0,0 +1,54 @@
+# historial_medico/management/commands/limpiar_archivos.py
+import datetime
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from historial_medico.archivos import borrar_si_sin_referencias, descartar_sin_registro
+from historial_medico.models import ArchivoAlmacenado, Documento
+
+
+class Command(BaseCommand):
+    help = (
+        "Borra los archivos de documentos que quedaron sin referencias: registros en cero "
+        "cuyo borrado no llegó a ejecutarse, archivos sin registro (escritos en una "
+        "transacción que se revirtió) y temporales abandonados."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--horas', type=int, default=24,
+            help="Solo considera archivos sin registro y temporales más antiguos que esto (por defecto 24)."
+        )
+
+    def handle(self, *args, **options):
+        storage = Documento._meta.get_field('url_archivo').storage
+        limite = time.time() - datetime.timedelta(hours=options['horas']).total_seconds()
+
+        sin_referencias = 0
+        for sha256 in ArchivoAlmacenado.objects.filter(referencias=0).values_list('sha256', flat=True):
+            sin_referencias += borrar_si_sin_referencias(storage, sha256)
+
+        sin_registro = 0
+        raiz = storage.path(storage.prefijo)
+        for directorio, _, archivos in os.walk(raiz):
+            for archivo in archivos:
+                ruta = os.path.join(directorio, archivo)
+                nombre = os.path.relpath(ruta, storage.location).replace(os.sep, '/')
+                if os.path.getmtime(ruta) < limite:
+                    sin_registro += descartar_sin_registro(storage, nombre)
+
+        temporales = 0
+        directorio_temporal = storage.path('.tmp')
+        if os.path.isdir(directorio_temporal):
+            for archivo in os.listdir(directorio_temporal):
+                ruta = os.path.join(directorio_temporal, archivo)
+                if os.path.getmtime(ruta) < limite:
+                    os.remove(ruta)
+                    temporales += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Archivos borrados: {sin_referencias} sin referencias, {sin_registro} sin registro, "
+            f"{temporales} temporales"
+        ))
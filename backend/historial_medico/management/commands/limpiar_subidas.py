@@ -0,0 +1,32 @@
+# historial_medico/management/commands/limpiar_subidas.py
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from historial_medico.models import SubidaDocumento
+from historial_medico.subidas import descartar_archivo
+
+
+class Command(BaseCommand):
+    help = (
+        "Elimina las subidas por partes abandonadas (sin actividad durante "
+        "DOCUMENTOS_SUBIDA_HORAS_EXPIRACION horas) y sus archivos temporales."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--horas', type=int,
+            default=getattr(settings, 'DOCUMENTOS_SUBIDA_HORAS_EXPIRACION', 48)
+        )
+
+    def handle(self, *args, **options):
+        limite = timezone.now() - datetime.timedelta(hours=options['horas'])
+        abandonadas = SubidaDocumento.objects.filter(estado='PENDIENTE', updated_at__lt=limite)
+        total = 0
+        for subida in abandonadas.iterator():
+            descartar_archivo(subida)
+            subida.delete()
+            total += 1
+        self.stdout.write(self.style.SUCCESS(f"Subidas eliminadas: {total}"))
@@ -0,0 +1,26 @@
+# historial_medico/management/commands/recalcular_fechas_vacunas.py
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from historial_medico.vacunas import recalcular_fechas_proximas
+from mascotas.cache import invalidar_historial
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula fecha_proxima de las vacunas aplicadas con el intervalo actual de "
+        "cada vacuna (las fechas fijadas a mano no se tocan)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vacuna', type=int, action='append', dest='vacunas',
+                            help="ID de vacuna; se puede repetir. Por defecto, todas.")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            total, mascota_ids = recalcular_fechas_proximas(options['vacunas'])
+            # El UPDATE en bloque no dispara señales
+            invalidar_historial(*mascota_ids)
+        self.stdout.write(self.style.SUCCESS(
+            f"Fechas recalculadas: {total} aplicaciones de {len(mascota_ids)} mascotas"
+        ))
@@ -0,0 +1,25 @@
+# Generated by Django 5.0.6 on 2026-10-18 00:09
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("historial_medico", "0002_consulta_cita_relacionada_consulta_peso_and_more"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name="consulta",
+            name="unique_consulta_per_cita",
+        ),
+        migrations.AddConstraint(
+            model_name="consulta",
+            constraint=models.UniqueConstraint(
+                fields=("historial", "cita_relacionada"),
+                name="unique_consulta_por_cita_relacionada",
+            ),
+        ),
+    ]
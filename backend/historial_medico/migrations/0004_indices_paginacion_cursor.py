@@ -0,0 +1,27 @@
+# Generated by Django 5.0.6 on 2026-10-18 00:13
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("historial_medico", "0003_consulta_unica_por_cita"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="consulta",
+            index=models.Index(
+                fields=["-fecha", "id"], name="hm_consulta_fecha_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="consulta",
+            index=models.Index(
+                fields=["historial", "-fecha", "id"],
+                name="hm_consulta_hist_fecha_id_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.0.6 on 2026-10-18 00:19
+
+import core.almacenamiento
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("historial_medico", "0005_busqueda_texto_completo"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivoAlmacenado",
+            fields=[
+                (
+                    "sha256",
+                    models.CharField(max_length=64, primary_key=True, serialize=False),
+                ),
+                ("archivo", models.CharField(max_length=255)),
+                ("tamano", models.BigIntegerField()),
+                ("referencias", models.PositiveIntegerField(default=0)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "verbose_name": "Archivo Almacenado",
+                "verbose_name_plural": "Archivos Almacenados",
+            },
+        ),
+        migrations.AlterField(
+            model_name="documento",
+            name="url_archivo",
+            field=models.FileField(
+                max_length=255,
+                storage=core.almacenamiento.almacenamiento_documentos,
+                upload_to="documentos/",
+            ),
+        ),
+    ]
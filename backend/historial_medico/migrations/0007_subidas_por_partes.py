@@ -0,0 +1,94 @@
+# Generated by Django 5.0.6 on 2026-10-18 00:23
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("historial_medico", "0006_almacenamiento_por_contenido"),
+        ("mascotas", "0001_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SubidaDocumento",
+            fields=[
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("nombre_archivo", models.CharField(max_length=255)),
+                ("notas", models.TextField(blank=True, null=True)),
+                ("tamano_total", models.BigIntegerField()),
+                ("sha256", models.CharField(blank=True, max_length=64)),
+                ("recibido", models.BigIntegerField(default=0)),
+                (
+                    "estado",
+                    models.CharField(
+                        choices=[
+                            ("PENDIENTE", "Pendiente"),
+                            ("COMPLETADA", "Completada"),
+                        ],
+                        default="PENDIENTE",
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "documento",
+                    models.OneToOneField(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="subida",
+                        to="historial_medico.documento",
+                    ),
+                ),
+                (
+                    "historial",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="historial_medico.historialmedico",
+                    ),
+                ),
+                (
+                    "mascota",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="mascotas.mascota",
+                    ),
+                ),
+                (
+                    "tipo_documento",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.PROTECT,
+                        to="historial_medico.tipodocumento",
+                    ),
+                ),
+                (
+                    "usuario",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="subidas_documento",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Subida de Documento",
+                "verbose_name_plural": "Subidas de Documento",
+            },
+        ),
+    ]
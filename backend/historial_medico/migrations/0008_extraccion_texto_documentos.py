@@ -0,0 +1,94 @@
+# Generated by Django 5.0.6 on 2026-10-18 00:24
+
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+# Trigger del tsvector en español, índice GIN sobre él e índices de trigramas
+# para la búsqueda tolerante a errores de tipeo (solo PostgreSQL)
+SQL_CREAR = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """
+    CREATE OR REPLACE FUNCTION historial_medico_documento_busqueda() RETURNS trigger AS $$
+    BEGIN
+        NEW.busqueda := setweight(to_tsvector('spanish', coalesce(NEW.nombre_archivo, '')), 'A') ||
+            setweight(to_tsvector('spanish', coalesce(NEW.notas, '')), 'B') ||
+            setweight(to_tsvector('spanish', coalesce(NEW.texto_extraido, '')), 'C');
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER historial_medico_documento_busqueda
+    BEFORE INSERT OR UPDATE OF nombre_archivo, notas, texto_extraido ON historial_medico_documento
+    FOR EACH ROW EXECUTE FUNCTION historial_medico_documento_busqueda()
+    """,
+    """
+    UPDATE historial_medico_documento SET busqueda =
+        setweight(to_tsvector('spanish', coalesce(nombre_archivo, '')), 'A') ||
+        setweight(to_tsvector('spanish', coalesce(notas, '')), 'B') ||
+        setweight(to_tsvector('spanish', coalesce(texto_extraido, '')), 'C')
+    """,
+    "CREATE INDEX IF NOT EXISTS historial_medico_documento_busqueda_gin ON historial_medico_documento USING gin (busqueda)",
+    "CREATE INDEX IF NOT EXISTS historial_medico_documento_nombre_archivo_trgm ON historial_medico_documento USING gin (nombre_archivo gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS historial_medico_documento_notas_trgm ON historial_medico_documento USING gin (notas gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS historial_medico_documento_texto_extraido_trgm ON historial_medico_documento USING gin (texto_extraido gin_trgm_ops)",
+]
+
+SQL_REVERTIR = [
+    "DROP TRIGGER IF EXISTS historial_medico_documento_busqueda ON historial_medico_documento",
+    "DROP FUNCTION IF EXISTS historial_medico_documento_busqueda()",
+    "DROP INDEX IF EXISTS historial_medico_documento_busqueda_gin",
+    "DROP INDEX IF EXISTS historial_medico_documento_nombre_archivo_trgm",
+    "DROP INDEX IF EXISTS historial_medico_documento_notas_trgm",
+    "DROP INDEX IF EXISTS historial_medico_documento_texto_extraido_trgm",
+]
+
+
+def crear_indice_busqueda(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        for sql in SQL_CREAR:
+            schema_editor.execute(sql)
+
+
+def revertir_indice_busqueda(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        for sql in SQL_REVERTIR:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("historial_medico", "0007_subidas_por_partes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="documento",
+            name="busqueda",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="documento",
+            name="estado_extraccion",
+            field=models.CharField(
+                choices=[
+                    ("PENDIENTE", "Pendiente"),
+                    ("PROCESADO", "Procesado"),
+                    ("NO_SOPORTADO", "Formato no soportado"),
+                    ("ERROR", "Error"),
+                ],
+                default="PENDIENTE",
+                editable=False,
+                max_length=20,
+            ),
+        ),
+        migrations.AddField(
+            model_name="documento",
+            name="texto_extraido",
+            field=models.TextField(blank=True, editable=False, null=True),
+        ),
+        # Trigger del tsvector e índices GIN/trigramas (solo PostgreSQL)
+        migrations.RunPython(crear_indice_busqueda, revertir_indice_busqueda),
+    ]
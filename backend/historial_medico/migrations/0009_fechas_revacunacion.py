@@ -0,0 +1,81 @@
+# Generated by Django 5.0.6 on 2026-10-18 00:26
+
+from django.conf import settings
+import datetime
+
+from django.db import migrations, models
+from django.db.models import DateField, ExpressionWrapper, F, OuterRef, Subquery
+
+
+def completar_fechas_y_vigentes(apps, schema_editor):
+    MascotaVacuna = apps.get_model("historial_medico", "MascotaVacuna")
+    Vacuna = apps.get_model("historial_medico", "Vacuna")
+
+    # Las fechas ya cargadas se consideran fijadas a mano
+    MascotaVacuna.objects.filter(fecha_proxima__isnull=False).update(
+        fecha_proxima_calculada=False
+    )
+    for vacuna_id, intervalo in Vacuna.objects.values_list(
+        "id", "intervalo_revacunacion"
+    ):
+        MascotaVacuna.objects.filter(
+            vacuna_id=vacuna_id, fecha_proxima__isnull=True
+        ).update(
+            fecha_proxima=ExpressionWrapper(
+                F("fecha_aplicacion") + datetime.timedelta(days=intervalo),
+                output_field=DateField(),
+            )
+        )
+
+    ultima = MascotaVacuna.objects.filter(
+        mascota_id=OuterRef("mascota_id"), vacuna_id=OuterRef("vacuna_id")
+    ).order_by("-fecha_aplicacion", "-id")
+    MascotaVacuna.objects.filter(pk=Subquery(ultima.values("pk")[:1])).update(
+        vigente=True
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("historial_medico", "0008_extraccion_texto_documentos"),
+        ("inventario", "0002_indices_paginacion_cursor"),
+        ("mascotas", "0001_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="mascotavacuna",
+            name="fecha_proxima_calculada",
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name="mascotavacuna",
+            name="vigente",
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(completar_fechas_y_vigentes, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="mascotavacuna",
+            index=models.Index(
+                condition=models.Q(("vigente", True)),
+                fields=["fecha_proxima", "id"],
+                name="hm_vacuna_pendiente_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="mascotavacuna",
+            index=models.Index(
+                fields=["mascota", "vacuna", "-fecha_aplicacion", "-id"],
+                name="hm_vacuna_ultima_idx",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="mascotavacuna",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("vigente", True)),
+                fields=("mascota", "vacuna"),
+                name="unique_vacuna_vigente_por_mascota",
+            ),
+        ),
+    ]
@@ -0,0 +1,28 @@
+from django.db import migrations
+
+TABLA = "historial_medico_documento"
+
+
+def borrar_indice(apps, schema_editor):
+    # texto_extraido queda solo en el tsvector; el índice de trigramas sobre
+    # textos de hasta 200k caracteres es caro de mantener y no se usa
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(f"DROP INDEX IF EXISTS {TABLA}_texto_extraido_trgm")
+
+
+def crear_indice(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {TABLA}_texto_extraido_trgm "
+            f"ON {TABLA} USING gin (texto_extraido gin_trgm_ops)"
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("historial_medico", "0010_particionar_consulta"),
+    ]
+
+    operations = [
+        migrations.RunPython(borrar_indice, crear_indice),
+    ]
@@ -1,6 +1,10 @@
 # historial_medico/models.py
-from django.db import models
+import uuid
+
+from django.db import models, transaction
 from django.conf import settings
+from django.contrib.postgres.search import SearchVectorField
+from core.almacenamiento import almacenamiento_documentos
 from core.models import BaseModel
 from mascotas.models import Mascota
 
@@ -71,6 +75,9 @@ class Consulta(BaseModel):
     # Campo para vincular con la cita original (si existe)
     cita_relacionada = models.PositiveIntegerField(null=True, blank=True, 
                                                   help_text="ID de la cita original en el módulo de citas")
+    
+    # Vector de búsqueda (diagnóstico + motivo) que mantiene un trigger en PostgreSQL
+    busqueda = SearchVectorField(null=True, editable=False)
 
     def __str__(self):
         return f"Consulta de {self.historial.mascota.nombre} - {self.fecha}"
@@ -78,11 +85,18 @@ class Consulta(BaseModel):
     class Meta:
         verbose_name = "Consulta"
         verbose_name_plural = "Consultas"
-        # Evitar duplicados con un índice único
+        # Paginación por cursor sobre (-fecha, id), global y por historial
+        indexes = [
+            models.Index(fields=['-fecha', 'id'], name='hm_consulta_fecha_id_idx'),
+            models.Index(fields=['historial', '-fecha', 'id'], name='hm_consulta_hist_fecha_id_idx'),
+        ]
+        # Una sola entrada por cita; también es el objetivo del upsert al completar la cita.
+        # Incluye fecha porque la tabla está particionada por fecha (ver core.particiones);
+        # una sola entrada por cita la garantiza citas.services.registrar_en_historial
         constraints = [
             models.UniqueConstraint(
-                fields=['historial', 'fecha', 'cita_relacionada'],
-                name='unique_consulta_per_cita'
+                fields=['historial', 'cita_relacionada', 'fecha'],
+                name='unique_consulta_por_cita_y_fecha'
             )
         ]
 
@@ -120,6 +134,25 @@ class TipoDocumento(BaseModel):
         verbose_name_plural = "Tipos de Documento"
 
 
+class ArchivoAlmacenado(models.Model):
+    """
+    Archivo físico único (por SHA-256) y cuántos Documento lo referencian;
+    el archivo se borra del disco cuando deja de tener referencias.
+    """
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    archivo = models.CharField(max_length=255)
+    tamano = models.BigIntegerField()
+    referencias = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.archivo} ({self.referencias} referencias)"
+
+    class Meta:
+        verbose_name = "Archivo Almacenado"
+        verbose_name_plural = "Archivos Almacenados"
+
+
 class Documento(BaseModel):
     mascota = models.ForeignKey(
         Mascota,
@@ -138,7 +171,11 @@ class Documento(BaseModel):
         on_delete=models.PROTECT
     )
     nombre_archivo = models.CharField(max_length=255)
-    url_archivo = models.FileField(upload_to='documentos/')
+    url_archivo = models.FileField(
+        upload_to='documentos/',
+        storage=almacenamiento_documentos,
+        max_length=255
+    )
     fecha_subida = models.DateTimeField(auto_now_add=True)
     usuario = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -147,14 +184,87 @@ class Documento(BaseModel):
         related_name='documentos_subidos'
     )
     notas = models.TextField(blank=True, null=True)
+    ESTADOS_EXTRACCION = [
+        ('PENDIENTE', 'Pendiente'),
+        ('PROCESADO', 'Procesado'),
+        ('NO_SOPORTADO', 'Formato no soportado'),
+        ('ERROR', 'Error'),
+    ]
+    texto_extraido = models.TextField(null=True, blank=True, editable=False)
+    estado_extraccion = models.CharField(
+        max_length=20,
+        choices=ESTADOS_EXTRACCION,
+        default='PENDIENTE',
+        editable=False
+    )
+    # Mantenido por un trigger en PostgreSQL (ver core.busqueda)
+    busqueda = SearchVectorField(null=True, editable=False)
 
     def __str__(self):
         return f"{self.tipo_documento.nombre} - {self.mascota.nombre}"
 
+    def save(self, *args, **kwargs):
+        # La reserva del archivo (al guardarlo en el almacenamiento) y la
+        # referencia que suma post_save deben quedar en la misma transacción;
+        # si falla, el archivo recién escrito queda sin registro y se descarta
+        try:
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+        except Exception:
+            if self.url_archivo and self.url_archivo.name != getattr(self, '_archivo_original', None):
+                from .archivos import descartar_sin_registro
+                descartar_sin_registro(self.url_archivo.storage, self.url_archivo.name)
+            raise
+
     class Meta:
         verbose_name = "Documento"
         verbose_name_plural = "Documentos"
 
+class SubidaDocumento(BaseModel):
+    """
+    Subida por partes de un documento grande: las partes se agregan a un
+    archivo temporal y al finalizar se verifica el checksum y se crea el Documento.
+    """
+    ESTADOS = [
+        ('PENDIENTE', 'Pendiente'),
+        ('COMPLETADA', 'Completada'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    usuario = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='subidas_documento'
+    )
+    mascota = models.ForeignKey(Mascota, on_delete=models.CASCADE)
+    historial = models.ForeignKey(
+        HistorialMedico,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True
+    )
+    tipo_documento = models.ForeignKey(TipoDocumento, on_delete=models.PROTECT)
+    nombre_archivo = models.CharField(max_length=255)
+    notas = models.TextField(blank=True, null=True)
+    tamano_total = models.BigIntegerField()
+    sha256 = models.CharField(max_length=64, blank=True)
+    recibido = models.BigIntegerField(default=0)
+    estado = models.CharField(max_length=20, choices=ESTADOS, default='PENDIENTE')
+    documento = models.OneToOneField(
+        Documento,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='subida'
+    )
+
+    def __str__(self):
+        return f"{self.nombre_archivo} ({self.recibido}/{self.tamano_total})"
+
+    class Meta:
+        verbose_name = "Subida de Documento"
+        verbose_name_plural = "Subidas de Documento"
+
 # historial_medico/models.py (añadir al final del archivo)
 
 class Vacuna(BaseModel):
@@ -188,6 +298,10 @@ class MascotaVacuna(BaseModel):
     )
     lote = models.ForeignKey('inventario.LoteMedicamento', on_delete=models.PROTECT, related_name='vacunaciones')
     observaciones = models.TextField(blank=True, null=True)
+    # False si el veterinario fijó fecha_proxima a mano (no se recalcula)
+    fecha_proxima_calculada = models.BooleanField(default=True)
+    # Solo la aplicación más reciente por (mascota, vacuna); ver historial_medico.vacunas
+    vigente = models.BooleanField(default=False, editable=False)
     
     def __str__(self):
         return f"{self.vacuna.nombre} para {self.mascota.nombre} ({self.fecha_aplicacion})"
@@ -195,6 +309,24 @@ class MascotaVacuna(BaseModel):
     class Meta:
         verbose_name = "Vacuna Aplicada"
         verbose_name_plural = "Vacunas Aplicadas"
+        indexes = [
+            models.Index(
+                fields=['fecha_proxima', 'id'],
+                condition=models.Q(vigente=True),
+                name='hm_vacuna_pendiente_idx'
+            ),
+            models.Index(
+                fields=['mascota', 'vacuna', '-fecha_aplicacion', '-id'],
+                name='hm_vacuna_ultima_idx'
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['mascota', 'vacuna'],
+                condition=models.Q(vigente=True),
+                name='unique_vacuna_vigente_por_mascota'
+            ),
+        ]
 
 # historial_medico/models.py (añadir al final del archivo)
 
@@ -1,10 +1,22 @@
 # historial_medico/serializers.py
 from rest_framework import serializers
-import uuid
+from rest_framework.reverse import reverse
 import os
+import re
 from .models import (HistorialMedico, TipoConsulta, Consulta, Tratamiento, 
                      TipoDocumento, Documento, Vacuna, MascotaVacuna, 
-                     Receta, DetalleReceta)
+                     Receta, DetalleReceta, SubidaDocumento)
+from .importacion import FORMATOS, IMPORTADORES
+from .subidas import TAMANO_MAXIMO
+from .vacunas import calcular_fecha_proxima
+
+
+def url_descarga_documento(documento_id, request=None):
+    """
+    URL de GET .../documentos/{id}/descargar/ (absoluta si hay request).
+    """
+    return reverse('documento-descargar', args=[documento_id], request=request)
+
 
 class HistorialMedicoSerializer(serializers.ModelSerializer):
     mascota_nombre = serializers.ReadOnlyField(source='mascota.nombre')
@@ -25,7 +37,7 @@ class ConsultaSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Consulta
-        fields = '__all__'
+        exclude = ['busqueda']
 
 class TratamientoSerializer(serializers.ModelSerializer):
     mascota_nombre = serializers.ReadOnlyField(source='historial.mascota.nombre')
@@ -40,26 +52,54 @@ class TipoDocumentoSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 class DocumentoSerializer(serializers.ModelSerializer):
+    sha256 = serializers.SerializerMethodField()
+    url_descarga = serializers.SerializerMethodField()
+    
     class Meta:
         model = Documento
-        fields = '__all__'
+        exclude = ['busqueda', 'texto_extraido']
+    
+    def get_sha256(self, obj):
+        return obj.url_archivo.storage.hash_de(obj.url_archivo.name)
+    
+    def get_url_descarga(self, obj):
+        return url_descarga_documento(obj.pk, self.context.get('request'))
     
     def create(self, validated_data):
-        # Procesamiento del archivo
+        # El almacenamiento guarda el archivo bajo el hash de su contenido;
+        # se conserva el nombre original para mostrarlo
         archivo = validated_data.get('url_archivo')
         if archivo:
-            # Obtener la extensión
-            _, extension = os.path.splitext(archivo.name)
-            
-            # Generar nombre único
-            nombre_archivo = f"{uuid.uuid4()}{extension}"
-            archivo.name = nombre_archivo
-            
-            # Asignar el nombre del archivo
             validated_data['nombre_archivo'] = os.path.basename(archivo.name)
         
         return super().create(validated_data)
 
+class SubidaDocumentoSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SubidaDocumento
+        fields = ['id', 'mascota', 'historial', 'tipo_documento', 'nombre_archivo', 'notas',
+                  'tamano_total', 'sha256', 'recibido', 'estado', 'documento', 'created_at']
+        read_only_fields = ['recibido', 'estado', 'documento']
+    
+    def validate_tamano_total(self, value):
+        if value <= 0 or value > TAMANO_MAXIMO:
+            raise serializers.ValidationError(f"El tamaño debe estar entre 1 y {TAMANO_MAXIMO} bytes")
+        return value
+    
+    def validate_sha256(self, value):
+        if value and not re.fullmatch(r'[0-9a-fA-F]{64}', value):
+            raise serializers.ValidationError("Debe ser un SHA-256 en hexadecimal")
+        return value.lower()
+    
+    def validate_nombre_archivo(self, value):
+        return os.path.basename(value)
+
+class ImportacionHistoricaSerializer(serializers.Serializer):
+    tipo = serializers.ChoiceField(choices=sorted(IMPORTADORES))
+    archivo = serializers.FileField()
+    formato = serializers.ChoiceField(choices=FORMATOS, required=False)
+    veterinario = serializers.CharField(required=False)
+
 class VacunaSerializer(serializers.ModelSerializer):
     especie_nombre = serializers.ReadOnlyField(source='especie.nombre')
     
@@ -77,6 +117,37 @@ class MascotaVacunaSerializer(serializers.ModelSerializer):
     class Meta:
         model = MascotaVacuna
         fields = '__all__'
+    
+    def validate(self, attrs):
+        # Una fecha_proxima enviada explícitamente y distinta de la calculada queda fija
+        if 'fecha_proxima' in attrs:
+            fecha_aplicacion = attrs.get('fecha_aplicacion', getattr(self.instance, 'fecha_aplicacion', None))
+            vacuna = attrs.get('vacuna', getattr(self.instance, 'vacuna', None))
+            calculada = fecha_aplicacion and vacuna and calcular_fecha_proxima(
+                fecha_aplicacion, vacuna.intervalo_revacunacion
+            )
+            attrs['fecha_proxima_calculada'] = attrs['fecha_proxima'] in (None, calculada)
+        return attrs
+
+class VacunaPendienteSerializer(serializers.ModelSerializer):
+    mascota_nombre = serializers.ReadOnlyField(source='mascota.nombre')
+    especie = serializers.ReadOnlyField(source='mascota.especie_id')
+    especie_nombre = serializers.ReadOnlyField(source='mascota.especie.nombre')
+    cliente = serializers.ReadOnlyField(source='mascota.cliente_id')
+    cliente_nombre = serializers.SerializerMethodField()
+    cliente_telefono = serializers.ReadOnlyField(source='mascota.cliente.telefono')
+    vacuna_nombre = serializers.ReadOnlyField(source='vacuna.nombre')
+    vacuna_tipo = serializers.ReadOnlyField(source='vacuna.tipo')
+    
+    class Meta:
+        model = MascotaVacuna
+        fields = ['id', 'mascota', 'mascota_nombre', 'especie', 'especie_nombre', 'cliente',
+                  'cliente_nombre', 'cliente_telefono', 'vacuna', 'vacuna_nombre', 'vacuna_tipo',
+                  'fecha_aplicacion', 'fecha_proxima']
+    
+    def get_cliente_nombre(self, obj):
+        cliente = obj.mascota.cliente
+        return f"{cliente.nombre} {cliente.apellido}"
 
 class DetalleRecetaSerializer(serializers.ModelSerializer):
     medicamento_nombre = serializers.ReadOnlyField(source='medicamento.nombre')
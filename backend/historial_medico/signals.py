@@ -1,9 +1,43 @@
 # historial_medico/signals.py
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
 from django.dispatch import receiver
 from django.utils import timezone
-from .models import MascotaVacuna, Receta, DetalleReceta
+from .archivos import agregar_referencia, quitar_referencia
+from .extraccion import encolar_extraccion
+from .models import MascotaVacuna, Receta, DetalleReceta, Documento, Vacuna
+from .vacunas import actualizar_vigente, calcular_fecha_proxima, recalcular_fechas_proximas
 from inventario.models import MovimientoInventario
+from inventario.services import registrar_salidas
+
+@receiver(pre_save, sender=MascotaVacuna)
+def completar_fecha_proxima(sender, instance, **kwargs):
+    """
+    Calcula la próxima dosis desde el intervalo de la vacuna, salvo que se haya fijado a mano
+    """
+    if instance.fecha_proxima is None or instance.fecha_proxima_calculada:
+        instance.fecha_proxima = calcular_fecha_proxima(
+            instance.fecha_aplicacion, instance.vacuna.intervalo_revacunacion
+        )
+        instance.fecha_proxima_calculada = True
+
+@receiver(post_save, sender=MascotaVacuna)
+def marcar_aplicacion_vigente(sender, instance, **kwargs):
+    actualizar_vigente(instance.mascota_id, instance.vacuna_id)
+
+@receiver(post_delete, sender=MascotaVacuna)
+def reemplazar_aplicacion_vigente(sender, instance, **kwargs):
+    if instance.vigente:
+        actualizar_vigente(instance.mascota_id, instance.vacuna_id)
+
+@receiver(post_init, sender=Vacuna)
+def recordar_intervalo_vacuna(sender, instance, **kwargs):
+    instance._intervalo_original = instance.__dict__.get('intervalo_revacunacion')
+
+@receiver(post_save, sender=Vacuna)
+def recalcular_por_cambio_de_intervalo(sender, instance, created, **kwargs):
+    if not created and instance.intervalo_revacunacion != instance._intervalo_original:
+        recalcular_fechas_proximas([instance.pk])
+    instance._intervalo_original = instance.intervalo_revacunacion
 
 @receiver(post_save, sender=MascotaVacuna)
 def registrar_movimiento_vacuna(sender, instance, created, **kwargs):
@@ -13,7 +47,7 @@ def registrar_movimiento_vacuna(sender, instance, created, **kwargs):
     if created:
         # Asumimos que la vacuna sale del inventario
         MovimientoInventario.objects.create(
-            medicamento=instance.lote.medicamento,
+            medicamento_id=instance.lote.medicamento_id,
             lote=instance.lote,
             tipo='SALIDA',
             cantidad=1,  # Asumimos 1 dosis por vacuna
@@ -26,25 +60,48 @@ def registrar_movimiento_vacuna(sender, instance, created, **kwargs):
 @receiver(post_save, sender=DetalleReceta)
 def registrar_movimiento_receta(sender, instance, created, **kwargs):
     """
-    Registra un movimiento de inventario cuando se dispensa un medicamento en una receta
-    si la receta está en estado 'COMPLETADA'
+    Registra la salida de inventario cuando se agrega un medicamento a una receta
+    en estado 'COMPLETADA', con la misma asignación FEFO que al completar la receta.
+    Lanza StockInsuficiente si no hay stock.
     """
     if created and instance.receta.estado == 'COMPLETADA':
-        # Asumimos que el medicamento sale del inventario
-        # Necesitaríamos lógica adicional para seleccionar el lote adecuado
-        lotes_disponibles = instance.medicamento.lotes.filter(
-            cantidad__gte=instance.cantidad
-        ).order_by('fecha_vencimiento')
-        
-        if lotes_disponibles.exists():
-            lote = lotes_disponibles.first()
-            MovimientoInventario.objects.create(
-                medicamento=instance.medicamento,
-                lote=lote,
-                tipo='SALIDA',
-                cantidad=instance.cantidad,
-                fecha=timezone.now(),
-                usuario=instance.receta.veterinario,
-                motivo=f"Receta {instance.receta.id} para {instance.receta.mascota.nombre}",
-                afecta_stock=True
-            )
\ No newline at end of file
+        registrar_salidas(
+            [(instance.medicamento, instance.cantidad)],
+            usuario=instance.receta.veterinario,
+            motivo=f"Receta {instance.receta.id} para {instance.receta.mascota.nombre}"
+        )
+
+
+@receiver(post_init, sender=Documento)
+def recordar_archivo_documento(sender, instance, **kwargs):
+    # Se lee el valor crudo para no forzar la carga si el campo está diferido
+    valor = instance.__dict__.get('url_archivo')
+    instance._archivo_original = valor if isinstance(valor, str) and valor else None
+
+
+@receiver(post_save, sender=Documento)
+def referenciar_archivo_documento(sender, instance, created, **kwargs):
+    """
+    Mantiene el conteo de referencias del archivo cuando se crea un documento
+    o se reemplaza su archivo, y encola la extracción de su texto.
+    """
+    original = None if created else instance._archivo_original
+    actual = instance.url_archivo.name if instance.url_archivo else None
+    if actual == original:
+        return
+    if actual:
+        agregar_referencia(instance.url_archivo)
+        if not created:
+            Documento.objects.filter(pk=instance.pk).update(
+                texto_extraido=None, estado_extraccion='PENDIENTE'
+            )
+        encolar_extraccion(instance.pk)
+    if original:
+        quitar_referencia(instance.url_archivo.storage, original)
+    instance._archivo_original = actual
+
+
+@receiver(post_delete, sender=Documento)
+def liberar_archivo_documento(sender, instance, **kwargs):
+    if instance._archivo_original:
+        quitar_referencia(instance.url_archivo.storage, instance._archivo_original)
@@ -0,0 +1,174 @@
+# historial_medico/subidas.py
+"""
+Subidas de documentos por partes (reanudables).
+
+Protocolo: se crea una sesión con el tamaño total (y opcionalmente el
+SHA-256 esperado), se envían partes con PUT indicando su posición, y al
+finalizar se verifica el tamaño y el checksum y se crea el Documento. Cada
+parte se copia por bloques desde el cuerpo de la petición al archivo
+temporal de la sesión, así que la memoria usada no depende del tamaño del
+archivo. Si la conexión se corta, el cliente consulta ``recibido`` y
+continúa desde ahí.
+"""
+import os
+
+from django.conf import settings
+from django.core.files import locks
+from django.db import transaction
+from django.utils import timezone
+
+from core.almacenamiento import calcular_sha256
+from .archivos import reservar_archivo
+from .models import Documento, SubidaDocumento
+
+TAMANO_BLOQUE = 64 * 1024
+TAMANO_MAXIMO = getattr(settings, 'DOCUMENTOS_SUBIDA_TAMANO_MAXIMO', 2 * 1024 ** 3)
+
+
+class SubidaInvalida(Exception):
+    """
+    La parte o la finalización no es aceptable; ``recibido`` indica desde
+    dónde debe continuar el cliente.
+    """
+    def __init__(self, mensaje, recibido=None, conflicto=False):
+        self.recibido = recibido
+        self.conflicto = conflicto
+        super().__init__(mensaje)
+
+
+def _almacenamiento():
+    return Documento._meta.get_field('url_archivo').storage
+
+
+def ruta_parcial(subida):
+    return _almacenamiento().path(os.path.join('.subidas', f'{subida.pk}.part'))
+
+
+def iniciar_archivo(subida):
+    ruta = ruta_parcial(subida)
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    open(ruta, 'wb').close()
+
+
+def descartar_archivo(subida):
+    ruta = ruta_parcial(subida)
+    if os.path.exists(ruta):
+        os.remove(ruta)
+
+
+def _validar_parte(subida, inicio, largo):
+    if subida.estado != 'PENDIENTE':
+        raise SubidaInvalida('La subida ya fue finalizada', subida.recibido, conflicto=True)
+    if inicio != subida.recibido:
+        raise SubidaInvalida(
+            f'Se esperaba la parte desde el byte {subida.recibido}', subida.recibido, conflicto=True
+        )
+    if inicio + largo > subida.tamano_total:
+        raise SubidaInvalida('La parte excede el tamaño declarado', subida.recibido)
+
+
+def agregar_parte(subida_id, inicio, largo, flujo):
+    """
+    Escribe ``largo`` bytes leídos de ``flujo`` a partir de ``inicio``, que
+    debe coincidir con lo ya recibido. Devuelve la subida actualizada.
+
+    La parte se copia fuera de toda transacción, para que una subida lenta no
+    retenga una transacción ni un lock de fila: mientras se escribe se bloquea
+    el archivo temporal (otra parte simultánea recibe 409) y al terminar
+    ``recibido`` avanza con un UPDATE condicionado a que siga valiendo ``inicio``.
+    """
+    subida = SubidaDocumento.objects.get(pk=subida_id)
+    _validar_parte(subida, inicio, largo)
+    try:
+        archivo = open(ruta_parcial(subida), 'r+b')
+    except FileNotFoundError:
+        raise SubidaInvalida('La subida ya fue finalizada', subida.recibido, conflicto=True)
+
+    with archivo:
+        if not locks.lock(archivo, locks.LOCK_EX | locks.LOCK_NB):
+            raise SubidaInvalida('Hay otra parte en curso para esta subida', subida.recibido, conflicto=True)
+        try:
+            # Con el archivo bloqueado, lo recibido ya no puede cambiar por otra parte
+            subida.refresh_from_db(fields=['estado', 'recibido'])
+            _validar_parte(subida, inicio, largo)
+
+            escritos = 0
+            # Descarta restos de una parte anterior que no llegó a confirmarse
+            archivo.truncate(inicio)
+            archivo.seek(inicio)
+            while escritos < largo:
+                bloque = flujo.read(min(TAMANO_BLOQUE, largo - escritos))
+                if not bloque:
+                    break
+                archivo.write(bloque)
+                escritos += len(bloque)
+            archivo.flush()
+
+            avanzada = SubidaDocumento.objects.filter(
+                pk=subida_id, estado='PENDIENTE', recibido=inicio
+            ).update(recibido=inicio + escritos, updated_at=timezone.now())
+        finally:
+            locks.unlock(archivo)
+
+    if not avanzada:
+        subida.refresh_from_db(fields=['estado', 'recibido'])
+        raise SubidaInvalida('La subida cambió mientras se recibía la parte', subida.recibido, conflicto=True)
+    subida.recibido = inicio + escritos
+    if escritos < largo:
+        raise SubidaInvalida('La parte llegó incompleta', subida.recibido)
+    return subida
+
+
+def _validar_finalizacion(subida):
+    if subida.estado != 'PENDIENTE':
+        raise SubidaInvalida('La subida ya fue finalizada', subida.recibido, conflicto=True)
+    if subida.recibido != subida.tamano_total:
+        raise SubidaInvalida(
+            f'Faltan {subida.tamano_total - subida.recibido} bytes', subida.recibido
+        )
+
+
+def finalizar_subida(subida_id):
+    """
+    Verifica tamaño y checksum y crea el Documento a partir del archivo
+    temporal, que se mueve al almacenamiento sin copiarlo. Si el checksum no
+    coincide el contenido no es recuperable y la subida vuelve a empezar.
+
+    El checksum se calcula antes de abrir la transacción. El Documento se crea
+    con el nombre definitivo del archivo y el temporal se mueve (o se descarta,
+    si el contenido ya existía) recién al confirmar, así que si la creación
+    falla el temporal sigue ahí y la finalización se puede reintentar.
+    """
+    subida = SubidaDocumento.objects.get(pk=subida_id)
+    _validar_finalizacion(subida)
+    ruta = ruta_parcial(subida)
+    sha256 = calcular_sha256(ruta)
+
+    with transaction.atomic():
+        subida = SubidaDocumento.objects.select_for_update().get(pk=subida_id)
+        _validar_finalizacion(subida)
+        if not subida.sha256 or sha256 == subida.sha256.lower():
+            almacenamiento = _almacenamiento()
+            nombre = almacenamiento.nombre_para(sha256)
+            # Bloquea el contenido hasta confirmar (ver historial_medico.archivos) y
+            # mueve el archivo antes de los on_commit del Documento (p. ej. la extracción)
+            reservar_archivo(sha256, nombre, subida.tamano_total)
+            transaction.on_commit(lambda: almacenamiento.importar(ruta, sha256))
+            documento = Documento.objects.create(
+                mascota_id=subida.mascota_id,
+                historial_id=subida.historial_id,
+                tipo_documento_id=subida.tipo_documento_id,
+                nombre_archivo=subida.nombre_archivo,
+                url_archivo=nombre,
+                usuario_id=subida.usuario_id,
+                notas=subida.notas,
+            )
+            subida.estado = 'COMPLETADA'
+            subida.documento = documento
+            subida.save(update_fields=['estado', 'documento', 'updated_at'])
+            return documento
+
+        subida.recibido = 0
+        subida.save(update_fields=['recibido', 'updated_at'])
+        transaction.on_commit(lambda: open(ruta, 'wb').close())
+    raise SubidaInvalida('El checksum SHA-256 no coincide', 0)
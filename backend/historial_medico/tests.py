@@ -1,3 +1,383 @@
-from django.test import TestCase
+import csv
+import datetime
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import override_settings
+from rest_framework.test import APITestCase
+
+from authentication.models import Rol
+from clientes.models import Cliente
+from inventario.models import LoteMedicamento, Medicamento, Proveedor
+from mascotas.models import Especie, Raza, Mascota, RegistroPeso
+from .importacion import importar
+from .models import ArchivoAlmacenado, Documento, MascotaVacuna, SubidaDocumento, TipoDocumento, Vacuna
+from .subidas import ruta_parcial
+from .vacunas import aplicaciones_pendientes
+
+
+class HistorialMedicoTestCase(APITestCase):
+    def setUp(self):
+        # Los archivos de cada prueba van a un MEDIA_ROOT propio
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        configuracion = override_settings(MEDIA_ROOT=self.media)
+        configuracion.enable()
+        self.addCleanup(configuracion.disable)
+
+        rol = Rol.objects.get_or_create(nombre=Rol.VETERINARIO)[0]
+        self.veterinario = get_user_model().objects.create_user('vet', 'vet@tailpet.cl', 'clave', rol=rol)
+        self.client.force_authenticate(self.veterinario)
+        cliente = Cliente.objects.create(
+            nombre='Juan', apellido='Pérez', rut='12.345.678-9', telefono='123', email='juan@tailpet.cl'
+        )
+        self.especie = Especie.objects.create(nombre='Perro')
+        raza = Raza.objects.create(nombre='Mestizo', especie=self.especie)
+        self.mascota = Mascota.objects.create(
+            cliente=cliente, nombre='Toby', especie=self.especie, raza=raza,
+            fecha_nacimiento=datetime.date(2020, 1, 1), sexo='M'
+        )
+        self.tipo_documento = TipoDocumento.objects.create(nombre='Examen')
+        self.storage = Documento._meta.get_field('url_archivo').storage
+
+    def subir_documento(self, nombre, contenido):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/historial-medico/documentos/', {
+                'mascota': self.mascota.id, 'tipo_documento': self.tipo_documento.id,
+                'nombre_archivo': nombre, 'url_archivo': SimpleUploadedFile(nombre, contenido),
+            }, format='multipart')
+        self.assertEqual(response.status_code, 201, response.data)
+        return Documento.objects.get(pk=response.data['id'])
+
+
+class AlmacenamientoDocumentosTests(HistorialMedicoTestCase):
+    def escribir_anterior(self, nombre, contenido):
+        ruta = self.storage.path(nombre)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        with open(ruta, 'wb') as archivo:
+            archivo.write(contenido)
+        return ruta
+
+    def test_mismo_contenido_con_distinto_nombre_comparte_el_archivo(self):
+        informe = self.subir_documento('informe.PDF', b'%PDF-1.4 hemograma')
+        copia = self.subir_documento('copia del informe.pdf', b'%PDF-1.4 hemograma')
+
+        self.assertEqual(informe.url_archivo.name, copia.url_archivo.name)
+        sha256 = self.storage.hash_de(informe.url_archivo.name)
+        self.assertEqual(informe.url_archivo.name, self.storage.nombre_para(sha256))
+        self.assertEqual(ArchivoAlmacenado.objects.get().referencias, 2)
+        self.assertEqual(copia.nombre_archivo, 'copia del informe.pdf')
+
+    def test_deduplicar_documentos_migra_los_nombres_anteriores(self):
+        contenido = b'%PDF-1.4 radiografia'
+        actual = self.subir_documento('radiografia.pdf', contenido)
+        anteriores = ['documentos/4f1c2e.pdf', 'documentos/9a7b3d.pdf']
+        rutas = [self.escribir_anterior(nombre, contenido) for nombre in anteriores]
+        # Documentos de antes del almacenamiento por contenido: sin señales ni registro
+        Documento.objects.bulk_create([
+            Documento(mascota=self.mascota, tipo_documento=self.tipo_documento,
+                      nombre_archivo='radiografia.pdf', url_archivo=nombre)
+            for nombre in anteriores
+        ])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('deduplicar_documentos', stdout=io.StringIO())
+
+        self.assertEqual(
+            set(Documento.objects.values_list('url_archivo', flat=True)), {actual.url_archivo.name}
+        )
+        registro = ArchivoAlmacenado.objects.get()
+        self.assertEqual((registro.archivo, registro.referencias), (actual.url_archivo.name, 3))
+        self.assertFalse(any(os.path.exists(ruta) for ruta in rutas))
+        self.assertTrue(os.path.exists(actual.url_archivo.path))
+
+        # Una segunda ejecución no encuentra nada que migrar
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('deduplicar_documentos', stdout=io.StringIO())
+        self.assertEqual(ArchivoAlmacenado.objects.get().referencias, 3)
+
+
+class DescargaDocumentoTests(HistorialMedicoTestCase):
+    contenido = b'%PDF-1.4 ' + bytes(range(256)) * 4
+
+    def setUp(self):
+        super().setUp()
+        self.documento = self.subir_documento('hemograma.pdf', self.contenido)
+        self.url = f'/api/historial-medico/documentos/{self.documento.id}/descargar/'
+
+    def test_descarga_completa(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.contenido)
+        self.assertEqual(response['Content-Length'], str(len(self.contenido)))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(response['ETag'], f'"{self.storage.hash_de(self.documento.url_archivo.name)}"')
+        self.assertIn("filename*=UTF-8''hemograma.pdf", response['Content-Disposition'])
+
+    def test_rango_parcial(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9')
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), self.contenido[:10])
+        self.assertEqual(response['Content-Range'], f'bytes 0-9/{len(self.contenido)}')
+        self.assertEqual(response['Content-Length'], '10')
+
+        # Los últimos N bytes, y un fin más allá del archivo se recorta
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-16')
+        self.assertEqual(b''.join(response.streaming_content), self.contenido[-16:])
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes=1000-{len(self.contenido) * 2}')
+        self.assertEqual(b''.join(response.streaming_content), self.contenido[1000:])
+
+    def test_if_range_con_etag_distinto_envia_todo(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"otro"')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.contenido)
+
+    def test_no_modificado(self):
+        etag = self.client.get(self.url)['ETag']
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+
+    def test_rango_no_satisfacible(self):
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={len(self.contenido)}-')
+
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.contenido)}')
+
+
+class SubidaPorPartesTests(HistorialMedicoTestCase):
+    contenido = b'%PDF-1.4 ' + b'radiografia de torax ' * 50
+
+    def iniciar(self, sha256=None):
+        response = self.client.post('/api/historial-medico/subidas-documento/', {
+            'mascota': self.mascota.id, 'tipo_documento': self.tipo_documento.id,
+            'nombre_archivo': 'radiografia.pdf', 'tamano_total': len(self.contenido),
+            'sha256': sha256 or hashlib.sha256(self.contenido).hexdigest(),
+        })
+        self.assertEqual(response.status_code, 201, response.data)
+        return f"/api/historial-medico/subidas-documento/{response.data['id']}/"
+
+    def enviar(self, url, inicio, fin):
+        return self.client.put(
+            url + 'parte/', self.contenido[inicio:fin], content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes {inicio}-{fin - 1}/{len(self.contenido)}'
+        )
+
+    def finalizar(self, url):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(url + 'finalizar/')
+
+    def test_partes_fuera_de_orden_se_rechazan(self):
+        url = self.iniciar()
+        self.assertEqual(self.enviar(url, 0, 100).status_code, 200)
+
+        # Un salto adelante y una parte repetida indican desde dónde seguir
+        for inicio, fin in ((200, 300), (0, 100)):
+            response = self.enviar(url, inicio, fin)
+            self.assertEqual(response.status_code, 409)
+            self.assertEqual(response.data['recibido'], 100)
+
+        response = self.enviar(url, 100, len(self.contenido) + 1)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(url).data['recibido'], 100)
+
+    def test_reanudar_y_finalizar(self):
+        url = self.iniciar()
+        self.enviar(url, 0, 300)
+
+        # El cliente perdió la conexión: consulta lo recibido y continúa desde ahí
+        recibido = self.client.get(url).data['recibido']
+        self.assertEqual(recibido, 300)
+        response = self.finalizar(url)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['recibido'], 300)
+
+        response = self.enviar(url, recibido, len(self.contenido))
+        self.assertEqual(response.data, {'recibido': len(self.contenido), 'tamano_total': len(self.contenido)})
+        response = self.finalizar(url)
+
+        self.assertEqual(response.status_code, 201, response.data)
+        documento = Documento.objects.get(pk=response.data['id'])
+        with documento.url_archivo.open('rb') as archivo:
+            self.assertEqual(archivo.read(), self.contenido)
+        subida = SubidaDocumento.objects.get()
+        self.assertEqual((subida.estado, subida.documento_id), ('COMPLETADA', documento.id))
+        self.assertFalse(os.path.exists(ruta_parcial(subida)))
+        self.assertEqual(self.enviar(url, 0, 10).status_code, 409)
+
+    def test_checksum_distinto_reinicia_la_subida(self):
+        url = self.iniciar(sha256='0' * 64)
+        self.enviar(url, 0, len(self.contenido))
+
+        response = self.finalizar(url)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['recibido'], 0)
+        subida = SubidaDocumento.objects.get()
+        self.assertEqual((subida.estado, subida.recibido), ('PENDIENTE', 0))
+        self.assertEqual(os.path.getsize(ruta_parcial(subida)), 0)
+        self.assertFalse(Documento.objects.exists())
+        self.assertEqual(self.enviar(url, 0, 100).status_code, 200)
+
+
+class FechasVacunasTests(HistorialMedicoTestCase):
+    def setUp(self):
+        super().setUp()
+        proveedor = Proveedor.objects.create(
+            nombre='Droguería', telefono='123', email='ventas@drogueria.cl', tipo='MEDICAMENTOS'
+        )
+        medicamento = Medicamento.objects.create(
+            nombre='Antirrábica', tipo='INYECTABLE', presentacion='Vial', proveedor=proveedor,
+            precio_compra=Decimal('1.00'), precio_venta=Decimal('2.00'), stock_minimo=1
+        )
+        self.lote = LoteMedicamento.objects.create(
+            medicamento=medicamento, numero_lote='V1', cantidad=10, proveedor=proveedor,
+            fecha_vencimiento=datetime.date(2030, 1, 1), fecha_ingreso=datetime.date(2023, 1, 1),
+            precio_compra=Decimal('1.00')
+        )
+        self.vacuna = Vacuna.objects.create(
+            nombre='Antirrábica', tipo='OBLIGATORIA', intervalo_revacunacion=365, especie=self.especie
+        )
+
+    def aplicar(self, fecha_aplicacion, **campos):
+        return MascotaVacuna.objects.create(
+            mascota=self.mascota, vacuna=self.vacuna, fecha_aplicacion=fecha_aplicacion,
+            veterinario=self.veterinario, lote=self.lote, **campos
+        )
+
+    def fechas(self):
+        return list(
+            MascotaVacuna.objects.order_by('fecha_aplicacion')
+            .values_list('fecha_proxima', 'fecha_proxima_calculada', 'vigente')
+        )
+
+    def test_fecha_proxima_desde_el_intervalo_salvo_fijada_a_mano(self):
+        calculada = self.aplicar(datetime.date(2024, 3, 1))
+        manual = self.aplicar(
+            datetime.date(2024, 6, 1), fecha_proxima=datetime.date(2024, 9, 1), fecha_proxima_calculada=False
+        )
+
+        self.assertEqual(calculada.fecha_proxima, datetime.date(2025, 3, 1))
+        self.assertEqual(manual.fecha_proxima, datetime.date(2024, 9, 1))
+
+    def test_solo_la_aplicacion_mas_reciente_queda_vigente(self):
+        antigua = self.aplicar(datetime.date(2023, 3, 1))
+        reciente = self.aplicar(datetime.date(2024, 3, 1))
+        # Registrada después pero aplicada antes: no reemplaza a la vigente
+        self.aplicar(datetime.date(2023, 9, 1))
+
+        vigentes = MascotaVacuna.objects.filter(vigente=True)
+        self.assertEqual(list(vigentes.values_list('pk', flat=True)), [reciente.pk])
+        self.assertEqual(
+            list(aplicaciones_pendientes(dias=30, hoy=datetime.date(2025, 2, 15))), [reciente]
+        )
+
+        # Como en una vista: la fila se lee de la base antes de borrarla
+        MascotaVacuna.objects.get(pk=reciente.pk).delete()
+        self.assertEqual(list(vigentes.values_list('fecha_aplicacion', flat=True)), [datetime.date(2023, 9, 1)])
+        antigua.refresh_from_db()
+        self.assertFalse(antigua.vigente)
+
+    def test_cambio_de_intervalo_recalcula_las_fechas(self):
+        self.aplicar(datetime.date(2023, 3, 1))
+        self.aplicar(
+            datetime.date(2024, 3, 1), fecha_proxima=datetime.date(2024, 6, 1), fecha_proxima_calculada=False
+        )
+
+        self.vacuna.intervalo_revacunacion = 180
+        self.vacuna.save()
+
+        self.assertEqual(self.fechas(), [
+            (datetime.date(2023, 8, 28), True, False),
+            (datetime.date(2024, 6, 1), False, True),
+        ])
+
+    def test_comando_recalcula_las_fechas_calculadas(self):
+        self.aplicar(datetime.date(2023, 3, 1))
+        self.aplicar(datetime.date(2024, 3, 1))
+        # Un cambio de intervalo en bloque no dispara señales
+        Vacuna.objects.filter(pk=self.vacuna.pk).update(intervalo_revacunacion=30)
+
+        salida = io.StringIO()
+        call_command('recalcular_fechas_vacunas', vacunas=[self.vacuna.pk], stdout=salida)
+
+        self.assertEqual(self.fechas(), [
+            (datetime.date(2023, 3, 31), True, False),
+            (datetime.date(2024, 3, 31), True, True),
+        ])
+        self.assertIn('2 aplicaciones de 1 mascotas', salida.getvalue())
+
+
+class ImportacionHistoricaTests(HistorialMedicoTestCase):
+    def setUp(self):
+        super().setUp()
+        Mascota.objects.filter(pk=self.mascota.pk).update(microchip='985112000000001')
+
+    def escribir(self, nombre, contenido):
+        ruta = os.path.join(self.media, nombre)
+        with open(ruta, 'w', encoding='utf-8') as archivo:
+            archivo.write(contenido)
+        return ruta
+
+    def test_filas_invalidas_van_al_archivo_de_rechazos(self):
+        ruta = self.escribir('pesos.csv', (
+            'microchip,mascota_id,fecha,peso,notas\n'
+            '985112000000001,,01/03/2024,"12,5",Control\n'
+            '999999999999999,,02/03/2024,12.6,\n'
+            ',{id},2024-03-03,doce,\n'
+            ',{id},2024-03-04,12.8,\n'
+            ',,2024-03-05,12.9,Sin mascota\n'
+        ).format(id=self.mascota.id))
+
+        salida = io.StringIO()
+        call_command('importar_historico', 'pesos', ruta, stdout=salida)
+
+        self.assertEqual(
+            list(RegistroPeso.objects.order_by('fecha_registro').values_list('fecha_registro', 'peso')),
+            [(datetime.date(2024, 3, 1), Decimal('12.50')), (datetime.date(2024, 3, 4), Decimal('12.80'))]
+        )
+        with open(ruta + '.rechazos.csv', encoding='utf-8') as archivo:
+            rechazos = list(csv.DictReader(archivo))
+        self.assertEqual([rechazo['_linea'] for rechazo in rechazos], ['3', '4', '6'])
+        self.assertIn('999999999999999', rechazos[0]['_motivo'])
+        self.assertTrue(rechazos[1]['_motivo'].startswith('peso:'))
+        self.assertEqual(rechazos[2]['notas'], 'Sin mascota')
+        self.assertIn('2 de 5 filas importadas', salida.getvalue())
+        self.assertIn('3 filas rechazadas', salida.getvalue())
+
+    def test_jsonl_ilegible_y_duplicados_se_rechazan(self):
+        lineas = [
+            json.dumps({'nombre': 'Ana', 'apellido': 'Rojas', 'rut': '11.111.111-1', 'telefono': '1',
+                        'email': 'ana@tailpet.cl'}),
+            '{"nombre": "sin cerrar"',
+            json.dumps({'nombre': 'Otra', 'apellido': 'Ana', 'rut': '11.111.111-1', 'telefono': '2',
+                        'email': 'otra@tailpet.cl'}),
+            json.dumps(['no', 'es', 'un', 'objeto']),
+        ]
+        rechazos = []
+
+        resultado = importar(
+            'clientes', io.BytesIO('\n'.join(lineas).encode()), 'jsonl',
+            al_rechazar=lambda linea, fila, motivo: rechazos.append((linea, motivo))
+        )
+
+        self.assertEqual((resultado.leidas, resultado.importadas, resultado.rechazadas), (4, 1, 3))
+        self.assertEqual([linea for linea, _ in rechazos], [2, 3, 4])
+        self.assertEqual(rechazos[0][1], 'JSON inválido')
+        self.assertIn('ya está registrado', rechazos[1][1])
+        self.assertTrue(Cliente.objects.filter(email='ana@tailpet.cl').exists())
@@ -3,7 +3,9 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (HistorialMedicoViewSet, TipoConsultaViewSet, ConsultaViewSet,
                    TratamientoViewSet, TipoDocumentoViewSet, DocumentoViewSet,
-                   VacunaViewSet, MascotaVacunaViewSet, RecetaViewSet, DetalleRecetaViewSet)
+                   VacunaViewSet, MascotaVacunaViewSet, RecetaViewSet, DetalleRecetaViewSet,
+                   SubidaDocumentoViewSet, VacunaPendienteViewSet,
+                   ImportacionHistoricaViewSet)
 
 router = DefaultRouter()
 router.register(r'historiales', HistorialMedicoViewSet)
@@ -12,8 +14,11 @@ router.register(r'consultas', ConsultaViewSet)
 router.register(r'tratamientos', TratamientoViewSet)
 router.register(r'tipos-documento', TipoDocumentoViewSet)
 router.register(r'documentos', DocumentoViewSet)
+router.register(r'subidas-documento', SubidaDocumentoViewSet)
 router.register(r'vacunas', VacunaViewSet)
 router.register(r'vacunaciones', MascotaVacunaViewSet)
+router.register(r'vacunas-pendientes', VacunaPendienteViewSet, basename='vacunas-pendientes')
+router.register(r'importaciones', ImportacionHistoricaViewSet, basename='importaciones')
 router.register(r'recetas', RecetaViewSet)
 router.register(r'detalles-receta', DetalleRecetaViewSet)
 
@@ -0,0 +1,109 @@
+# historial_medico/vacunas.py
+"""
+Fechas de revacunación.
+
+``fecha_proxima`` se calcula como fecha de aplicación + intervalo de la vacuna,
+salvo que el veterinario la haya fijado a mano (``fecha_proxima_calculada``
+en False). Por cada (mascota, vacuna) solo la aplicación más reciente queda
+marcada como ``vigente``, y un índice parcial sobre (fecha_proxima) de las
+vigentes permite responder "qué mascotas vencen en los próximos N días" sin
+recorrer el historial completo de aplicaciones.
+
+Para recalcular la vigente se bloquea la fila de la mascota: dos aplicaciones
+guardadas a la vez para la misma mascota se serializan ahí, en vez de chocar
+en el índice único ``unique_vacuna_vigente_por_mascota``.
+"""
+import datetime
+
+from django.db import transaction
+from django.db.models import DateField, ExpressionWrapper, F, OuterRef, Subquery
+from django.utils import timezone
+
+from mascotas.models import Mascota
+from .models import MascotaVacuna, Vacuna
+
+DIAS_VENTANA_DEFECTO = 30
+
+
+def calcular_fecha_proxima(fecha_aplicacion, intervalo_dias):
+    return fecha_aplicacion + datetime.timedelta(days=intervalo_dias)
+
+
+def actualizar_vigente(mascota_id, vacuna_id):
+    """
+    Deja como vigente solo la aplicación más reciente de la vacuna para la
+    mascota. Son dos UPDATE, sin importar cuántas aplicaciones haya.
+    """
+    with transaction.atomic():
+        # Hasta el fin de la transacción; los UPDATE siguientes ven ya confirmadas
+        # las aplicaciones de quien tuviera el lock antes
+        list(Mascota.objects.select_for_update().filter(pk=mascota_id).values_list('pk'))
+        aplicaciones = MascotaVacuna.objects.filter(mascota_id=mascota_id, vacuna_id=vacuna_id)
+        aplicaciones.filter(vigente=True).update(vigente=False)
+        aplicaciones.filter(
+            pk=Subquery(aplicaciones.order_by('-fecha_aplicacion', '-id').values('pk')[:1])
+        ).update(vigente=True)
+
+
+def actualizar_vigentes(mascota_ids, tamano_bloque=1000):
+    """
+    Versión en bloque de actualizar_vigente para todas las vacunas de las
+    mascotas indicadas (p. ej. tras una importación masiva, que no dispara
+    señales): dos UPDATE por bloque de mascotas.
+    """
+    ids = sorted(set(mascota_ids))
+    ultima = MascotaVacuna.objects.filter(
+        mascota_id=OuterRef('mascota_id'), vacuna_id=OuterRef('vacuna_id')
+    ).order_by('-fecha_aplicacion', '-id')
+    for inicio in range(0, len(ids), tamano_bloque):
+        bloque = ids[inicio:inicio + tamano_bloque]
+        with transaction.atomic():
+            # En orden de id, para no bloquearse en cruz con otro bloque
+            list(Mascota.objects.select_for_update().filter(pk__in=bloque).order_by('pk').values_list('pk'))
+            aplicaciones = MascotaVacuna.objects.filter(mascota_id__in=bloque)
+            aplicaciones.filter(vigente=True).update(vigente=False)
+            aplicaciones.filter(pk=Subquery(ultima.values('pk')[:1])).update(vigente=True)
+
+
+def recalcular_fechas_proximas(vacuna_ids=None):
+    """
+    Recalcula en bloque fecha_proxima (las no fijadas a mano) con el intervalo
+    actual de cada vacuna: un UPDATE por vacuna. Devuelve (filas, mascota_ids).
+    """
+    vacunas = Vacuna.objects.all()
+    if vacuna_ids is not None:
+        vacunas = vacunas.filter(pk__in=vacuna_ids)
+
+    total = 0
+    mascota_ids = set()
+    for vacuna_id, intervalo in vacunas.values_list('id', 'intervalo_revacunacion'):
+        aplicaciones = MascotaVacuna.objects.filter(vacuna_id=vacuna_id, fecha_proxima_calculada=True)
+        total += aplicaciones.update(fecha_proxima=ExpressionWrapper(
+            F('fecha_aplicacion') + datetime.timedelta(days=intervalo),
+            output_field=DateField()
+        ))
+        mascota_ids.update(aplicaciones.values_list('mascota_id', flat=True).distinct())
+    return total, mascota_ids
+
+
+def aplicaciones_pendientes(dias=DIAS_VENTANA_DEFECTO, incluir_vencidas=False,
+                            especie=None, cliente=None, hoy=None):
+    """
+    Aplicaciones vigentes cuya próxima dosis cae en los próximos ``dias``
+    (y también las atrasadas si ``incluir_vencidas``), de mascotas activas.
+    """
+    hoy = hoy or timezone.localdate()
+    queryset = MascotaVacuna.objects.filter(
+        vigente=True,
+        fecha_proxima__lte=hoy + datetime.timedelta(days=dias),
+        mascota__activo=True,
+    )
+    if not incluir_vencidas:
+        queryset = queryset.filter(fecha_proxima__gte=hoy)
+    if especie:
+        queryset = queryset.filter(mascota__especie_id=especie)
+    if cliente:
+        queryset = queryset.filter(mascota__cliente_id=cliente)
+    return queryset.select_related(
+        'mascota__cliente', 'mascota__especie', 'vacuna'
+    ).order_by('fecha_proxima', 'id')
@@ -1,16 +1,35 @@
 # historial_medico/views.py
-from rest_framework import viewsets
+import re
+
+from django.db import transaction
+from rest_framework import mixins, permissions, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.parsers import FormParser, MultiPartParser
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
+from authentication.permissions import IsAdmin
+from core.busqueda import BusquedaClinicaMixin
+from core.descargas import DescargaArchivoMixin
+from inventario.services import StockInsuficiente, registrar_salidas
 
 from .models import (HistorialMedico, TipoConsulta, Consulta, Tratamiento, 
                      TipoDocumento, Documento, Vacuna, MascotaVacuna, 
-                     Receta, DetalleReceta)
+                     Receta, DetalleReceta, SubidaDocumento)
 from .serializers import (HistorialMedicoSerializer, TipoConsultaSerializer, 
                          ConsultaSerializer, TratamientoSerializer, 
                          TipoDocumentoSerializer, DocumentoSerializer,
                          VacunaSerializer, MascotaVacunaSerializer,
-                         RecetaSerializer, DetalleRecetaSerializer)
+                         RecetaSerializer, DetalleRecetaSerializer,
+                         SubidaDocumentoSerializer, VacunaPendienteSerializer,
+                         ImportacionHistoricaSerializer)
+from .importacion import detectar_formato, importar
+from .subidas import (SubidaInvalida, agregar_parte, descartar_archivo,
+                      finalizar_subida, iniciar_archivo)
+from .vacunas import DIAS_VENTANA_DEFECTO, aplicaciones_pendientes
+
+PATRON_CONTENT_RANGE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+# Rechazos incluidos en la respuesta de una importación; el resto solo se cuenta
+LIMITE_RECHAZOS_RESPUESTA = 1000
 
 class HistorialMedicoViewSet(viewsets.ModelViewSet):
     queryset = HistorialMedico.objects.all()
@@ -21,11 +40,12 @@ class TipoConsultaViewSet(viewsets.ModelViewSet):
     queryset = TipoConsulta.objects.all()
     serializer_class = TipoConsultaSerializer
 
-class ConsultaViewSet(viewsets.ModelViewSet):
-    queryset = Consulta.objects.all()
+class ConsultaViewSet(BusquedaClinicaMixin, viewsets.ModelViewSet):
+    queryset = Consulta.objects.select_related('historial__mascota', 'veterinario').order_by('-fecha', 'id')
     serializer_class = ConsultaSerializer
     filterset_fields = ['historial', 'veterinario', 'fecha', 'tipo_consulta']
     search_fields = ['motivo_consulta', 'diagnostico']
+    busqueda_campos = ['diagnostico', 'motivo_consulta']
 
 class TratamientoViewSet(viewsets.ModelViewSet):
     queryset = Tratamiento.objects.all()
@@ -36,10 +56,129 @@ class TipoDocumentoViewSet(viewsets.ModelViewSet):
     queryset = TipoDocumento.objects.all()
     serializer_class = TipoDocumentoSerializer
 
-class DocumentoViewSet(viewsets.ModelViewSet):
-    queryset = Documento.objects.all()
+class DocumentoViewSet(BusquedaClinicaMixin, DescargaArchivoMixin, viewsets.ModelViewSet):
+    queryset = Documento.objects.defer('texto_extraido', 'busqueda').order_by('-fecha_subida', 'id')
     serializer_class = DocumentoSerializer
-    filterset_fields = ['mascota', 'historial', 'tipo_documento', 'fecha_subida']
+    filterset_fields = ['mascota', 'historial', 'tipo_documento', 'fecha_subida', 'estado_extraccion']
+    busqueda_campos = ['texto_extraido', 'nombre_archivo', 'notas']
+    # El texto extraído puede ser muy largo: solo se busca en el tsvector
+    busqueda_campos_trigramas = ['nombre_archivo', 'notas']
+    campo_archivo = 'url_archivo'
+    
+    def nombre_descarga(self, obj):
+        return obj.nombre_archivo
+    
+    def etag_descarga(self, obj):
+        return obj.url_archivo.storage.hash_de(obj.url_archivo.name)
+
+class SubidaDocumentoViewSet(mixins.CreateModelMixin,
+                             mixins.RetrieveModelMixin,
+                             mixins.DestroyModelMixin,
+                             viewsets.GenericViewSet):
+    """
+    Subida reanudable de documentos grandes:
+    POST crea la sesión, PUT .../{id}/parte/ con Content-Range agrega bytes,
+    GET .../{id}/ informa lo recibido y POST .../{id}/finalizar/ crea el Documento.
+    """
+    queryset = SubidaDocumento.objects.all()
+    serializer_class = SubidaDocumentoSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get_queryset(self):
+        return super().get_queryset().filter(usuario=self.request.user)
+    
+    def perform_create(self, serializer):
+        iniciar_archivo(serializer.save(usuario=self.request.user))
+    
+    def perform_destroy(self, instance):
+        descartar_archivo(instance)
+        instance.delete()
+    
+    def _respuesta_subida_invalida(self, error):
+        return Response(
+            {"error": str(error), "recibido": error.recibido},
+            status=status.HTTP_409_CONFLICT if error.conflicto else status.HTTP_400_BAD_REQUEST
+        )
+    
+    @action(detail=True, methods=['put'])
+    def parte(self, request, pk=None):
+        """
+        Agrega los bytes del cuerpo en la posición indicada por
+        Content-Range: bytes inicio-fin/total (o ?inicio= con Content-Length).
+        """
+        subida = self.get_object()
+        try:
+            largo = int(request.META.get('CONTENT_LENGTH') or 0)
+            rango = PATRON_CONTENT_RANGE.match(request.headers.get('Content-Range', ''))
+            if rango:
+                inicio, fin, total = map(int, rango.groups())
+                if fin - inicio + 1 != largo or total != subida.tamano_total:
+                    raise ValueError
+            else:
+                inicio = int(request.query_params.get('inicio', subida.recibido))
+        except ValueError:
+            return Response(
+                {"error": "Content-Range no coincide con el cuerpo o el tamaño total"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if largo <= 0:
+            return Response({"error": "La parte está vacía"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            subida = agregar_parte(subida.pk, inicio, largo, request.stream)
+        except SubidaInvalida as e:
+            return self._respuesta_subida_invalida(e)
+        return Response({'recibido': subida.recibido, 'tamano_total': subida.tamano_total})
+    
+    @action(detail=True, methods=['post'])
+    def finalizar(self, request, pk=None):
+        subida = self.get_object()
+        try:
+            documento = finalizar_subida(subida.pk)
+        except SubidaInvalida as e:
+            return self._respuesta_subida_invalida(e)
+        return Response(
+            DocumentoSerializer(documento, context=self.get_serializer_context()).data,
+            status=status.HTTP_201_CREATED
+        )
+
+class ImportacionHistoricaViewSet(viewsets.ViewSet):
+    """
+    Importación masiva de registros históricos (solo administradores).
+    POST multipart con ``tipo`` (clientes, mascotas, consultas, vacunaciones,
+    pesos), ``archivo`` CSV o JSONL y opcionalmente ``formato`` y
+    ``veterinario``. Para archivos muy grandes use ``manage.py importar_historico``.
+    """
+    permission_classes = [IsAdmin]
+    parser_classes = [MultiPartParser, FormParser]
+    
+    def create(self, request):
+        serializer = ImportacionHistoricaSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        datos = serializer.validated_data
+        archivo = datos['archivo']
+        
+        rechazos = []
+        def al_rechazar(linea, fila, motivo):
+            if len(rechazos) < LIMITE_RECHAZOS_RESPUESTA:
+                rechazos.append({'linea': linea, 'motivo': motivo, 'fila': fila})
+        
+        try:
+            resultado = importar(
+                datos['tipo'], archivo.open('rb'),
+                datos.get('formato') or detectar_formato(archivo.name),
+                al_rechazar=al_rechazar,
+                veterinario=datos.get('veterinario'),
+            )
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'tipo': datos['tipo'],
+            'leidas': resultado.leidas,
+            'importadas': resultado.importadas,
+            'rechazadas': resultado.rechazadas,
+            'rechazos': rechazos,
+        })
 
 class VacunaViewSet(viewsets.ModelViewSet):
     queryset = Vacuna.objects.all()
@@ -50,6 +189,43 @@ class MascotaVacunaViewSet(viewsets.ModelViewSet):
     queryset = MascotaVacuna.objects.all()
     serializer_class = MascotaVacunaSerializer
     filterset_fields = ['mascota', 'vacuna', 'fecha_aplicacion', 'veterinario']
+    
+    def create(self, request, *args, **kwargs):
+        # La dosis sale del lote indicado (ver historial_medico.signals)
+        try:
+            with transaction.atomic():
+                return super().create(request, *args, **kwargs)
+        except StockInsuficiente as e:
+            return Response(
+                {'error': str(e), 'faltantes': e.faltantes},
+                status=status.HTTP_409_CONFLICT
+            )
+
+class VacunaPendienteViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
+    """
+    Próximas dosis: la última aplicación de cada vacuna por mascota cuya
+    fecha_proxima cae en los próximos ?dias= (30 por defecto). Filtros:
+    ?especie=, ?cliente= y ?vencidas=true para incluir las atrasadas.
+    """
+    serializer_class = VacunaPendienteSerializer
+    filter_backends = []
+    
+    def get_queryset(self):
+        params = self.request.query_params
+        try:
+            dias = int(params.get('dias', DIAS_VENTANA_DEFECTO))
+            especie = int(params['especie']) if params.get('especie') else None
+            cliente = int(params['cliente']) if params.get('cliente') else None
+        except ValueError:
+            raise ValidationError({"error": "dias, especie y cliente deben ser números enteros"})
+        if not 0 <= dias <= 366:
+            raise ValidationError({"error": "dias debe estar entre 0 y 366"})
+        return aplicaciones_pendientes(
+            dias=dias,
+            incluir_vencidas=params.get('vencidas') in ('1', 'true', 'True'),
+            especie=especie,
+            cliente=cliente,
+        )
 
 class RecetaViewSet(viewsets.ModelViewSet):
     queryset = Receta.objects.all()
@@ -59,45 +235,50 @@ class RecetaViewSet(viewsets.ModelViewSet):
     def marcar_completada(self, request, pk=None):
         """
         Marca una receta como completada y registra los movimientos de inventario
+        (FEFO, repartiendo cada detalle entre varios lotes si hace falta)
         """
         receta = self.get_object()
-        if receta.estado == 'COMPLETADA':
-            return Response({'error': 'La receta ya está completada'}, status=400)
-        
-        # Transacción atómica para asegurar que todo se completa o nada
-        with transaction.atomic():
-            receta.estado = 'COMPLETADA'
-            receta.save()
-            
-            for detalle in receta.detalles.all():
-                # Buscar lotes disponibles
-                lotes = detalle.medicamento.lotes.filter(
-                    cantidad__gte=detalle.cantidad
-                ).order_by('fecha_vencimiento')
-                
-                if not lotes.exists():
-                    # Rollback de la transacción
-                    raise ValidationError(
-                        f'No hay suficiente stock de {detalle.medicamento.nombre}'
-                    )
-                
-                lote = lotes.first()
+        try:
+            # Transacción atómica para asegurar que todo se completa o nada
+            with transaction.atomic():
+                receta = Receta.objects.select_for_update().select_related('mascota').get(pk=receta.pk)
+                if receta.estado == 'COMPLETADA':
+                    return Response({'error': 'La receta ya está completada'}, status=400)
                 
-                # Registrar movimiento
-                MovimientoInventario.objects.create(
-                    medicamento=detalle.medicamento,
-                    lote=lote,
-                    tipo='SALIDA',
-                    cantidad=detalle.cantidad,
-                    fecha=timezone.now(),
+                receta.estado = 'COMPLETADA'
+                receta.save(update_fields=['estado', 'updated_at'])
+                movimientos = registrar_salidas(
+                    [(detalle.medicamento, detalle.cantidad)
+                     for detalle in receta.detalles.select_related('medicamento')],
                     usuario=request.user,
-                    motivo=f"Receta #{receta.id} para {receta.mascota.nombre}",
-                    afecta_stock=True
+                    motivo=f"Receta #{receta.id} para {receta.mascota.nombre}"
                 )
+        except StockInsuficiente as e:
+            return Response(
+                {'error': str(e), 'faltantes': e.faltantes},
+                status=status.HTTP_409_CONFLICT
+            )
         
-        return Response({'status': 'La receta ha sido completada'})
+        return Response({
+            'status': 'La receta ha sido completada',
+            'movimientos': [
+                {'medicamento': m.medicamento.nombre, 'lote': m.lote.numero_lote, 'cantidad': m.cantidad}
+                for m in movimientos
+            ]
+        })
 
 class DetalleRecetaViewSet(viewsets.ModelViewSet):
     queryset = DetalleReceta.objects.all()
     serializer_class = DetalleRecetaSerializer
-    filterset_fields = ['receta', 'medicamento']
\ No newline at end of file
+    filterset_fields = ['receta', 'medicamento']
+    
+    def create(self, request, *args, **kwargs):
+        # Agregar un detalle a una receta completada lo dispensa (ver historial_medico.signals)
+        try:
+            with transaction.atomic():
+                return super().create(request, *args, **kwargs)
+        except StockInsuficiente as e:
+            return Response(
+                {'error': str(e), 'faltantes': e.faltantes},
+                status=status.HTTP_409_CONFLICT
+            )
\ No newline at end of file
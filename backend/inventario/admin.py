@@ -1,7 +1,7 @@
 # inventario/admin.py
 from django.contrib import admin
 from .models import (Proveedor, DireccionProveedor, Medicamento, 
-                    LoteMedicamento, MovimientoInventario)
+                    LoteMedicamento, MovimientoInventario, CierreStock)
 
 @admin.register(Proveedor)
 class ProveedorAdmin(admin.ModelAdmin):
@@ -33,4 +33,11 @@ class MovimientoInventarioAdmin(admin.ModelAdmin):
     list_display = ('medicamento', 'lote', 'tipo', 'cantidad', 'fecha', 'usuario')
     list_filter = ('tipo', 'fecha', 'afecta_stock')
     search_fields = ('medicamento__nombre', 'motivo', 'documento_referencia')
-    date_hierarchy = 'fecha'
\ No newline at end of file
+    date_hierarchy = 'fecha'
+
+@admin.register(CierreStock)
+class CierreStockAdmin(admin.ModelAdmin):
+    list_display = ('fecha', 'medicamento', 'lote', 'cantidad')
+    list_filter = ('fecha',)
+    search_fields = ('medicamento__nombre', 'lote__numero_lote')
+    date_hierarchy = 'fecha'
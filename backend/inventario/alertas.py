@@ -0,0 +1,112 @@
+# inventario/alertas.py
+"""
+Alertas de inventario: medicamentos con stock bajo, lotes por vencer y lotes
+vencidos que todavía tienen unidades.
+
+Se calculan con dos consultas en la base de datos: el stock bajo compara los
+contadores de Medicamento (sin sumar lotes) y los lotes salen de un único
+recorrido del índice parcial de lotes con stock, por fecha de vencimiento.
+La respuesta se cachea unos segundos porque la pantalla de inventario la
+pide en cada carga. La clave lleva una versión que inventario.services
+incrementa al confirmar cualquier cambio de stock, así que un movimiento se
+ve en las alertas de inmediato y no al vencer el TTL. Para eso el caché debe
+ser compartido entre workers (CACHES en settings; ``check --deploy`` avisa si
+no lo es): con uno por proceso la versión solo sube en el worker que escribió.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import LoteMedicamento, Medicamento
+
+TTL_ALERTAS = getattr(settings, 'INVENTARIO_ALERTAS_CACHE_TTL', 60)
+DIAS_POR_VENCER_DEFECTO = 30
+CLAVE_VERSION_ALERTAS = 'inventario:alertas:version'
+
+
+def version_alertas():
+    # Si la versión se pierde del caché la nueva no coincide con ninguna anterior
+    return cache.get_or_set(CLAVE_VERSION_ALERTAS, time.time_ns(), None)
+
+
+def clave_alertas(dias, hoy, version=None):
+    version = version_alertas() if version is None else version
+    return f'inventario:alertas:{version}:{hoy.isoformat()}:{dias}'
+
+
+def subir_version_alertas():
+    try:
+        cache.incr(CLAVE_VERSION_ALERTAS)
+    except ValueError:
+        # Sin versión guardada no hay entradas que descartar
+        pass
+
+
+def invalidar_alertas():
+    """
+    Descarta las alertas cacheadas (de cualquier ``dias``) al confirmar la
+    transacción, para que una lectura concurrente no vuelva a cachear datos
+    viejos. Se sube la versión una sola vez por transacción, por muchos
+    movimientos que registre.
+    """
+    conexion = transaction.get_connection()
+    if conexion.in_atomic_block and any(
+        funcion is subir_version_alertas for _, funcion, _ in conexion.run_on_commit
+    ):
+        return
+    transaction.on_commit(subir_version_alertas)
+
+
+def calcular_alertas(dias=DIAS_POR_VENCER_DEFECTO, hoy=None):
+    hoy = hoy or timezone.localdate()
+    limite = hoy + timedelta(days=dias)
+
+    stock_bajo = [
+        dict(fila, stock_disponible=fila['stock_actual'] - fila['stock_vencido'])
+        for fila in Medicamento.objects.filter(activo=True)
+        .annotate(disponible=F('stock_actual') - F('stock_vencido'))
+        .filter(disponible__lt=F('stock_minimo'))
+        .order_by('disponible', 'nombre')
+        .values('id', 'nombre', 'presentacion', 'stock_minimo', 'stock_actual', 'stock_vencido',
+                proveedor_nombre=F('proveedor__nombre'))
+    ]
+
+    por_vencer, vencidos = [], []
+    for lote in (
+        LoteMedicamento.objects.filter(cantidad__gt=0, fecha_vencimiento__lte=limite)
+        .order_by('fecha_vencimiento', 'id')
+        .values('id', 'medicamento_id', 'numero_lote', 'fecha_vencimiento', 'cantidad',
+                medicamento_nombre=F('medicamento__nombre'))
+    ):
+        if lote['fecha_vencimiento'] < hoy:
+            vencidos.append(lote)
+        else:
+            lote['dias_para_vencer'] = (lote['fecha_vencimiento'] - hoy).days
+            por_vencer.append(lote)
+
+    return {
+        'fecha': hoy,
+        'dias': dias,
+        'stock_bajo': stock_bajo,
+        'por_vencer': por_vencer,
+        'vencidos': vencidos,
+    }
+
+
+def alertas_inventario(dias=DIAS_POR_VENCER_DEFECTO):
+    """
+    Alertas con ``dias`` de anticipación para los lotes por vencer, cacheadas
+    TTL_ALERTAS segundos.
+    """
+    hoy = timezone.localdate()
+    clave = clave_alertas(dias, hoy)
+    alertas = cache.get(clave)
+    if alertas is None:
+        alertas = calcular_alertas(dias, hoy)
+        cache.set(clave, alertas, TTL_ALERTAS)
+    return alertas
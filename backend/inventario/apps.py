@@ -6,4 +6,5 @@ class InventarioConfig(AppConfig):
     name = "inventario"
     
     def ready(self):
+        import inventario.checks
         import inventario.signals
\ No newline at end of file
@@ -0,0 +1,27 @@
+# inventario/checks.py
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+# Backends cuyo contenido no ven los demás procesos
+CACHES_POR_PROCESO = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches, deploy=True)
+def cache_compartido(app_configs, **kwargs):
+    """
+    Las alertas de inventario se invalidan subiendo una versión en el caché:
+    con un caché por proceso los demás workers no ven el cambio hasta el TTL.
+    """
+    backend = settings.CACHES.get('default', {}).get('BACKEND')
+    if backend in CACHES_POR_PROCESO:
+        return [Warning(
+            "El caché por defecto no se comparte entre procesos; las alertas de "
+            "inventario y el historial completo de las mascotas quedarán "
+            "desactualizados en los demás workers hasta que venzan.",
+            hint="Configure CACHES con un backend compartido (p. ej. RedisCache).",
+            id='inventario.W001',
+        )]
+    return []
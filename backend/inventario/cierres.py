@@ -0,0 +1,194 @@
+# inventario/cierres.py
+"""
+Stock histórico a partir de cierres periódicos (CierreStock).
+
+MovimientoInventario es el libro de cambios de stock de cada lote. Para no
+recorrerlo entero al preguntar por el stock en una fecha, un cierre guarda el
+stock de cada lote en un instante (los lotes en cero se omiten) y el stock en
+una fecha T se obtiene del cierre más cercano:
+
+- lotes que ya existían en el último cierre A <= T: stock en A más los
+  movimientos con fecha en [A, T);
+- lotes creados después de A: stock en el siguiente cierre B > T (o el stock
+  actual si no hay) menos los movimientos con fecha en [T, B).
+
+Así solo se suman los movimientos entre el cierre y la fecha pedida, con una
+consulta agrupada por tramo. Los cambios hechos directamente sobre un lote,
+sin movimiento, no están en el libro y solo quedan reflejados desde el
+siguiente cierre.
+"""
+import datetime
+
+from django.db import transaction
+from django.db.models import Max, Min, Q, Sum
+from django.utils import timezone
+
+from .models import CierreStock, LoteMedicamento, Medicamento, MovimientoInventario
+from .services import efecto_en_stock
+
+TAMANO_LOTE_CIERRE = 1000
+
+
+def inicio_del_dia(fecha):
+    return timezone.make_aware(datetime.datetime.combine(fecha, datetime.time.min))
+
+
+def inicio_del_mes(hoy=None):
+    """
+    Instante del cierre mensual: el primer día del mes de ``hoy`` a las 00:00.
+    """
+    hoy = hoy or timezone.localdate()
+    return inicio_del_dia(hoy.replace(day=1))
+
+
+def _variaciones(desde, hasta, medicamento_id=None, lote_ids=None):
+    """
+    {lote_id: variación de stock} de los movimientos con fecha en [desde, hasta);
+    ``hasta`` None no pone límite superior.
+    """
+    movimientos = MovimientoInventario.objects.filter(afecta_stock=True, lote__isnull=False, fecha__gte=desde)
+    if hasta is not None:
+        movimientos = movimientos.filter(fecha__lt=hasta)
+    if medicamento_id is not None:
+        movimientos = movimientos.filter(medicamento_id=medicamento_id)
+    if lote_ids is not None:
+        movimientos = movimientos.filter(lote_id__in=lote_ids)
+    return dict(movimientos.values_list('lote_id').annotate(variacion=Sum(efecto_en_stock())))
+
+
+def saldo_al(fecha, medicamento_id=None, lote_id=None):
+    """
+    Saldo según el libro de movimientos del medicamento o del lote justo antes
+    de ``fecha``, partiendo del cierre más cercano: el anterior más los
+    movimientos desde él, o si no hay, el siguiente menos los movimientos hasta
+    él. Sin cierres suma todos los movimientos anteriores (el libro está
+    completo: ``particiones archivar`` exige un cierre antes de desprender
+    movimientos).
+    """
+    cierres = CierreStock.objects.all()
+    movimientos = MovimientoInventario.objects.filter(afecta_stock=True, lote__isnull=False)
+    if medicamento_id is not None:
+        cierres = cierres.filter(medicamento_id=medicamento_id)
+        movimientos = movimientos.filter(medicamento_id=medicamento_id)
+    if lote_id is not None:
+        cierres = cierres.filter(lote_id=lote_id)
+        movimientos = movimientos.filter(lote_id=lote_id)
+
+    def total(filas, campo):
+        return filas.aggregate(total=Sum(campo))['total'] or 0
+
+    # Instantes de cierre de todos los lotes: un cierre sin filas del lote vale cero
+    cercanos = CierreStock.objects.aggregate(
+        anterior=Max('fecha', filter=Q(fecha__lte=fecha)),
+        siguiente=Min('fecha', filter=Q(fecha__gt=fecha)),
+    )
+    anterior, siguiente = cercanos['anterior'], cercanos['siguiente']
+    if anterior is not None:
+        return (
+            total(cierres.filter(fecha=anterior), 'cantidad')
+            + total(movimientos.filter(fecha__gte=anterior, fecha__lt=fecha), efecto_en_stock())
+        )
+    if siguiente is not None:
+        return (
+            total(cierres.filter(fecha=siguiente), 'cantidad')
+            - total(movimientos.filter(fecha__gte=fecha, fecha__lt=siguiente), efecto_en_stock())
+        )
+    return total(movimientos.filter(fecha__lt=fecha), efecto_en_stock())
+
+
+def stock_al(fecha, medicamento_id=None):
+    """
+    Stock de cada lote justo antes del instante ``fecha`` como
+    {lote_id: (lote, cantidad)}, donde lote es un dict con id, medicamento_id,
+    numero_lote y fecha_vencimiento. Solo incluye los lotes creados antes de
+    ``fecha``.
+    """
+    lotes = LoteMedicamento.objects.filter(created_at__lt=fecha)
+    cierres = CierreStock.objects.all()
+    if medicamento_id is not None:
+        lotes = lotes.filter(medicamento_id=medicamento_id)
+        cierres = cierres.filter(medicamento_id=medicamento_id)
+    lotes = {
+        lote['id']: lote
+        for lote in lotes.values('id', 'medicamento_id', 'numero_lote', 'fecha_vencimiento', 'cantidad', 'created_at')
+    }
+
+    anterior = cierres.filter(fecha__lte=fecha).aggregate(fecha=Max('fecha'))['fecha']
+    stock = {}
+    if anterior is not None:
+        en_cierre = dict(cierres.filter(fecha=anterior).values_list('lote_id', 'cantidad'))
+        variaciones = _variaciones(anterior, fecha, medicamento_id)
+        for lote_id, lote in lotes.items():
+            if lote['created_at'] < anterior:
+                stock[lote_id] = en_cierre.get(lote_id, 0) + variaciones.get(lote_id, 0)
+
+    pendientes = [lote_id for lote_id in lotes if lote_id not in stock]
+    if pendientes:
+        siguiente = cierres.filter(fecha__gt=fecha).aggregate(fecha=Min('fecha'))['fecha']
+        if siguiente is not None:
+            base = dict(
+                cierres.filter(fecha=siguiente, lote_id__in=pendientes).values_list('lote_id', 'cantidad')
+            )
+        else:
+            base = {lote_id: lotes[lote_id]['cantidad'] for lote_id in pendientes}
+        variaciones = _variaciones(fecha, siguiente, medicamento_id, lote_ids=pendientes)
+        for lote_id in pendientes:
+            stock[lote_id] = base.get(lote_id, 0) - variaciones.get(lote_id, 0)
+
+    return {lote_id: (lotes[lote_id], cantidad) for lote_id, cantidad in stock.items()}
+
+
+def stock_historico(fecha, medicamento_id=None, por_lote=False):
+    """
+    Stock por medicamento justo antes de ``fecha``, ordenado por nombre. Con
+    ``por_lote`` se incluye el detalle de los lotes con stock.
+    """
+    por_medicamento = {}
+    for lote, cantidad in stock_al(fecha, medicamento_id).values():
+        por_medicamento.setdefault(lote['medicamento_id'], []).append((lote, cantidad))
+
+    resultado = []
+    for medicamento_id, nombre in (
+        Medicamento.objects.filter(pk__in=por_medicamento).order_by('nombre', 'id').values_list('id', 'nombre')
+    ):
+        lotes = por_medicamento[medicamento_id]
+        fila = {
+            'medicamento_id': medicamento_id,
+            'nombre': nombre,
+            'stock': sum(cantidad for _, cantidad in lotes),
+        }
+        if por_lote:
+            fila['lotes'] = [
+                {
+                    'lote_id': lote['id'],
+                    'numero_lote': lote['numero_lote'],
+                    'fecha_vencimiento': lote['fecha_vencimiento'],
+                    'cantidad': cantidad,
+                }
+                for lote, cantidad in sorted(lotes, key=lambda item: (item[0]['fecha_vencimiento'], item[0]['id']))
+                if cantidad
+            ]
+        resultado.append(fila)
+    return resultado
+
+
+@transaction.atomic
+def registrar_cierre(fecha=None):
+    """
+    Guarda el stock de cada lote justo antes de ``fecha`` (por defecto el
+    inicio del mes en curso). Reemplaza un cierre anterior del mismo instante.
+    Devuelve la cantidad de lotes con stock guardados.
+    """
+    fecha = fecha or inicio_del_mes()
+    # Se borra antes de calcular para no partir del mismo cierre que se reemplaza
+    CierreStock.objects.filter(fecha=fecha).delete()
+    stock = stock_al(fecha)
+    CierreStock.objects.bulk_create(
+        [
+            CierreStock(lote_id=lote_id, medicamento_id=lote['medicamento_id'], fecha=fecha, cantidad=cantidad)
+            for lote_id, (lote, cantidad) in stock.items()
+            if cantidad
+        ],
+        batch_size=TAMANO_LOTE_CIERRE,
+    )
+    return sum(1 for _, cantidad in stock.values() if cantidad)
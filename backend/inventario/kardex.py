@@ -0,0 +1,103 @@
+# inventario/kardex.py
+"""
+Kardex: movimientos de un medicamento o de un lote en orden cronológico con
+el saldo después de cada uno.
+
+El saldo se calcula en la base de datos con una suma acumulada
+(``SUM(efecto) OVER (ORDER BY fecha, id)``) sobre la página pedida, más el
+saldo de apertura de la página. La paginación es por cursor sobre (fecha, id)
+y el cursor lleva el saldo al final de la página anterior, así que cada
+página cuesta lo mismo sin importar cuántos movimientos haya antes. El
+cursor va firmado para que el saldo no se pueda alterar desde el cliente.
+
+El saldo es el del libro de movimientos y no incluye cambios hechos sobre un
+lote sin registrar un movimiento. El saldo de apertura (antes de ``desde`` o
+del primer movimiento que queda) sale del cierre de stock más cercano (ver
+inventario.cierres.saldo_al), así que solo se suman los movimientos entre el
+cierre y la ventana y sigue siendo correcto después de archivar particiones
+antiguas de movimientos.
+"""
+from django.core import signing
+from django.db.models import F, Min, Sum, Window
+from django.db.models.expressions import RowRange
+from django.utils.dateparse import parse_datetime
+
+from .cierres import saldo_al
+from .models import CierreStock, MovimientoInventario
+from .services import efecto_en_stock
+
+SAL_CURSOR = 'inventario.kardex'
+
+
+def codificar_cursor(fecha, movimiento_id, saldo):
+    return signing.dumps([fecha.isoformat(), movimiento_id, saldo], salt=SAL_CURSOR, compress=True)
+
+
+def decodificar_cursor(cursor):
+    """
+    Devuelve (fecha, id, saldo) o lanza ValueError si el cursor no es válido.
+    """
+    try:
+        fecha, movimiento_id, saldo = signing.loads(cursor, salt=SAL_CURSOR)
+        fecha = parse_datetime(fecha)
+        if fecha is None:
+            raise ValueError
+        return fecha, int(movimiento_id), int(saldo)
+    except (signing.BadSignature, TypeError) as exc:
+        raise ValueError('Cursor inválido') from exc
+
+
+def kardex(medicamento_id=None, lote_id=None, desde=None, cursor=None, limite=50):
+    """
+    Devuelve (movimientos, saldo_inicial, cursor_siguiente) para una página
+    del kardex del medicamento o del lote. ``desde`` (datetime) hace partir
+    la primera página en esa fecha con el saldo acumulado hasta entonces.
+    """
+    movimientos = MovimientoInventario.objects.all()
+    if medicamento_id is not None:
+        movimientos = movimientos.filter(medicamento_id=medicamento_id)
+    if lote_id is not None:
+        movimientos = movimientos.filter(lote_id=lote_id)
+
+    if cursor is not None:
+        fecha, ultimo_id, saldo_inicial = cursor
+        pagina = movimientos.filter(fecha__gte=fecha).exclude(fecha=fecha, id__lte=ultimo_id)
+    elif desde is not None:
+        saldo_inicial = saldo_al(desde, medicamento_id, lote_id)
+        pagina = movimientos.filter(fecha__gte=desde)
+    elif CierreStock.objects.exists():
+        # Puede haber movimientos archivados: el primero que queda no parte de cero
+        desde = movimientos.aggregate(fecha=Min('fecha'))['fecha']
+        saldo_inicial = saldo_al(desde, medicamento_id, lote_id) if desde is not None else 0
+        pagina = movimientos
+    else:
+        saldo_inicial = 0
+        pagina = movimientos
+
+    filas = list(
+        pagina.annotate(
+            efecto=efecto_en_stock(),
+            acumulado=Window(
+                Sum(efecto_en_stock()),
+                order_by=[F('fecha').asc(), F('id').asc()],
+                frame=RowRange(start=None, end=0),
+            ),
+        )
+        .order_by('fecha', 'id')
+        .values('id', 'fecha', 'tipo', 'cantidad', 'efecto', 'acumulado', 'afecta_stock',
+                'lote_id', 'documento_referencia', 'motivo',
+                numero_lote=F('lote__numero_lote'),
+                usuario_nombre=F('usuario__first_name'),
+                usuario_apellido=F('usuario__last_name'))[:limite + 1]
+    )
+    hay_mas = len(filas) > limite
+    filas = filas[:limite]
+    for fila in filas:
+        fila['saldo'] = saldo_inicial + fila.pop('acumulado')
+        fila['usuario_nombre'] = f"{fila['usuario_nombre']} {fila.pop('usuario_apellido')}".strip()
+
+    siguiente = None
+    if hay_mas:
+        ultima = filas[-1]
+        siguiente = codificar_cursor(ultima['fecha'], ultima['id'], ultima['saldo'])
+    return filas, saldo_inicial, siguiente
@@ -0,0 +1,32 @@
+# inventario/management/commands/cierre_stock.py
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from inventario.cierres import inicio_del_dia, inicio_del_mes, registrar_cierre
+
+
+class Command(BaseCommand):
+    help = (
+        "Guarda el stock de cada lote al cierre de un día (por defecto, el cierre del mes "
+        "anterior) para consultar el stock histórico sin recorrer todos los movimientos. "
+        "Pensado para ejecutarse el primer día de cada mes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fecha', help="Día a cerrar (YYYY-MM-DD); se guarda el stock al final del día.")
+
+    def handle(self, *args, **options):
+        if options['fecha']:
+            try:
+                dia = parse_date(options['fecha'])
+            except ValueError:
+                dia = None
+            if dia is None:
+                raise CommandError("--fecha debe tener el formato YYYY-MM-DD")
+            instante = inicio_del_dia(dia + datetime.timedelta(days=1))
+        else:
+            instante = inicio_del_mes()
+        lotes = registrar_cierre(instante)
+        self.stdout.write(self.style.SUCCESS(f"Cierre al {instante:%Y-%m-%d %H:%M}: {lotes} lotes con stock"))
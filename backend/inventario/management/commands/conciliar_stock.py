@@ -0,0 +1,39 @@
+# inventario/management/commands/conciliar_stock.py
+from django.core.management.base import BaseCommand
+
+from inventario.services import conciliar_stock, registrar_vencimientos
+
+
+class Command(BaseCommand):
+    help = (
+        "Marca los lotes vencidos y vuelve a derivar stock_actual y stock_vencido de cada "
+        "medicamento desde sus lotes, por bloques, informando las diferencias. Pensado para "
+        "ejecutarse a diario después de medianoche."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bloque', type=int, default=500,
+                            help="Medicamentos por transacción (por defecto 500).")
+        parser.add_argument('--solo-revisar', action='store_true', dest='solo_revisar',
+                            help="Informa las diferencias sin corregirlas.")
+
+    def handle(self, *args, **options):
+        if not options['solo_revisar']:
+            vencidos = registrar_vencimientos()
+            self.stdout.write(f"Lotes marcados como vencidos: {vencidos}")
+
+        diferencias = conciliar_stock(
+            tamano_bloque=max(options['bloque'], 1),
+            corregir=not options['solo_revisar'],
+        )
+        for d in diferencias:
+            self.stdout.write(self.style.WARNING(
+                f"{d['nombre']} (#{d['medicamento_id']}): stock_actual {d['stock_actual']} -> "
+                f"{d['esperado_actual']}, stock_vencido {d['stock_vencido']} -> {d['esperado_vencido']}"
+            ))
+        if not diferencias:
+            self.stdout.write(self.style.SUCCESS("Sin diferencias"))
+        elif options['solo_revisar']:
+            self.stdout.write(self.style.WARNING(f"{len(diferencias)} medicamentos con diferencias"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"{len(diferencias)} medicamentos corregidos"))
@@ -0,0 +1,24 @@
+# Generated by Django 5.0.6 on 2026-10-18 00:13
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("inventario", "0001_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="movimientoinventario",
+            index=models.Index(fields=["-fecha", "id"], name="inv_mov_fecha_id_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="movimientoinventario",
+            index=models.Index(
+                fields=["medicamento", "-fecha", "id"], name="inv_mov_med_fecha_id_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.0.6 on 2026-10-18 00:30
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def calcular_stock_actual(apps, schema_editor):
+    Medicamento = apps.get_model("inventario", "Medicamento")
+    LoteMedicamento = apps.get_model("inventario", "LoteMedicamento")
+    totales = (
+        LoteMedicamento.objects.filter(medicamento_id=OuterRef("pk"))
+        .values("medicamento_id")
+        .annotate(total=Sum("cantidad"))
+        .values("total")
+    )
+    Medicamento.objects.update(stock_actual=Coalesce(Subquery(totales), 0))
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("inventario", "0002_indices_paginacion_cursor"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="medicamento",
+            name="stock_actual",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(calcular_stock_actual, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,200 @@
+# Generated by Django 5.0.6 on 2026-10-18 00:43
+
+import re
+
+from django.db import migrations
+from django.utils import timezone
+
+# Particiona la tabla por año (ver core.particiones). El SQL está completo aquí,
+# sin importar ese módulo, para que la migración no cambie si el módulo cambia
+TABLA = "inventario_movimientoinventario"
+COLUMNA = "fecha"
+# Filas más antiguas que esto quedan en la partición default al particionar
+ANIOS_HACIA_ATRAS_MAXIMO = 20
+VERSION_MINIMA = 130000
+
+
+def _filas(cursor, sql, parametros=None):
+    cursor.execute(sql, parametros)
+    return cursor.fetchall()
+
+
+def _limite(cursor, tabla, columna, anio):
+    tipo = _filas(
+        cursor,
+        """
+        SELECT format_type(atttypid, atttypmod) FROM pg_attribute
+        WHERE attrelid = %s::regclass AND attname = %s
+    """,
+        [tabla, columna],
+    )[0][0]
+    if tipo == "date":
+        return f"'{anio}-01-01'"
+    return f"'{anio}-01-01 00:00:00+00'"
+
+
+def _definiciones(cursor, tabla):
+    """
+    Índices, restricciones (únicas, foráneas y de exclusión) y triggers
+    declarados sobre ``tabla``, como SQL para recrearlos.
+    """
+    indices = [
+        fila[0]
+        for fila in _filas(
+            cursor,
+            """
+        SELECT pg_get_indexdef(i.indexrelid) FROM pg_index i
+        WHERE i.indrelid = %s::regclass
+          AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.indexrelid AND c.conrelid = i.indrelid)
+    """,
+            [tabla],
+        )
+    ]
+    restricciones = _filas(
+        cursor,
+        """
+        SELECT conname, contype, pg_get_constraintdef(oid) FROM pg_constraint
+        WHERE conrelid = %s::regclass AND contype IN ('u', 'f', 'x')
+        ORDER BY conname
+    """,
+        [tabla],
+    )
+    triggers = [
+        fila[0]
+        for fila in _filas(
+            cursor,
+            """
+        SELECT pg_get_triggerdef(oid) FROM pg_trigger WHERE tgrelid = %s::regclass AND NOT tgisinternal
+    """,
+            [tabla],
+        )
+    ]
+    return indices, restricciones, triggers
+
+
+def _exclusiones(cursor, tabla, prefijo):
+    """
+    Restricciones de exclusión de ``tabla`` como [(sufijo, definición)], donde
+    el sufijo es el nombre sin ``prefijo``.
+    """
+    return [
+        (nombre[len(prefijo) :] if nombre.startswith(prefijo) else nombre, definicion)
+        for nombre, tipo, definicion in _definiciones(cursor, tabla)[1]
+        if tipo == "x"
+    ]
+
+
+def _sin_only(definicion, tabla):
+    # pg_get_indexdef agrega ONLY en los índices de una tabla particionada
+    return re.sub(
+        rf"\bON (?:ONLY )?(?:\w+\.)?{re.escape(tabla)}\b", f"ON {tabla}", definicion
+    )
+
+
+def _crear_particion(cursor, tabla, columna, anio, exclusiones):
+    particion = f"{tabla}_p{anio}"
+    cursor.execute(
+        f"CREATE TABLE {particion} PARTITION OF {tabla} FOR VALUES "
+        f"FROM ({_limite(cursor, tabla, columna, anio)}) TO ({_limite(cursor, tabla, columna, anio + 1)})"
+    )
+    for sufijo, definicion in exclusiones:
+        cursor.execute(
+            f"ALTER TABLE {particion} ADD CONSTRAINT {particion}_{sufijo} {definicion}"
+        )
+
+
+def _reconstruir(cursor, tabla, columna, particionar):
+    """
+    Reemplaza ``tabla`` por una versión particionada (o de nuevo por una tabla
+    normal) con los mismos datos, índices, restricciones y triggers.
+    """
+    if cursor.db.pg_version < VERSION_MINIMA:
+        raise RuntimeError("El particionamiento requiere PostgreSQL 13 o superior")
+    anterior = f"{tabla}_anterior"
+    default = f"{tabla}_pdefault"
+    indices, restricciones, triggers = _definiciones(cursor, tabla)
+    if particionar:
+        exclusiones = _exclusiones(cursor, tabla, f"{tabla}_")
+    else:
+        exclusiones = _exclusiones(cursor, default, f"{default}_")
+    for nombre, tipo, definicion in restricciones:
+        if particionar and tipo == "u" and not re.search(rf"\b{columna}\b", definicion):
+            raise RuntimeError(
+                f"La restricción {nombre} de {tabla} no incluye {columna}; "
+                "en una tabla particionada toda restricción única debe incluirla"
+            )
+
+    cursor.execute(f"ALTER TABLE {tabla} RENAME TO {anterior}")
+    cursor.execute(
+        f"CREATE TABLE {tabla} (LIKE {anterior} INCLUDING DEFAULTS INCLUDING CONSTRAINTS "
+        f"INCLUDING STORAGE INCLUDING COMMENTS)"
+        + (f" PARTITION BY RANGE ({columna})" if particionar else "")
+    )
+    cursor.execute(f"ALTER TABLE {tabla} ALTER COLUMN id DROP DEFAULT")
+
+    if particionar:
+        actual = timezone.localdate().year
+        (desde,) = _filas(
+            cursor, f"SELECT EXTRACT(YEAR FROM min({columna}))::int FROM {anterior}"
+        )[0]
+        desde = max(desde or actual, actual - ANIOS_HACIA_ATRAS_MAXIMO)
+        for anio in range(min(desde, actual), actual + 2):
+            _crear_particion(cursor, tabla, columna, anio, exclusiones)
+        cursor.execute(f"CREATE TABLE {default} PARTITION OF {tabla} DEFAULT")
+        for sufijo, definicion in exclusiones:
+            cursor.execute(
+                f"ALTER TABLE {default} ADD CONSTRAINT {default}_{sufijo} {definicion}"
+            )
+
+    cursor.execute(f"INSERT INTO {tabla} SELECT * FROM {anterior}")
+    (ultimo_id,) = _filas(cursor, f"SELECT max(id) FROM {anterior}")[0]
+    # Elimina también la secuencia (o identidad) anterior, índices y triggers
+    cursor.execute(f"DROP TABLE {anterior}")
+
+    cursor.execute(f"CREATE SEQUENCE {tabla}_id_seq OWNED BY {tabla}.id")
+    cursor.execute(
+        "SELECT setval(%s, %s, %s)",
+        [f"{tabla}_id_seq", ultimo_id or 1, ultimo_id is not None],
+    )
+    cursor.execute(
+        f"ALTER TABLE {tabla} ALTER COLUMN id SET DEFAULT nextval('{tabla}_id_seq')"
+    )
+    clave = f"(id, {columna})" if particionar else "(id)"
+    cursor.execute(
+        f"ALTER TABLE {tabla} ADD CONSTRAINT {tabla}_pkey PRIMARY KEY {clave}"
+    )
+
+    for nombre, tipo, definicion in restricciones:
+        if tipo != "x":
+            cursor.execute(f"ALTER TABLE {tabla} ADD CONSTRAINT {nombre} {definicion}")
+    if not particionar:
+        for sufijo, definicion in exclusiones:
+            cursor.execute(
+                f"ALTER TABLE {tabla} ADD CONSTRAINT {tabla}_{sufijo} {definicion}"
+            )
+    for definicion in indices + triggers:
+        cursor.execute(_sin_only(definicion, tabla))
+    cursor.execute(f"ANALYZE {tabla}")
+
+
+def particionar(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        with schema_editor.connection.cursor() as cursor:
+            _reconstruir(cursor, TABLA, COLUMNA, particionar=True)
+
+
+def revertir_particionado(apps, schema_editor):
+    # Las particiones archivadas (desprendidas) no se reincorporan
+    if schema_editor.connection.vendor == "postgresql":
+        with schema_editor.connection.cursor() as cursor:
+            _reconstruir(cursor, TABLA, COLUMNA, particionar=False)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("inventario", "0003_stock_actual_medicamento"),
+    ]
+
+    operations = [
+        migrations.RunPython(particionar, revertir_particionado),
+    ]
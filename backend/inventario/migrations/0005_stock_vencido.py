@@ -0,0 +1,57 @@
+# Generated by Django 5.0.6 on 2026-10-18 00:48
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+
+def calcular_stock_vencido(apps, schema_editor):
+    Medicamento = apps.get_model("inventario", "Medicamento")
+    LoteMedicamento = apps.get_model("inventario", "LoteMedicamento")
+    LoteMedicamento.objects.filter(fecha_vencimiento__lt=timezone.localdate()).update(
+        vencido=True
+    )
+
+    def total(filtro=Q()):
+        return Coalesce(
+            Subquery(
+                LoteMedicamento.objects.filter(filtro, medicamento_id=OuterRef("pk"))
+                .values("medicamento_id")
+                .annotate(total=Sum("cantidad"))
+                .values("total")
+            ),
+            0,
+        )
+
+    Medicamento.objects.update(
+        stock_actual=total(), stock_vencido=total(Q(vencido=True))
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("inventario", "0004_particionar_movimientos"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="lotemedicamento",
+            name="vencido",
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name="medicamento",
+            name="stock_vencido",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name="lotemedicamento",
+            index=models.Index(
+                condition=models.Q(("vencido", False)),
+                fields=["fecha_vencimiento"],
+                name="inv_lote_por_vencer_idx",
+            ),
+        ),
+        migrations.RunPython(calcular_stock_vencido, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.0.6 on 2026-10-18 00:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("inventario", "0005_stock_vencido"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="lotemedicamento",
+            index=models.Index(
+                fields=["medicamento", "fecha_vencimiento"],
+                include=("cantidad",),
+                name="inv_lote_med_venc_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="lotemedicamento",
+            index=models.Index(
+                condition=models.Q(("cantidad__gt", 0)),
+                fields=["fecha_vencimiento"],
+                name="inv_lote_con_stock_venc_idx",
+            ),
+        ),
+    ]
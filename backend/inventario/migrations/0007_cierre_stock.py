@@ -0,0 +1,62 @@
+# Generated by Django 5.0.6 on 2026-10-18 00:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("inventario", "0006_indices_alertas"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CierreStock",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("fecha", models.DateTimeField()),
+                ("cantidad", models.IntegerField()),
+                (
+                    "lote",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="cierres",
+                        to="inventario.lotemedicamento",
+                    ),
+                ),
+                (
+                    "medicamento",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="cierres_stock",
+                        to="inventario.medicamento",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Cierre de Stock",
+                "verbose_name_plural": "Cierres de Stock",
+                "indexes": [
+                    models.Index(
+                        fields=["fecha", "medicamento"], name="inv_cierre_fecha_med_idx"
+                    )
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="cierrestock",
+            constraint=models.UniqueConstraint(
+                fields=("lote", "fecha"), name="unique_cierre_stock_por_lote"
+            ),
+        ),
+    ]
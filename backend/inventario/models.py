@@ -70,11 +70,21 @@ class Medicamento(BaseModel):
         validators=[validar_precio_positivo]
     )
     stock_minimo = models.PositiveIntegerField(validators=[validar_cantidad_positiva])
+    # Contadores mantenidos por inventario.services en la misma transacción que
+    # cada movimiento: unidades en todos los lotes y, de ellas, en lotes vencidos
+    stock_actual = models.PositiveIntegerField(default=0, editable=False)
+    stock_vencido = models.PositiveIntegerField(default=0, editable=False)
     activo = models.BooleanField(default=True)
     requiere_receta = models.BooleanField(default=False)
     
     def __str__(self):
         return self.nombre
+
+    def stock_disponible(self):
+        """
+        Unidades en lotes vigentes, sin consultar los lotes
+        """
+        return self.stock_actual - self.stock_vencido
     
     class Meta:
         verbose_name = "Medicamento"
@@ -91,6 +101,8 @@ class LoteMedicamento(BaseModel):
     fecha_ingreso = models.DateField()
     proveedor = models.ForeignKey(Proveedor, on_delete=models.PROTECT, related_name='lotes')
     precio_compra = models.DecimalField(max_digits=10, decimal_places=2)
+    # Sus unidades se cuentan en Medicamento.stock_vencido (ver inventario.services)
+    vencido = models.BooleanField(default=False, editable=False)
     
     def __str__(self):
         return f"Lote {self.numero_lote} - {self.medicamento.nombre}"
@@ -99,6 +111,17 @@ class LoteMedicamento(BaseModel):
         verbose_name = "Lote de Medicamento"
         verbose_name_plural = "Lotes de Medicamentos"
         unique_together = ('medicamento', 'numero_lote')
+        indexes = [
+            # Lotes que registrar_vencimientos todavía debe revisar
+            models.Index(fields=['fecha_vencimiento'], condition=models.Q(vencido=False),
+                         name='inv_lote_por_vencer_idx'),
+            # Lotes de un medicamento en orden FEFO, con la cantidad en el índice
+            models.Index(fields=['medicamento', 'fecha_vencimiento'], include=['cantidad'],
+                         name='inv_lote_med_venc_idx'),
+            # Alertas de vencimiento (inventario.alertas)
+            models.Index(fields=['fecha_vencimiento'], condition=models.Q(cantidad__gt=0),
+                         name='inv_lote_con_stock_venc_idx'),
+        ]
 
 class MovimientoInventario(BaseModel):
     TIPOS = [
@@ -122,4 +145,32 @@ class MovimientoInventario(BaseModel):
     
     class Meta:
         verbose_name = "Movimiento de Inventario"
-        verbose_name_plural = "Movimientos de Inventario"
\ No newline at end of file
+        verbose_name_plural = "Movimientos de Inventario"
+        # Paginación por cursor sobre (-fecha, id), global y por medicamento
+        indexes = [
+            models.Index(fields=['-fecha', 'id'], name='inv_mov_fecha_id_idx'),
+            models.Index(fields=['medicamento', '-fecha', 'id'], name='inv_mov_med_fecha_id_idx'),
+        ]
+
+class CierreStock(BaseModel):
+    """
+    Stock de un lote justo antes de ``fecha`` (incluye los movimientos con
+    fecha anterior). Lo generan los cierres periódicos de inventario.cierres.
+    """
+    lote = models.ForeignKey(LoteMedicamento, on_delete=models.CASCADE, related_name='cierres')
+    medicamento = models.ForeignKey(Medicamento, on_delete=models.CASCADE, related_name='cierres_stock')
+    fecha = models.DateTimeField()
+    cantidad = models.IntegerField()
+
+    def __str__(self):
+        return f"Cierre {self.fecha:%Y-%m-%d} - {self.lote} - {self.cantidad}"
+
+    class Meta:
+        verbose_name = "Cierre de Stock"
+        verbose_name_plural = "Cierres de Stock"
+        constraints = [
+            models.UniqueConstraint(fields=['lote', 'fecha'], name='unique_cierre_stock_por_lote'),
+        ]
+        indexes = [
+            models.Index(fields=['fecha', 'medicamento'], name='inv_cierre_fecha_med_idx'),
+        ]
@@ -1,6 +1,8 @@
+from decimal import Decimal
 from rest_framework import serializers
 from .models import Proveedor, DireccionProveedor, Medicamento, LoteMedicamento, MovimientoInventario
 from django.core.validators import MinValueValidator
+from core.validators import validar_fecha_futura
 
 class DireccionProveedorSerializer(serializers.ModelSerializer):
     class Meta:
@@ -24,6 +26,7 @@ class ProveedorSerializer(serializers.ModelSerializer):
 
 class MedicamentoSerializer(serializers.ModelSerializer):
     proveedor_nombre = serializers.ReadOnlyField(source='proveedor.nombre')
+    stock_disponible = serializers.ReadOnlyField()
     
     class Meta:
         model = Medicamento
@@ -103,8 +106,56 @@ class MovimientoInventarioSerializer(serializers.ModelSerializer):
         return value
     
     def validate(self, data):
-        if data['tipo'] == 'SALIDA' and data['cantidad'] > data['medicamento'].stock_disponible():
+        # Lee el contador del medicamento; el lote se valida al aplicar el movimiento
+        if (data.get('tipo') == 'SALIDA' and 'medicamento' in data
+                and data['cantidad'] > data['medicamento'].stock_disponible()):
             raise serializers.ValidationError(
                 {"cantidad": "No hay suficiente stock disponible para esta salida"}
             )
-        return data
\ No newline at end of file
+        return data
+
+class LineaRecepcionSerializer(serializers.Serializer):
+    # Entero y no PrimaryKeyRelatedField: los medicamentos se cargan juntos en RecepcionSerializer
+    medicamento = serializers.IntegerField()
+    numero_lote = serializers.CharField(max_length=50)
+    fecha_vencimiento = serializers.DateField(validators=[validar_fecha_futura])
+    cantidad = serializers.IntegerField(min_value=1)
+    precio_compra = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0.01'))
+
+class RecepcionSerializer(serializers.Serializer):
+    """
+    Entrega completa de un proveedor: todas las líneas se validan antes de
+    escribir nada
+    """
+    proveedor = serializers.PrimaryKeyRelatedField(queryset=Proveedor.objects.all())
+    documento_referencia = serializers.CharField(max_length=100, required=False, allow_blank=True)
+    motivo = serializers.CharField(required=False, default='Recepción de proveedor')
+    fecha_ingreso = serializers.DateField(required=False)
+    lineas = LineaRecepcionSerializer(many=True, allow_empty=False, max_length=500)
+
+    def validate_lineas(self, lineas):
+        medicamentos = Medicamento.objects.in_bulk({linea['medicamento'] for linea in lineas})
+        claves = {(linea['medicamento'], linea['numero_lote']) for linea in lineas}
+        existentes = set(
+            LoteMedicamento.objects.filter(
+                medicamento_id__in=medicamentos, numero_lote__in={numero for _, numero in claves}
+            ).values_list('medicamento_id', 'numero_lote')
+        )
+
+        errores = {}
+        vistas = set()
+        for indice, linea in enumerate(lineas):
+            clave = (linea['medicamento'], linea['numero_lote'])
+            if linea['medicamento'] not in medicamentos:
+                errores[indice] = {'medicamento': "El medicamento no existe"}
+            elif clave in existentes:
+                errores[indice] = {'numero_lote': "El lote ya está registrado para este medicamento"}
+            elif clave in vistas:
+                errores[indice] = {'numero_lote': "El lote está repetido en la entrega"}
+            vistas.add(clave)
+        if errores:
+            raise serializers.ValidationError(errores)
+
+        for linea in lineas:
+            linea['medicamento'] = medicamentos[linea['medicamento']]
+        return lineas
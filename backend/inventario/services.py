@@ -0,0 +1,430 @@
+# inventario/services.py
+"""
+Servicios de stock: libro de movimientos, asignación de lotes y registro de
+movimientos en bloque.
+
+Cada movimiento se aplica a su lote con un UPDATE atómico (F()), sin guardar
+el lote ni disparar sus señales. Los contadores del medicamento
+(``Medicamento.stock_actual`` y ``stock_vencido``) se actualizan también con
+F() en la misma transacción, después del lote, así que leer el stock no
+requiere sumar lotes. Un lote pasa a contarse como vencido cuando
+``registrar_vencimientos`` lo marca (``conciliar_stock`` lo hace cada día);
+el mismo comando vuelve a derivar los contadores desde los lotes e informa
+las diferencias. Todo cambio de contadores invalida además las alertas
+cacheadas (ver inventario.alertas), una vez por transacción.
+
+Los contadores no se acumulan para escribirlos una sola vez al confirmar:
+deben cambiar en la misma transacción que el movimiento, así que cada
+movimiento suelto cuesta un UPDATE del lote y uno del medicamento, y los
+registros en bloque (registrar_salidas, registrar_recepcion) agrupan todas
+sus líneas en un único UPDATE de contadores.
+
+Las salidas se asignan FEFO (primero en vencer, primero en salir) repartiendo
+cada línea entre tantos lotes como haga falta. Los lotes candidatos se leen y
+bloquean (SELECT ... FOR UPDATE) en una sola consulta, los movimientos se
+insertan con bulk_create y los lotes se descuentan con un único UPDATE, en
+vez de crear los movimientos uno a uno y dejar que las señales actualicen
+cada lote.
+"""
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Exists, F, IntegerField, Q, Sum, Value, When
+from django.utils import timezone
+
+from .alertas import invalidar_alertas
+from .models import LoteMedicamento, Medicamento, MovimientoInventario
+
+
+class StockInsuficiente(Exception):
+    """
+    Una o más líneas no tienen stock suficiente; ``faltantes`` detalla cada una.
+    """
+    def __init__(self, faltantes):
+        self.faltantes = faltantes
+        nombres = ', '.join(str(f['medicamento']) for f in faltantes)
+        super().__init__(f"No hay suficiente stock de: {nombres}")
+
+
+class LoteDuplicado(Exception):
+    """
+    Otra recepción registró antes el mismo número de lote para el medicamento;
+    ``duplicados`` detalla cada línea afectada.
+    """
+    def __init__(self, duplicados):
+        self.duplicados = duplicados
+        lotes = ', '.join(str(d['numero_lote']) for d in duplicados)
+        super().__init__(f"Los lotes ya están registrados: {lotes}")
+
+
+def efecto_en_stock():
+    """
+    Variación de stock de cada movimiento, igual que aplicar_movimiento: las
+    entradas suman, las salidas restan y los ajustes o movimientos que no
+    afectan stock valen cero.
+    """
+    return Case(
+        When(afecta_stock=True, lote__isnull=False, tipo='ENTRADA', then=F('cantidad')),
+        When(afecta_stock=True, lote__isnull=False, tipo='SALIDA', then=-F('cantidad')),
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def _por_medicamento(valores):
+    return Case(
+        *[When(pk=medicamento_id, then=Value(valor)) for medicamento_id, valor in valores.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def ajustar_stock(deltas):
+    """
+    Suma {medicamento_id: (unidades, unidades_vencidas)} a los contadores de
+    stock con un único UPDATE.
+    """
+    deltas = {medicamento_id: delta for medicamento_id, delta in deltas.items() if any(delta)}
+    if not deltas:
+        return
+    campos = {}
+    for indice, campo in enumerate(('stock_actual', 'stock_vencido')):
+        valores = {medicamento_id: delta[indice] for medicamento_id, delta in deltas.items()}
+        if any(valores.values()):
+            campos[campo] = F(campo) + _por_medicamento(valores)
+    Medicamento.objects.filter(pk__in=deltas).update(**campos)
+    invalidar_alertas()
+
+
+def stock_segun_lotes(medicamento_ids):
+    """
+    Deriva {medicamento_id: (stock_actual, stock_vencido)} de los lotes con
+    una consulta agrupada. Los medicamentos sin lotes quedan en (0, 0).
+    """
+    totales = {medicamento_id: (0, 0) for medicamento_id in medicamento_ids}
+    for medicamento_id, total, vencido in (
+        LoteMedicamento.objects.filter(medicamento_id__in=medicamento_ids)
+        .values_list('medicamento_id')
+        .annotate(total=Sum('cantidad'), vencido=Sum('cantidad', filter=Q(vencido=True)))
+    ):
+        totales[medicamento_id] = (total or 0, vencido or 0)
+    return totales
+
+
+def recalcular_stock(medicamento_ids):
+    """
+    Reemplaza los contadores por los derivados de los lotes. Para cambios que
+    no pasan por un movimiento (edición o eliminación directa de un lote).
+    """
+    totales = stock_segun_lotes(medicamento_ids)
+    if totales:
+        Medicamento.objects.filter(pk__in=totales).update(
+            stock_actual=_por_medicamento({k: v[0] for k, v in totales.items()}),
+            stock_vencido=_por_medicamento({k: v[1] for k, v in totales.items()}),
+        )
+        invalidar_alertas()
+    return totales
+
+
+def registrar_vencimientos(hoy=None):
+    """
+    Marca como vencidos los lotes con fecha de vencimiento anterior a ``hoy``
+    y pasa sus unidades a stock_vencido. Solo revisa los lotes aún no
+    marcados, así que es incremental. Devuelve la cantidad de lotes marcados.
+    """
+    hoy = hoy or timezone.localdate()
+    with transaction.atomic():
+        # El bloqueo impide que un movimiento cambie la cantidad entre la lectura y la marca
+        lotes = list(
+            LoteMedicamento.objects.select_for_update()
+            .filter(vencido=False, fecha_vencimiento__lt=hoy)
+            .values_list('id', 'medicamento_id', 'cantidad')
+        )
+        if not lotes:
+            return 0
+        LoteMedicamento.objects.filter(pk__in=[lote_id for lote_id, _, _ in lotes]).update(vencido=True)
+        vencidas = defaultdict(int)
+        for _, medicamento_id, cantidad in lotes:
+            vencidas[medicamento_id] += cantidad
+        ajustar_stock({medicamento_id: (0, cantidad) for medicamento_id, cantidad in vencidas.items()})
+    return len(lotes)
+
+
+def conciliar_stock(tamano_bloque=500, corregir=True):
+    """
+    Vuelve a derivar los contadores de todos los medicamentos desde los lotes,
+    por bloques de ``tamano_bloque`` medicamentos (cada bloque en su propia
+    transacción) y devuelve las diferencias encontradas como
+    [{'medicamento_id', 'nombre', 'stock_actual', 'stock_vencido', 'esperado_actual',
+    'esperado_vencido'}]. Con ``corregir`` las diferencias se corrigen.
+
+    Las filas del bloque se bloquean antes de sumar los lotes: un movimiento
+    concurrente actualiza el lote antes que el medicamento, así que espera al
+    bloqueo y luego suma su F() sobre el valor corregido.
+    """
+    diferencias = []
+    ultimo_id = 0
+    while True:
+        with transaction.atomic():
+            bloque = list(
+                Medicamento.objects.select_for_update().filter(pk__gt=ultimo_id).order_by('pk')
+                .values_list('id', 'nombre', 'stock_actual', 'stock_vencido')[:tamano_bloque]
+            )
+            if not bloque:
+                break
+            ultimo_id = bloque[-1][0]
+            esperados = stock_segun_lotes([fila[0] for fila in bloque])
+            con_diferencia = []
+            for medicamento_id, nombre, actual, vencido in bloque:
+                esperado_actual, esperado_vencido = esperados[medicamento_id]
+                if (actual, vencido) != (esperado_actual, esperado_vencido):
+                    con_diferencia.append(medicamento_id)
+                    diferencias.append({
+                        'medicamento_id': medicamento_id,
+                        'nombre': nombre,
+                        'stock_actual': actual,
+                        'stock_vencido': vencido,
+                        'esperado_actual': esperado_actual,
+                        'esperado_vencido': esperado_vencido,
+                    })
+            if corregir and con_diferencia:
+                recalcular_stock(con_diferencia)
+    return diferencias
+
+
+def aplicar_movimiento(movimiento):
+    """
+    Aplica un movimiento ya guardado al stock de su lote y de su medicamento
+    con UPDATE atómicos. Una SALIDA sin stock suficiente en el lote lanza
+    StockInsuficiente.
+    """
+    if not movimiento.afecta_stock or movimiento.lote_id is None:
+        return
+    if movimiento.tipo == 'ENTRADA':
+        cantidad = movimiento.cantidad
+        LoteMedicamento.objects.filter(pk=movimiento.lote_id).update(
+            cantidad=F('cantidad') + cantidad
+        )
+    elif movimiento.tipo == 'SALIDA':
+        cantidad = -movimiento.cantidad
+        actualizados = LoteMedicamento.objects.filter(
+            pk=movimiento.lote_id, cantidad__gte=movimiento.cantidad
+        ).update(cantidad=F('cantidad') + cantidad)
+        if not actualizados:
+            disponible = LoteMedicamento.objects.filter(
+                pk=movimiento.lote_id
+            ).values_list('cantidad', flat=True).first() or 0
+            raise StockInsuficiente([{
+                'medicamento': movimiento.medicamento.nombre,
+                'medicamento_id': movimiento.medicamento_id,
+                'lote_id': movimiento.lote_id,
+                'solicitado': movimiento.cantidad,
+                'disponible': disponible,
+                'faltante': movimiento.cantidad - disponible,
+            }])
+    else:
+        # Los ajustes no modifican el lote
+        return
+    # Si el lote ya está marcado como vencido el movimiento también cambia stock_vencido
+    Medicamento.objects.filter(pk=movimiento.medicamento_id).update(
+        stock_actual=F('stock_actual') + cantidad,
+        stock_vencido=F('stock_vencido') + Case(
+            When(Exists(LoteMedicamento.objects.filter(pk=movimiento.lote_id, vencido=True)),
+                 then=Value(cantidad)),
+            default=Value(0),
+            output_field=IntegerField(),
+        ),
+    )
+    invalidar_alertas()
+
+
+def lotes_disponibles(medicamento_ids, bloquear=False, hoy=None):
+    """
+    Carga en una consulta los lotes vigentes con stock de los medicamentos
+    indicados, agrupados por medicamento y en orden FEFO. Con ``bloquear``
+    las filas quedan bloqueadas hasta el fin de la transacción.
+    """
+    hoy = hoy or timezone.localdate()
+    lotes = defaultdict(list)
+    consulta = LoteMedicamento.objects.filter(
+        medicamento_id__in=medicamento_ids,
+        cantidad__gt=0,
+        fecha_vencimiento__gte=hoy,
+    ).order_by('medicamento_id', 'fecha_vencimiento', 'id')
+    if bloquear:
+        consulta = consulta.select_for_update()
+    for lote in consulta:
+        lotes[lote.medicamento_id].append(lote)
+    return lotes
+
+
+def asignar_fefo(lineas, lotes):
+    """
+    Reparte cada (medicamento, cantidad) entre los lotes en orden de
+    vencimiento. Devuelve (asignaciones, faltantes) donde asignaciones es
+    [(indice_linea, medicamento, lote, cantidad), ...]. Las líneas del mismo
+    medicamento comparten el stock disponible.
+    """
+    disponible = {lote.id: lote.cantidad for grupo in lotes.values() for lote in grupo}
+    asignaciones = []
+    faltantes = []
+    for indice, (medicamento, cantidad) in enumerate(lineas):
+        candidatos = lotes.get(medicamento.id, [])
+        total = sum(disponible[lote.id] for lote in candidatos)
+        if total < cantidad:
+            faltantes.append({
+                'linea': indice,
+                'medicamento': medicamento.nombre,
+                'medicamento_id': medicamento.id,
+                'solicitado': cantidad,
+                'disponible': total,
+                'faltante': cantidad - total,
+            })
+            continue
+        pendiente = cantidad
+        for lote in candidatos:
+            if pendiente == 0:
+                break
+            tomado = min(disponible[lote.id], pendiente)
+            if tomado:
+                disponible[lote.id] -= tomado
+                pendiente -= tomado
+                asignaciones.append((indice, medicamento, lote, tomado))
+    return asignaciones, faltantes
+
+
+def descontar_lotes(descuentos):
+    """
+    Descuenta {lote_id: cantidad} de varios lotes con un único UPDATE.
+    """
+    if not descuentos:
+        return
+    LoteMedicamento.objects.filter(pk__in=descuentos).update(
+        cantidad=F('cantidad') - Case(
+            *[When(pk=lote_id, then=Value(cantidad)) for lote_id, cantidad in descuentos.items()],
+            output_field=IntegerField(),
+        )
+    )
+
+
+@transaction.atomic(savepoint=False)
+def registrar_salidas(lineas, usuario, motivo):
+    """
+    Registra la salida de stock de varias líneas de una vez.
+
+    ``lineas`` es una lista de (medicamento, cantidad). Cada línea se cubre
+    con uno o más lotes en orden FEFO (se ignoran los lotes vencidos) y genera
+    un movimiento por lote usado. Si alguna línea no tiene stock suficiente no
+    se registra nada y se lanza StockInsuficiente con el detalle por línea.
+    """
+    lotes = lotes_disponibles({medicamento.id for medicamento, _ in lineas}, bloquear=True)
+    asignaciones, faltantes = asignar_fefo(lineas, lotes)
+    if faltantes:
+        raise StockInsuficiente(faltantes)
+
+    ahora = timezone.now()
+    descuentos = defaultdict(int)
+    movimientos = []
+    for _, medicamento, lote, cantidad in asignaciones:
+        descuentos[lote.id] += cantidad
+        movimientos.append(MovimientoInventario(
+            medicamento=medicamento,
+            lote=lote,
+            tipo='SALIDA',
+            cantidad=cantidad,
+            fecha=ahora,
+            usuario=usuario,
+            motivo=motivo,
+            afecta_stock=True,
+        ))
+
+    MovimientoInventario.objects.bulk_create(movimientos)
+    descontar_lotes(descuentos)
+    # Los lotes FEFO son vigentes: solo cambia stock_actual
+    salidas = defaultdict(int)
+    for _, medicamento, _, cantidad in asignaciones:
+        salidas[medicamento.id] -= cantidad
+    ajustar_stock({medicamento_id: (cantidad, 0) for medicamento_id, cantidad in salidas.items()})
+    return movimientos
+
+
+def lotes_ya_registrados(lineas):
+    """
+    Devuelve [{'linea', 'medicamento', 'medicamento_id', 'numero_lote'}] de
+    las líneas de recepción cuyo lote ya existe, con una sola consulta.
+    """
+    existentes = set(
+        LoteMedicamento.objects.filter(
+            medicamento_id__in={linea['medicamento'].id for linea in lineas},
+            numero_lote__in={linea['numero_lote'] for linea in lineas},
+        ).values_list('medicamento_id', 'numero_lote')
+    )
+    return [
+        {
+            'linea': indice,
+            'medicamento': linea['medicamento'].nombre,
+            'medicamento_id': linea['medicamento'].id,
+            'numero_lote': linea['numero_lote'],
+        }
+        for indice, linea in enumerate(lineas)
+        if (linea['medicamento'].id, linea['numero_lote']) in existentes
+    ]
+
+
+@transaction.atomic(savepoint=False)
+def registrar_recepcion(lineas, proveedor, usuario, motivo, documento_referencia=None, fecha_ingreso=None):
+    """
+    Registra una entrega de proveedor de una vez.
+
+    ``lineas`` es una lista de dicts ya validados con medicamento,
+    numero_lote, fecha_vencimiento, cantidad y precio_compra. Cada línea crea
+    un lote nuevo y su movimiento de ENTRADA. Los lotes se insertan ya con su
+    cantidad y los movimientos con bulk_create (sin señales), así que el stock
+    de cada lote se escribe una sola vez y los contadores de cada medicamento
+    se actualizan en un único UPDATE. Devuelve la lista de lotes creados.
+
+    Si una recepción concurrente registró el mismo lote después de validar
+    las líneas, lanza LoteDuplicado con las líneas afectadas.
+    """
+    ahora = timezone.now()
+    fecha_ingreso = fecha_ingreso or timezone.localdate()
+    try:
+        # Savepoint: tras el error la transacción debe seguir usable para buscar los duplicados
+        with transaction.atomic():
+            lotes = LoteMedicamento.objects.bulk_create([
+                LoteMedicamento(
+                    medicamento=linea['medicamento'],
+                    numero_lote=linea['numero_lote'],
+                    fecha_vencimiento=linea['fecha_vencimiento'],
+                    cantidad=linea['cantidad'],
+                    fecha_ingreso=fecha_ingreso,
+                    proveedor=proveedor,
+                    precio_compra=linea['precio_compra'],
+                )
+                for linea in lineas
+            ])
+    except IntegrityError:
+        duplicados = lotes_ya_registrados(lineas)
+        if not duplicados:
+            raise
+        raise LoteDuplicado(duplicados)
+    MovimientoInventario.objects.bulk_create([
+        MovimientoInventario(
+            medicamento=lote.medicamento,
+            lote=lote,
+            tipo='ENTRADA',
+            cantidad=lote.cantidad,
+            fecha=ahora,
+            usuario=usuario,
+            documento_referencia=documento_referencia,
+            motivo=motivo,
+            afecta_stock=True,
+        )
+        for lote in lotes
+    ])
+
+    entradas = defaultdict(int)
+    for lote in lotes:
+        entradas[lote.medicamento_id] += lote.cantidad
+    ajustar_stock({medicamento_id: (cantidad, 0) for medicamento_id, cantidad in entradas.items()})
+    return lotes
@@ -1,40 +1,40 @@
-from django.db.models.signals import post_save, pre_save, post_delete
+# inventario/signals.py
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
-from django.db.models import Sum  # Importación clave que faltaba
-from .models import MovimientoInventario, LoteMedicamento, Medicamento
+from django.utils import timezone
+from .alertas import invalidar_alertas
+from .models import Medicamento, MovimientoInventario, LoteMedicamento
+from .services import ajustar_stock, aplicar_movimiento, recalcular_stock
 
 @receiver(post_save, sender=MovimientoInventario)
 def actualizar_stock_medicamento(sender, instance, created, **kwargs):
     """
-    Actualiza el stock del lote cuando se registra un movimiento
+    Aplica el movimiento al stock del lote y del medicamento (UPDATE con F(), sin guardar el lote)
     """
-    if instance.afecta_stock:
-        lote = instance.lote
-        if lote:
-            if instance.tipo == 'ENTRADA':
-                lote.cantidad += instance.cantidad
-            elif instance.tipo == 'SALIDA':
-                if lote.cantidad >= instance.cantidad:  # Validación para evitar stock negativo
-                    lote.cantidad -= instance.cantidad
-                else:
-                    # Aquí podrías manejar la excepción o ajustar la cantidad
-                    pass
-            elif instance.tipo == 'AJUSTE':
-                # El ajuste se aplica directamente
-                pass
-            lote.save()
+    if created:
+        aplicar_movimiento(instance)
 
 @receiver(post_save, sender=LoteMedicamento)
-def actualizar_stock_medicamento_desde_lote(sender, instance, **kwargs):
+def actualizar_stock_medicamento_desde_lote(sender, instance, created, **kwargs):
     """
-    Actualiza el stock total del medicamento basado en sus lotes
+    Un lote nuevo suma su cantidad al medicamento; si se editó directamente,
+    los contadores se vuelven a derivar de los lotes
     """
-    medicamento = instance.medicamento
-    stock_total = LoteMedicamento.objects.filter(
-        medicamento=medicamento
-    ).aggregate(total=Sum('cantidad'))['total'] or 0
-    
-    # Actualiza el campo stock_actual si existe en tu modelo Medicamento
-    if hasattr(medicamento, 'stock_actual'):
-        medicamento.stock_actual = stock_total
-        medicamento.save()
\ No newline at end of file
+    vencido = instance.fecha_vencimiento < timezone.localdate()
+    if vencido != instance.vencido:
+        LoteMedicamento.objects.filter(pk=instance.pk).update(vencido=vencido)
+        instance.vencido = vencido
+    if created:
+        ajustar_stock({instance.medicamento_id: (instance.cantidad, instance.cantidad if vencido else 0)})
+    else:
+        recalcular_stock([instance.medicamento_id])
+
+@receiver(post_delete, sender=LoteMedicamento)
+def actualizar_stock_medicamento_sin_lote(sender, instance, **kwargs):
+    recalcular_stock([instance.medicamento_id])
+
+@receiver(post_save, sender=Medicamento)
+@receiver(post_delete, sender=Medicamento)
+def invalidar_alertas_por_medicamento(sender, instance, **kwargs):
+    # El stock mínimo y si el medicamento está activo también deciden las alertas
+    invalidar_alertas()
@@ -1,3 +1,318 @@
-from django.test import TestCase
+import datetime
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from authentication.models import Rol
+from .alertas import subir_version_alertas
+from .cierres import registrar_cierre, stock_al
+from .kardex import decodificar_cursor, kardex
+from .models import LoteMedicamento, Medicamento, MovimientoInventario, Proveedor
+from .services import (StockInsuficiente, conciliar_stock, registrar_recepcion, registrar_salidas,
+                       registrar_vencimientos)
+
+
+class InventarioTestCase(APITestCase):
+    def setUp(self):
+        rol = Rol.objects.get_or_create(nombre=Rol.VETERINARIO)[0]
+        self.usuario = get_user_model().objects.create_user('vet', 'vet@tailpet.cl', 'clave', rol=rol)
+        self.proveedor = Proveedor.objects.create(
+            nombre='Droguería', telefono='123', email='ventas@drogueria.cl', tipo='MEDICAMENTOS'
+        )
+        self.hoy = timezone.localdate()
+
+    def crear_medicamento(self, nombre='Amoxicilina', stock_minimo=5):
+        return Medicamento.objects.create(
+            nombre=nombre, tipo='ORAL', presentacion='Tabletas', proveedor=self.proveedor,
+            precio_compra=Decimal('1.00'), precio_venta=Decimal('2.00'), stock_minimo=stock_minimo
+        )
+
+    def crear_lote(self, medicamento, numero_lote, cantidad=0, dias_para_vencer=365):
+        return LoteMedicamento.objects.create(
+            medicamento=medicamento, numero_lote=numero_lote, cantidad=cantidad,
+            fecha_vencimiento=self.hoy + datetime.timedelta(days=dias_para_vencer),
+            fecha_ingreso=self.hoy, proveedor=self.proveedor, precio_compra=Decimal('1.00')
+        )
+
+    def mover(self, lote, tipo, cantidad, fecha):
+        return MovimientoInventario.objects.create(
+            medicamento=lote.medicamento, lote=lote, tipo=tipo, cantidad=cantidad,
+            fecha=fecha, usuario=self.usuario, motivo='Prueba'
+        )
+
+
+class KardexTests(InventarioTestCase):
+    def setUp(self):
+        super().setUp()
+        self.medicamento = self.crear_medicamento()
+        self.lote = self.crear_lote(self.medicamento, 'L1')
+        self.inicio = timezone.now() - datetime.timedelta(days=30)
+        LoteMedicamento.objects.filter(pk=self.lote.pk).update(created_at=self.inicio - datetime.timedelta(days=1))
+        # Diez entradas de 3 unidades, una por día
+        for dia in range(10):
+            self.mover(self.lote, 'ENTRADA', 3, self.inicio + datetime.timedelta(days=dia))
+
+    def test_saldo_por_paginas(self):
+        filas, saldo_inicial, cursor = kardex(self.medicamento.id, limite=4)
+        saldos = [fila['saldo'] for fila in filas]
+        while cursor:
+            filas, _, cursor = kardex(self.medicamento.id, cursor=decodificar_cursor(cursor), limite=4)
+            saldos += [fila['saldo'] for fila in filas]
+
+        self.assertEqual(saldo_inicial, 0)
+        self.assertEqual(saldos, list(range(3, 31, 3)))
+
+    def test_saldo_inicial_parte_del_cierre(self):
+        registrar_cierre(self.inicio + datetime.timedelta(days=5, hours=1))
+        desde = self.inicio + datetime.timedelta(days=7, hours=1)
+
+        # Cierre + dos días de movimientos, sin sumar los anteriores al cierre
+        with self.assertNumQueries(4):
+            filas, saldo_inicial, _ = kardex(self.medicamento.id, desde=desde)
+
+        self.assertEqual(saldo_inicial, 24)
+        self.assertEqual([fila['saldo'] for fila in filas], [27, 30])
+
+    def test_saldo_correcto_tras_archivar_movimientos(self):
+        registrar_cierre(self.inicio + datetime.timedelta(days=5, hours=1))
+        # Lo que hace `particiones archivar` con los movimientos antiguos
+        MovimientoInventario.objects.filter(fecha__lt=self.inicio + datetime.timedelta(days=3, hours=1)).delete()
+
+        filas, saldo_inicial, _ = kardex(lote_id=self.lote.id)
+
+        self.assertEqual(saldo_inicial, 12)
+        self.assertEqual(filas[-1]['saldo'], 30)
+
+
+class StockAlTests(InventarioTestCase):
+    def setUp(self):
+        super().setUp()
+        self.medicamento = self.crear_medicamento()
+        self.inicio = timezone.now() - datetime.timedelta(days=30)
+        self.l1 = self.crear_lote(self.medicamento, 'L1')
+        self.l2 = self.crear_lote(self.medicamento, 'L2')
+        LoteMedicamento.objects.filter(pk=self.l1.pk).update(created_at=self.dia(-1))
+        LoteMedicamento.objects.filter(pk=self.l2.pk).update(created_at=self.dia(8))
+        self.mover(self.l1, 'ENTRADA', 10, self.dia(0))
+        self.mover(self.l1, 'SALIDA', 3, self.dia(5))
+        self.mover(self.l2, 'ENTRADA', 6, self.dia(9))
+        self.mover(self.l1, 'ENTRADA', 4, self.dia(10))
+        registrar_cierre(self.dia(7))
+
+    def dia(self, numero):
+        return self.inicio + datetime.timedelta(days=numero)
+
+    def stock(self, fecha):
+        return {lote_id: cantidad for lote_id, (_, cantidad) in stock_al(fecha, self.medicamento.id).items()}
+
+    def test_antes_del_cierre_descuenta_desde_el_siguiente(self):
+        # Solo existía L1: cierre del día 7 menos la salida del día 5
+        self.assertEqual(self.stock(self.dia(3)), {self.l1.pk: 10})
+        self.assertEqual(self.stock(self.dia(6)), {self.l1.pk: 7})
+
+    def test_despues_del_cierre_suma_desde_el_anterior(self):
+        # Lotes, cierre anterior, sus filas y los movimientos desde él; L2 se creó después
+        # del cierre y parte de su cantidad actual (no hay cierre siguiente) menos sus movimientos
+        with self.assertNumQueries(6):
+            stock = self.stock(self.dia(9) + datetime.timedelta(hours=1))
+
+        self.assertEqual(stock, {self.l1.pk: 7, self.l2.pk: 6})
+        self.assertEqual(self.stock(self.dia(11)), {self.l1.pk: 11, self.l2.pk: 6})
+
+    def test_no_suma_movimientos_anteriores_al_cierre(self):
+        # Sin los movimientos previos al cierre el stock posterior no cambia
+        MovimientoInventario.objects.filter(fecha__lt=self.dia(7)).delete()
+
+        self.assertEqual(self.stock(self.dia(11)), {self.l1.pk: 11, self.l2.pk: 6})
+
+
+class AlertasInventarioTests(InventarioTestCase):
+    def test_invalida_una_sola_vez_por_transaccion(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            medicamento = self.crear_medicamento()
+            lote = self.crear_lote(medicamento, 'L1', cantidad=20)
+            for _ in range(3):
+                self.mover(lote, 'SALIDA', 1, timezone.now())
+
+        self.assertEqual(callbacks.count(subir_version_alertas), 1)
+
+
+class ContadoresStockTests(InventarioTestCase):
+    def setUp(self):
+        super().setUp()
+        self.medicamento = self.crear_medicamento()
+        self.lote = self.crear_lote(self.medicamento, 'L1', cantidad=10)
+        self.vencido = self.crear_lote(self.medicamento, 'V1', cantidad=5, dias_para_vencer=-1)
+
+    def contadores(self):
+        return Medicamento.objects.values_list('stock_actual', 'stock_vencido').get(pk=self.medicamento.pk)
+
+    def test_movimientos_mantienen_los_contadores(self):
+        self.assertEqual(self.contadores(), (15, 5))
+
+        # INSERT del movimiento + UPDATE del lote + UPDATE del medicamento
+        with self.assertNumQueries(3):
+            self.mover(self.lote, 'ENTRADA', 6, timezone.now())
+        self.mover(self.lote, 'SALIDA', 4, timezone.now())
+        self.mover(self.vencido, 'SALIDA', 2, timezone.now())
+        self.mover(self.lote, 'AJUSTE', 7, timezone.now())
+
+        self.assertEqual(self.contadores(), (15, 3))
+        self.assertEqual(conciliar_stock(), [])
+
+    def test_vencimiento_pasa_las_unidades_a_stock_vencido(self):
+        LoteMedicamento.objects.filter(pk=self.lote.pk).update(
+            fecha_vencimiento=self.hoy - datetime.timedelta(days=1)
+        )
+
+        self.assertEqual(registrar_vencimientos(), 1)
+        self.assertEqual(registrar_vencimientos(), 0)
+        self.assertEqual(self.contadores(), (15, 15))
+
+    def test_conciliar_corrige_la_deriva(self):
+        otro = self.crear_medicamento('Meloxicam')
+        self.crear_lote(otro, 'M1', cantidad=8)
+        Medicamento.objects.filter(pk=self.medicamento.pk).update(stock_actual=99, stock_vencido=0)
+
+        diferencias = conciliar_stock(tamano_bloque=1, corregir=False)
+        self.assertEqual(diferencias, [{
+            'medicamento_id': self.medicamento.pk, 'nombre': 'Amoxicilina', 'stock_actual': 99,
+            'stock_vencido': 0, 'esperado_actual': 15, 'esperado_vencido': 5,
+        }])
+        self.assertEqual(self.contadores(), (99, 0))
+
+        self.assertEqual(conciliar_stock(tamano_bloque=1), diferencias)
+        self.assertEqual(self.contadores(), (15, 5))
+        self.assertEqual(conciliar_stock(), [])
+
+
+class RegistrarSalidasTests(InventarioTestCase):
+    def setUp(self):
+        super().setUp()
+        self.medicamento = self.crear_medicamento()
+        self.vencido = self.crear_lote(self.medicamento, 'VENCIDO', cantidad=50, dias_para_vencer=-1)
+        self.tardio = self.crear_lote(self.medicamento, 'TARDIO', cantidad=10, dias_para_vencer=200)
+        self.pronto = self.crear_lote(self.medicamento, 'PRONTO', cantidad=4, dias_para_vencer=20)
+        self.medio = self.crear_lote(self.medicamento, 'MEDIO', cantidad=3, dias_para_vencer=90)
+        self.otro = self.crear_medicamento('Meloxicam')
+        self.lote_otro = self.crear_lote(self.otro, 'M1', cantidad=5)
+
+    def test_reparte_en_orden_de_vencimiento_sin_usar_lotes_vencidos(self):
+        # Una consulta de lotes con bloqueo, un INSERT, un UPDATE de lotes y uno de contadores
+        with self.assertNumQueries(4):
+            movimientos = registrar_salidas(
+                [(self.medicamento, 6), (self.otro, 2), (self.medicamento, 3)], self.usuario, 'Receta'
+            )
+
+        self.assertEqual(
+            [(m.lote.numero_lote, m.cantidad) for m in movimientos],
+            [('PRONTO', 4), ('MEDIO', 2), ('M1', 2), ('MEDIO', 1), ('TARDIO', 2)]
+        )
+        cantidades = dict(LoteMedicamento.objects.values_list('numero_lote', 'cantidad'))
+        self.assertEqual(cantidades, {'VENCIDO': 50, 'TARDIO': 8, 'PRONTO': 0, 'MEDIO': 0, 'M1': 3})
+
+    def test_informa_faltantes_por_linea_sin_registrar_nada(self):
+        # registrar_salidas no abre un savepoint: la transacción la pone quien la llama
+        with self.assertRaises(StockInsuficiente) as contexto, transaction.atomic():
+            registrar_salidas([(self.otro, 1), (self.medicamento, 20)], self.usuario, 'Receta')
+
+        # Las unidades del lote vencido no cuentan como disponibles
+        self.assertEqual(contexto.exception.faltantes, [{
+            'linea': 1, 'medicamento': 'Amoxicilina', 'medicamento_id': self.medicamento.id,
+            'solicitado': 20, 'disponible': 17, 'faltante': 3,
+        }])
+        self.assertFalse(MovimientoInventario.objects.filter(tipo='SALIDA').exists())
+        self.assertEqual(LoteMedicamento.objects.get(pk=self.lote_otro.pk).cantidad, 5)
+
+
+class RecepcionTests(InventarioTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.usuario)
+        self.medicamentos = [self.crear_medicamento(nombre) for nombre in ('Amoxicilina', 'Meloxicam', 'Tramadol')]
+        self.vencimiento = (self.hoy + datetime.timedelta(days=365)).isoformat()
+
+    def linea(self, medicamento, numero_lote, cantidad=5):
+        return {
+            'medicamento': medicamento.id, 'numero_lote': numero_lote, 'fecha_vencimiento': self.vencimiento,
+            'cantidad': cantidad, 'precio_compra': '1.50',
+        }
+
+    def recibir(self, lineas):
+        return self.client.post(
+            '/api/inventario/recepciones/',
+            {'proveedor': self.proveedor.id, 'documento_referencia': 'F-100', 'lineas': lineas},
+            format='json'
+        )
+
+    def test_recepcion_en_bloque_con_consultas_acotadas(self):
+        lineas = [self.linea(self.medicamentos[i % 3], f'L{i}', cantidad=i + 1) for i in range(60)]
+
+        # Proveedor + medicamentos + lotes existentes, y dentro de la transacción el INSERT de
+        # lotes (en su savepoint), el de movimientos y un único UPDATE de los contadores
+        with self.assertNumQueries(10):
+            response = self.recibir(lineas)
+
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['unidades'], sum(range(1, 61)))
+        self.assertEqual(LoteMedicamento.objects.count(), 60)
+        self.assertEqual(MovimientoInventario.objects.filter(tipo='ENTRADA', documento_referencia='F-100').count(), 60)
+        self.assertEqual(
+            list(Medicamento.objects.order_by('nombre').values_list('stock_actual', flat=True)),
+            [sum(range(inicio + 1, 61, 3)) for inicio in range(3)]
+        )
+        self.assertEqual(conciliar_stock(corregir=False), [])
+
+    def test_lote_ya_registrado_se_rechaza_antes_de_escribir(self):
+        self.crear_lote(self.medicamentos[1], 'L1')
+
+        response = self.recibir([self.linea(self.medicamentos[0], 'L1'), self.linea(self.medicamentos[1], 'L1')])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(list(response.data['lineas']), [1])
+        self.assertEqual(LoteMedicamento.objects.count(), 1)
+
+    def test_lote_registrado_por_otra_recepcion_responde_409(self):
+        def en_carrera(*args, **kwargs):
+            # Otra recepción registra el lote después de la validación
+            self.crear_lote(self.medicamentos[1], 'L2')
+            return registrar_recepcion(*args, **kwargs)
+
+        with mock.patch('inventario.views.registrar_recepcion', side_effect=en_carrera):
+            response = self.recibir([self.linea(self.medicamentos[0], 'L1'), self.linea(self.medicamentos[1], 'L2')])
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['duplicados'], [{
+            'linea': 1, 'medicamento': 'Meloxicam', 'medicamento_id': self.medicamentos[1].id, 'numero_lote': 'L2',
+        }])
+        # Todo o nada: tampoco queda el lote de la primera línea ni el de la otra recepción
+        self.assertFalse(LoteMedicamento.objects.exists())
+        self.assertFalse(MovimientoInventario.objects.exists())
+
+    def test_registrar_entrada_distingue_datos_invalidos_de_conflicto(self):
+        medicamento = self.medicamentos[0]
+        url = f'/api/inventario/medicamentos/{medicamento.id}/registrar-entrada/'
+        datos = {
+            'cantidad': 5, 'numero_lote': 'E1', 'fecha_vencimiento': self.vencimiento,
+            'proveedor_id': self.proveedor.id, 'precio_compra': '1.50',
+        }
+
+        response = self.client.post(url, {**datos, 'fecha_vencimiento': 'mañana'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+        def en_carrera(*args, **kwargs):
+            self.crear_lote(medicamento, 'E1')
+            return registrar_recepcion(*args, **kwargs)
+
+        with mock.patch('inventario.views.registrar_recepcion', side_effect=en_carrera):
+            response = self.client.post(url, datos, format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['duplicados'][0]['numero_lote'], 'E1')
+
+        response = self.client.post(url, datos, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(Medicamento.objects.get(pk=medicamento.pk).stock_actual, 5)
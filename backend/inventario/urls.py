@@ -1,7 +1,8 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (ProveedorViewSet, DireccionProveedorViewSet, MedicamentoViewSet,
-                    LoteMedicamentoViewSet, MovimientoInventarioViewSet)
+                    LoteMedicamentoViewSet, MovimientoInventarioViewSet, AlertaInventarioViewSet,
+                    StockHistoricoViewSet, RecepcionViewSet)
 
 router = DefaultRouter()
 router.register(r'proveedores', ProveedorViewSet)
@@ -9,6 +10,9 @@ router.register(r'direcciones-proveedor', DireccionProveedorViewSet)
 router.register(r'medicamentos', MedicamentoViewSet)
 router.register(r'lotes', LoteMedicamentoViewSet)
 router.register(r'movimientos', MovimientoInventarioViewSet)
+router.register(r'alertas', AlertaInventarioViewSet, basename='alertas')
+router.register(r'stock-historico', StockHistoricoViewSet, basename='stock-historico')
+router.register(r'recepciones', RecepcionViewSet, basename='recepciones')
 
 urlpatterns = [
     path('', include(router.urls)),
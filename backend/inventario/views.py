@@ -1,14 +1,49 @@
+import datetime
 from rest_framework import viewsets, filters, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
-from django.db import transaction, models
+from rest_framework.utils.urls import replace_query_param
+from django.db import transaction
 from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from .models import Proveedor, DireccionProveedor, Medicamento, LoteMedicamento, MovimientoInventario
 from .serializers import (ProveedorSerializer, DireccionProveedorSerializer, 
                           MedicamentoSerializer, LoteMedicamentoSerializer, 
-                          MovimientoInventarioSerializer)
+                          MovimientoInventarioSerializer, RecepcionSerializer)
 from django_filters.rest_framework import DjangoFilterBackend
 from .filters import MedicamentoFilter, LoteMedicamentoFilter
+from .services import LoteDuplicado, StockInsuficiente, registrar_recepcion
+from .alertas import DIAS_POR_VENCER_DEFECTO, alertas_inventario
+from .cierres import inicio_del_dia, stock_historico
+from .kardex import decodificar_cursor, kardex
+
+def _respuesta_kardex(request, medicamento_id=None, lote_id=None):
+    """
+    Página del kardex con ?desde= (YYYY-MM-DD o fecha-hora ISO), ?cursor= y ?limite=
+    """
+    params = request.query_params
+    try:
+        limite = min(max(int(params.get('limite', 50)), 1), 500)
+        cursor = decodificar_cursor(params['cursor']) if params.get('cursor') else None
+        desde = None
+        if params.get('desde'):
+            dia = parse_date(params['desde'])
+            desde = inicio_del_dia(dia) if dia else parse_datetime(params['desde'])
+            if desde is None:
+                raise ValueError
+            if timezone.is_naive(desde):
+                desde = timezone.make_aware(desde)
+    except ValueError:
+        return Response({'error': 'Parámetros de kardex inválidos'}, status=status.HTTP_400_BAD_REQUEST)
+
+    movimientos, saldo_inicial, siguiente = kardex(medicamento_id, lote_id, desde, cursor, limite)
+    return Response({
+        'saldo_inicial': saldo_inicial,
+        'saldo_final': movimientos[-1]['saldo'] if movimientos else saldo_inicial,
+        'results': movimientos,
+        'next': replace_query_param(request.build_absolute_uri(), 'cursor', siguiente) if siguiente else None,
+    })
 
 class ProveedorViewSet(viewsets.ModelViewSet):
     queryset = Proveedor.objects.all()
@@ -27,7 +62,7 @@ class MedicamentoViewSet(viewsets.ModelViewSet):
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_class = MedicamentoFilter
     search_fields = ['nombre', 'descripcion']
-    ordering_fields = ['nombre', 'precio_venta', 'stock_minimo']
+    ordering_fields = ['nombre', 'precio_venta', 'stock_minimo', 'stock_actual']
     filterset_fields = ['tipo', 'proveedor', 'activo', 'requiere_receta']
 
     @action(detail=True, methods=['get'])
@@ -38,89 +73,87 @@ class MedicamentoViewSet(viewsets.ModelViewSet):
         medicamento = self.get_object()
         lotes = medicamento.lotes.filter(cantidad__gt=0).order_by('fecha_vencimiento')
         
-        total_stock = lotes.aggregate(total=models.Sum('cantidad'))['total'] or 0
-        
         data = {
             'medicamento': self.get_serializer(medicamento).data,
-            'stock_total': total_stock,
+            'stock_total': medicamento.stock_actual,
+            'stock_vencido': medicamento.stock_vencido,
+            'stock_disponible': medicamento.stock_disponible(),
             'lotes': LoteMedicamentoSerializer(lotes, many=True).data,
-            'alerta_stock': total_stock <= medicamento.stock_minimo
+            'alerta_stock': medicamento.stock_disponible() <= medicamento.stock_minimo
         }
         
         return Response(data)
     
+    @action(detail=True, methods=['get'])
+    def kardex(self, request, pk=None):
+        """
+        Movimientos del medicamento en orden cronológico con el saldo después de cada uno
+        """
+        return _respuesta_kardex(request, medicamento_id=self.get_object().id)
+
     @action(detail=True, methods=['post'], url_path='registrar-entrada', url_name='registrar-entrada')
     def registrar_entrada(self, request, pk=None):
         """
         Registra una entrada de inventario para este medicamento
         """
-        try:
-            medicamento = self.get_object()
-            data = request.data.copy()
-
-            # Validación básica de datos requeridos
-            required_fields = ['cantidad', 'numero_lote', 'fecha_vencimiento', 'proveedor_id', 'precio_compra']
-            if not all(field in data for field in required_fields):
-                return Response(
-                    {'error': f'Faltan campos requeridos: {", ".join(required_fields)}'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
-            # Validación de la cantidad
-            cantidad = int(data.get('cantidad', 0))
-            if cantidad <= 0:
-                return Response(
-                    {'error': 'La cantidad debe ser positiva y mayor a cero.'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+        medicamento = self.get_object()
+        data = request.data
 
-            with transaction.atomic():
-                # Crear nuevo lote
-                lote_data = {
-                    'medicamento': medicamento.id,
-                    'numero_lote': data['numero_lote'],
-                    'fecha_vencimiento': data['fecha_vencimiento'],
-                    'cantidad': 0,  # Se actualizará con el movimiento
-                    'fecha_ingreso': timezone.now().date(),
-                    'proveedor': data['proveedor_id'],
-                    'precio_compra': data['precio_compra']
-                }
-                
-                lote_serializer = LoteMedicamentoSerializer(data=lote_data)
-                lote_serializer.is_valid(raise_exception=True)
-                lote = lote_serializer.save()
-                
-                # Registrar movimiento
-                movimiento_data = {
-                    'medicamento': medicamento.id,
-                    'lote': lote.id,
-                    'tipo': 'ENTRADA',
-                    'cantidad': cantidad,
-                    'fecha': timezone.now(),
-                    'usuario': request.user.id,
-                    'motivo': data.get('motivo', 'Entrada de inventario'),
-                    'afecta_stock': True
-                }
-                
-                movimiento_serializer = MovimientoInventarioSerializer(data=movimiento_data)
-                movimiento_serializer.is_valid(raise_exception=True)
-                movimiento_serializer.save()
-                
-                # Actualizar cantidad en lote (podría hacerse con signal)
-                lote.cantidad += cantidad
-                lote.save()
-                
+        # Validación básica de datos requeridos
+        required_fields = ['cantidad', 'numero_lote', 'fecha_vencimiento', 'proveedor_id', 'precio_compra']
+        if not all(field in data for field in required_fields):
             return Response(
-                {'status': 'Entrada registrada correctamente', 'lote_id': lote.id},
-                status=status.HTTP_201_CREATED
+                {'error': f'Faltan campos requeridos: {", ".join(required_fields)}'},
+                status=status.HTTP_400_BAD_REQUEST
             )
-            
-        except Exception as e:
+
+        # Validación de la cantidad
+        try:
+            cantidad = int(data.get('cantidad', 0))
+        except (TypeError, ValueError):
+            cantidad = 0
+        if cantidad <= 0:
             return Response(
-                {'error': str(e)},
+                {'error': 'La cantidad debe ser positiva y mayor a cero.'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+        # Misma ruta que una recepción de una línea: el lote se crea con su
+        # cantidad y el stock se suma una sola vez
+        serializer = RecepcionSerializer(data={
+            'proveedor': data['proveedor_id'],
+            'motivo': data.get('motivo', 'Entrada de inventario'),
+            'lineas': [{
+                'medicamento': medicamento.id,
+                'numero_lote': data['numero_lote'],
+                'fecha_vencimiento': data['fecha_vencimiento'],
+                'cantidad': cantidad,
+                'precio_compra': data['precio_compra'],
+            }],
+        })
+        try:
+            serializer.is_valid(raise_exception=True)
+            with transaction.atomic():
+                lote, = registrar_recepcion(
+                    serializer.validated_data['lineas'],
+                    proveedor=serializer.validated_data['proveedor'],
+                    usuario=request.user,
+                    motivo=serializer.validated_data['motivo'],
+                )
+        except ValidationError as e:
+            return Response({'error': e.detail}, status=status.HTTP_400_BAD_REQUEST)
+        except LoteDuplicado as e:
+            # Otra recepción registró el lote entre la validación y la escritura
+            return Response(
+                {'error': str(e), 'duplicados': e.duplicados},
+                status=status.HTTP_409_CONFLICT
+            )
+
+        return Response(
+            {'status': 'Entrada registrada correctamente', 'lote_id': lote.id},
+            status=status.HTTP_201_CREATED
+        )
+
 class LoteMedicamentoViewSet(viewsets.ModelViewSet):
     queryset = LoteMedicamento.objects.all()
     serializer_class = LoteMedicamentoSerializer
@@ -129,7 +162,108 @@ class LoteMedicamentoViewSet(viewsets.ModelViewSet):
     filterset_fields = ['medicamento', 'proveedor']
     ordering_fields = ['fecha_vencimiento', 'cantidad']
 
+    @action(detail=True, methods=['get'])
+    def kardex(self, request, pk=None):
+        """
+        Movimientos del lote en orden cronológico con el saldo después de cada uno
+        """
+        return _respuesta_kardex(request, lote_id=self.get_object().id)
+
 class MovimientoInventarioViewSet(viewsets.ModelViewSet):
-    queryset = MovimientoInventario.objects.all()
+    queryset = MovimientoInventario.objects.select_related('medicamento', 'usuario').order_by('-fecha', 'id')
     serializer_class = MovimientoInventarioSerializer
     filterset_fields = ['medicamento', 'tipo', 'fecha', 'usuario']
+    
+    def create(self, request, *args, **kwargs):
+        # El movimiento se aplica al lote en la misma transacción (ver inventario.services)
+        try:
+            with transaction.atomic():
+                return super().create(request, *args, **kwargs)
+        except StockInsuficiente as e:
+            return Response(
+                {'error': str(e), 'faltantes': e.faltantes},
+                status=status.HTTP_409_CONFLICT
+            )
+
+
+class AlertaInventarioViewSet(viewsets.ViewSet):
+    """
+    Medicamentos con stock bajo, lotes que vencen en los próximos ?dias=
+    (30 por defecto) y lotes vencidos con unidades
+    """
+
+    def list(self, request):
+        try:
+            dias = int(request.query_params.get('dias', DIAS_POR_VENCER_DEFECTO))
+        except ValueError:
+            return Response({"error": "dias debe ser un número entero"}, status=status.HTTP_400_BAD_REQUEST)
+        if not 0 <= dias <= 366:
+            return Response({"error": "dias debe estar entre 0 y 366"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(alertas_inventario(dias))
+
+
+class StockHistoricoViewSet(viewsets.ViewSet):
+    """
+    Stock por medicamento en una fecha pasada, desde el cierre de stock más
+    cercano. ?fecha= es obligatorio: con solo el día se entrega el stock al
+    final de ese día. Filtros: ?medicamento= y ?por_lote=true para el detalle.
+    """
+
+    def list(self, request):
+        params = request.query_params
+        valor = params.get('fecha', '')
+        try:
+            # parse_datetime también acepta un día solo, así que el día se prueba primero
+            dia = parse_date(valor)
+            instante = inicio_del_dia(dia + datetime.timedelta(days=1)) if dia else parse_datetime(valor)
+            medicamento = int(params['medicamento']) if params.get('medicamento') else None
+        except ValueError:
+            instante = medicamento = None
+        if instante is None:
+            return Response(
+                {"error": "fecha debe ser YYYY-MM-DD o una fecha-hora ISO; medicamento, un número entero"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if timezone.is_naive(instante):
+            instante = timezone.make_aware(instante)
+        return Response({
+            'fecha': instante,
+            'medicamentos': stock_historico(
+                instante, medicamento, por_lote=params.get('por_lote') in ('1', 'true', 'True')
+            ),
+        })
+
+
+class RecepcionViewSet(viewsets.ViewSet):
+    """
+    Recepción de una entrega de proveedor: crea un lote y su movimiento de
+    entrada por línea, todo o nada
+    """
+    def create(self, request):
+        serializer = RecepcionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        datos = serializer.validated_data
+        try:
+            with transaction.atomic():
+                lotes = registrar_recepcion(
+                    datos['lineas'],
+                    proveedor=datos['proveedor'],
+                    usuario=request.user,
+                    motivo=datos['motivo'],
+                    documento_referencia=datos.get('documento_referencia') or None,
+                    fecha_ingreso=datos.get('fecha_ingreso'),
+                )
+        except LoteDuplicado as e:
+            # Otra recepción registró el lote entre la validación y la escritura
+            return Response(
+                {'error': str(e), 'duplicados': e.duplicados},
+                status=status.HTTP_409_CONFLICT
+            )
+        return Response({
+            'lotes': [
+                {'id': lote.id, 'medicamento': lote.medicamento_id, 'numero_lote': lote.numero_lote,
+                 'cantidad': lote.cantidad}
+                for lote in lotes
+            ],
+            'unidades': sum(lote.cantidad for lote in lotes),
+        }, status=status.HTTP_201_CREATED)
@@ -0,0 +1,36 @@
+# mascotas/cache.py
+"""
+Caché por mascota de la respuesta de MascotaViewSet.historial_completo.
+
+Las entradas se invalidan desde mascotas.signals cuando cambia cualquiera de
+los modelos que aportan datos a la respuesta (ver ese módulo). El caché debe
+ser compartido entre procesos (ver CACHES en settings): con uno local, el
+borrado solo alcanza al worker que hizo la escritura.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+TTL_HISTORIAL = getattr(settings, 'HISTORIAL_COMPLETO_CACHE_TTL', 60 * 60)
+
+
+def clave_historial(mascota_id):
+    return f'mascotas:historial_completo:{mascota_id}'
+
+
+def obtener_historial(mascota_id):
+    return cache.get(clave_historial(mascota_id))
+
+
+def guardar_historial(mascota_id, data):
+    cache.set(clave_historial(mascota_id), data, TTL_HISTORIAL)
+
+
+def invalidar_historial(*mascota_ids):
+    """
+    Borra las entradas de las mascotas indicadas. Se borra al confirmar la
+    transacción para que una lectura concurrente no vuelva a cachear datos viejos.
+    """
+    claves = [clave_historial(mascota_id) for mascota_id in set(mascota_ids) if mascota_id]
+    if claves:
+        transaction.on_commit(lambda: cache.delete_many(claves))
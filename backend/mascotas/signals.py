@@ -0,0 +1,66 @@
+# mascotas/signals.py
+from django.conf import settings
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from clientes.models import Cliente
+from historial_medico.models import (HistorialMedico, Consulta, Tratamiento,
+                                     Vacuna, MascotaVacuna)
+from inventario.models import Medicamento, LoteMedicamento
+from .models import Mascota, Especie, Raza, RegistroPeso
+from .cache import invalidar_historial
+
+# Modelos que pertenecen directamente a una mascota
+@receiver([post_save, post_delete], sender=Mascota)
+def invalidar_por_mascota(sender, instance, **kwargs):
+    invalidar_historial(instance.id)
+
+@receiver([post_save, post_delete], sender=RegistroPeso)
+@receiver([post_save, post_delete], sender=MascotaVacuna)
+@receiver([post_save, post_delete], sender=HistorialMedico)
+def invalidar_por_registro_de_mascota(sender, instance, **kwargs):
+    invalidar_historial(instance.mascota_id)
+
+@receiver([post_save, post_delete], sender=Consulta)
+@receiver([post_save, post_delete], sender=Tratamiento)
+def invalidar_por_registro_de_historial(sender, instance, **kwargs):
+    invalidar_historial(*HistorialMedico.objects.filter(
+        pk=instance.historial_id
+    ).values_list('mascota_id', flat=True))
+
+# Catálogos cuyos nombres aparecen en la respuesta: solo se invalidan las mascotas afectadas
+@receiver(post_save, sender=Cliente)
+def invalidar_por_cliente(sender, instance, **kwargs):
+    invalidar_historial(*instance.mascotas.values_list('id', flat=True))
+
+@receiver(post_save, sender=Especie)
+@receiver(post_save, sender=Raza)
+def invalidar_por_especie_o_raza(sender, instance, **kwargs):
+    invalidar_historial(*instance.mascotas.values_list('id', flat=True))
+
+@receiver(post_save, sender=Vacuna)
+def invalidar_por_vacuna(sender, instance, **kwargs):
+    invalidar_historial(*instance.aplicaciones.values_list('mascota_id', flat=True).distinct())
+
+@receiver(post_save, sender=LoteMedicamento)
+def invalidar_por_lote(sender, instance, **kwargs):
+    invalidar_historial(*instance.vacunaciones.values_list('mascota_id', flat=True).distinct())
+
+@receiver(post_save, sender=Medicamento)
+def invalidar_por_medicamento(sender, instance, **kwargs):
+    invalidar_historial(*MascotaVacuna.objects.filter(
+        lote__medicamento=instance
+    ).values_list('mascota_id', flat=True).distinct())
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def invalidar_por_veterinario(sender, instance, created=False, update_fields=None, **kwargs):
+    """
+    Solo importa el nombre; se ignoran, p. ej., las actualizaciones de last_login.
+    """
+    if created:
+        return
+    if update_fields is not None and not {'first_name', 'last_name'} & set(update_fields):
+        return
+    invalidar_historial(
+        *Consulta.objects.filter(veterinario=instance).values_list('historial__mascota_id', flat=True).distinct(),
+        *instance.vacunaciones_realizadas.values_list('mascota_id', flat=True).distinct()
+    )
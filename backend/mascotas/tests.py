@@ -1,3 +1,186 @@
-from django.test import TestCase
+import datetime
+import math
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from authentication.models import Rol
+from clientes.models import Cliente
+from historial_medico.models import (Consulta, Documento, HistorialMedico, MascotaVacuna, Receta, TipoConsulta,
+                                     TipoDocumento, Tratamiento, Vacuna)
+from inventario.models import LoteMedicamento, Medicamento, Proveedor
+from .models import Especie, Raza, Mascota, RegistroPeso
+from .vitales import lttb
+
+
+class MascotaTestCase(APITestCase):
+    def setUp(self):
+        rol = Rol.objects.get_or_create(nombre=Rol.VETERINARIO)[0]
+        self.veterinario = get_user_model().objects.create_user(
+            'vet', 'vet@tailpet.cl', 'clave', rol=rol, first_name='Ana', last_name='Soto'
+        )
+        self.client.force_authenticate(self.veterinario)
+        cliente = Cliente.objects.create(
+            nombre='Juan', apellido='Pérez', rut='12.345.678-9', telefono='123', email='juan@tailpet.cl'
+        )
+        self.especie = Especie.objects.create(nombre='Perro')
+        raza = Raza.objects.create(nombre='Mestizo', especie=self.especie)
+        self.mascota = Mascota.objects.create(
+            cliente=cliente, nombre='Toby', especie=self.especie, raza=raza,
+            fecha_nacimiento=datetime.date(2020, 1, 1), sexo='M'
+        )
+        self.historial = HistorialMedico.objects.create(mascota=self.mascota, veterinario=self.veterinario)
+        self.tipo_consulta = TipoConsulta.objects.create(nombre='Control', duracion_estimada=30)
+        self.hoy = timezone.localdate()
+
+    def dia(self, dias_atras):
+        return self.hoy - datetime.timedelta(days=dias_atras)
+
+    def consulta(self, dias_atras, **campos):
+        return Consulta.objects.create(
+            historial=self.historial, veterinario=self.veterinario, tipo_consulta=self.tipo_consulta,
+            fecha=self.dia(dias_atras), motivo_consulta='Control', diagnostico='Sano', **campos
+        )
+
+
+class TimelineTests(MascotaTestCase):
+    def setUp(self):
+        super().setUp()
+        proveedor = Proveedor.objects.create(
+            nombre='Droguería', telefono='123', email='ventas@drogueria.cl', tipo='MEDICAMENTOS'
+        )
+        medicamento = Medicamento.objects.create(
+            nombre='Antirrábica', tipo='INYECTABLE', presentacion='Vial', proveedor=proveedor,
+            precio_compra=Decimal('1.00'), precio_venta=Decimal('2.00'), stock_minimo=1
+        )
+        lote = LoteMedicamento.objects.create(
+            medicamento=medicamento, numero_lote='V1', cantidad=10, proveedor=proveedor,
+            fecha_vencimiento=self.hoy + datetime.timedelta(days=365), fecha_ingreso=self.hoy,
+            precio_compra=Decimal('1.00')
+        )
+        vacuna = Vacuna.objects.create(
+            nombre='Antirrábica', tipo='OBLIGATORIA', intervalo_revacunacion=365, especie=self.especie
+        )
+
+        # Varios tipos el mismo día, y más de un evento del mismo tipo por día
+        for dias_atras in (1, 3, 3, 8):
+            self.consulta(dias_atras)
+        for dias_atras in (3, 5):
+            RegistroPeso.objects.create(
+                mascota=self.mascota, peso=Decimal('12.50'), fecha_registro=self.dia(dias_atras)
+            )
+        Tratamiento.objects.create(
+            historial=self.historial, descripcion='Antibiótico', duracion='7 días',
+            inicio_tratamiento=self.dia(3), instrucciones='Cada 12 horas'
+        )
+        for dias_atras in (1, 8):
+            Receta.objects.create(
+                mascota=self.mascota, veterinario=self.veterinario, fecha_emision=self.dia(dias_atras),
+                fecha_vencimiento=self.dia(dias_atras) + datetime.timedelta(days=30)
+            )
+        MascotaVacuna.objects.create(
+            mascota=self.mascota, vacuna=vacuna, fecha_aplicacion=self.dia(5),
+            veterinario=self.veterinario, lote=lote
+        )
+        # Sin señales: el archivo no hace falta para la línea de tiempo
+        tipo_documento = TipoDocumento.objects.create(nombre='Examen')
+        documentos = Documento.objects.bulk_create([
+            Documento(mascota=self.mascota, tipo_documento=tipo_documento, nombre_archivo=nombre,
+                      url_archivo=f'documentos/{nombre}')
+            for nombre in ('hemograma.pdf', 'radiografia.pdf')
+        ])
+        for documento, dias_atras in zip(documentos, (3, 0)):
+            Documento.objects.filter(pk=documento.pk).update(
+                fecha_subida=timezone.now() - datetime.timedelta(days=dias_atras)
+            )
+        self.url = f'/api/mascotas/mascotas/{self.mascota.id}/timeline/'
+
+    def test_paginas_recorren_todas_las_fuentes_en_orden(self):
+        completa = self.client.get(self.url, {'limite': 100}).data
+        self.assertIsNone(completa['next'])
+        eventos = completa['results']
+        self.assertEqual(len(eventos), 12)
+        self.assertEqual(
+            {evento['tipo'] for evento in eventos},
+            {'consulta', 'documento', 'peso', 'receta', 'tratamiento', 'vacunacion'}
+        )
+        claves = [(-datetime.date.fromisoformat(e['fecha']).toordinal(), e['tipo'], -e['id']) for e in eventos]
+        self.assertEqual(claves, sorted(claves))
+
+        paginas = []
+        url, parametros = self.url, {'limite': 3}
+        while url:
+            # get_object + una consulta por fuente, sin importar la profundidad
+            with self.assertNumQueries(7):
+                response = self.client.get(url, parametros)
+            self.assertEqual(response.status_code, 200, response.data)
+            paginas.append(response.data['results'])
+            url, parametros = response.data['next'], None
+
+        self.assertEqual([len(pagina) for pagina in paginas], [3, 3, 3, 3])
+        self.assertEqual([evento for pagina in paginas for evento in pagina], eventos)
+
+    def test_cursor_invalido(self):
+        response = self.client.get(self.url, {'cursor': 'no-es-un-cursor'})
+
+        self.assertEqual(response.status_code, 400)
+
+
+class VitalesTests(MascotaTestCase):
+    def setUp(self):
+        super().setUp()
+        # Un peso diario durante 120 días con un pico aislado a mitad de la serie
+        self.pesos = RegistroPeso.objects.bulk_create([
+            RegistroPeso(
+                mascota=self.mascota, fecha_registro=self.dia(dias_atras),
+                peso=Decimal('30.00') if dias_atras == 60 else Decimal('12.00') + Decimal(dias_atras % 7) / 10
+            )
+            for dias_atras in range(120, 0, -1)
+        ])
+        self.url = f'/api/mascotas/mascotas/{self.mascota.id}/vitales/'
+
+    def test_lttb_respeta_puntos_y_conserva_los_extremos(self):
+        for puntos in (2, 3, 10, 50):
+            with self.subTest(puntos=puntos):
+                # get_object + una consulta por tabla de mediciones
+                with self.assertNumQueries(4):
+                    response = self.client.get(self.url, {'puntos': puntos})
+                self.assertEqual(response.status_code, 200, response.data)
+                serie = response.data['peso']
+                self.assertEqual(serie['total'], 120)
+                self.assertEqual(len(serie['puntos']), puntos)
+                self.assertEqual(serie['puntos'][0]['fecha'], self.dia(120).isoformat())
+                self.assertEqual(serie['puntos'][-1]['fecha'], self.dia(1).isoformat())
+                fechas = [punto['fecha'] for punto in serie['puntos']]
+                self.assertEqual(fechas, sorted(set(fechas)))
+                if puntos > 2:
+                    self.assertIn(30.0, [punto['valor'] for punto in serie['puntos']])
+
+    def test_serie_corta_se_devuelve_completa(self):
+        self.consulta(10, peso=Decimal('12.40'), temperatura=Decimal('38.5'))
+
+        data = self.client.get(self.url, {'puntos': 500}).data
+
+        self.assertEqual(len(data['peso']['puntos']), data['peso']['total'])
+        self.assertEqual(data['temperatura']['puntos'], [
+            {'fecha': self.dia(10).isoformat(), 'valor': 38.5, 'fuente': 'consulta', 'id': mock.ANY}
+        ])
+
+    def test_puntos_fuera_de_rango_se_acotan(self):
+        data = self.client.get(self.url, {'puntos': 1}).data
+        self.assertEqual((data['puntos'], len(data['peso']['puntos'])), (2, 2))
+
+        self.assertEqual(self.client.get(self.url, {'puntos': 'muchos'}).status_code, 400)
+
+    def test_implementaciones_numpy_y_python_coinciden(self):
+        # Sin valores repetidos: con áreas empatadas el redondeo puede elegir distinto
+        xs = [i + (i % 3) / 4 for i in range(500)]
+        ys = [math.sin(i / 9) * 5 + i / 50 for i in range(500)]
+        for puntos in (3, 10, 37, 200):
+            with self.subTest(puntos=puntos):
+                vectorizado = lttb(xs, ys, puntos)
+                with mock.patch('mascotas.vitales.np', None):
+                    self.assertEqual(lttb(xs, ys, puntos), vectorizado)
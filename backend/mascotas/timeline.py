@@ -0,0 +1,151 @@
+# mascotas/timeline.py
+"""
+Línea de tiempo de una mascota: consultas, tratamientos, vacunaciones, recetas,
+documentos y registros de peso en un único flujo del más reciente al más antiguo.
+
+Cada fuente se lee ya ordenada por (día desc, id desc) y limitada al tamaño
+de página, y las fuentes se combinan con heapq.merge. El orden global es
+(día desc, tipo, id desc), y el cursor guarda la clave del último evento
+entregado, así que cada página cuesta como máximo una consulta por fuente sin
+importar el largo del historial.
+"""
+import base64
+import heapq
+import json
+from dataclasses import dataclass
+from datetime import date
+
+from django.db.models import F, Q
+from django.db.models.functions import TruncDate
+
+from historial_medico.models import Consulta, Tratamiento, MascotaVacuna, Receta, Documento
+from historial_medico.serializers import url_descarga_documento
+from .models import RegistroPeso
+
+
+@dataclass(frozen=True)
+class Fuente:
+    tipo: str
+    modelo: type
+    campo_fecha: str
+    filtro_mascota: str
+    campos: tuple
+    fecha_hora: bool = False
+
+    def queryset(self, mascota_id):
+        dia = TruncDate(self.campo_fecha) if self.fecha_hora else F(self.campo_fecha)
+        return self.modelo.objects.filter(
+            **{self.filtro_mascota: mascota_id}
+        ).annotate(dia=dia).order_by('-dia', '-id')
+
+    def despues_de(self, cursor):
+        """
+        Condición para las filas de esta fuente que van después del cursor en el orden global.
+        """
+        dia, tipo, ultimo_id = cursor
+        if self.tipo > tipo:
+            return Q(dia__lte=dia)
+        if self.tipo == tipo:
+            return Q(dia__lt=dia) | Q(dia=dia, id__lt=ultimo_id)
+        return Q(dia__lt=dia)
+
+
+def _nombre(nombre, apellido):
+    return f"{nombre or ''} {apellido or ''}".strip()
+
+
+FUENTES = [
+    Fuente('consulta', Consulta, 'fecha', 'historial__mascota_id',
+           ('id', 'motivo_consulta', 'diagnostico', 'veterinario__first_name', 'veterinario__last_name')),
+    Fuente('documento', Documento, 'fecha_subida', 'mascota_id',
+           ('id', 'nombre_archivo', 'notas', 'tipo_documento__nombre'), fecha_hora=True),
+    Fuente('peso', RegistroPeso, 'fecha_registro', 'mascota_id',
+           ('id', 'peso', 'notas')),
+    Fuente('receta', Receta, 'fecha_emision', 'mascota_id',
+           ('id', 'estado', 'observaciones', 'veterinario__first_name', 'veterinario__last_name')),
+    Fuente('tratamiento', Tratamiento, 'inicio_tratamiento', 'historial__mascota_id',
+           ('id', 'descripcion', 'instrucciones', 'fin_tratamiento')),
+    Fuente('vacunacion', MascotaVacuna, 'fecha_aplicacion', 'mascota_id',
+           ('id', 'vacuna__nombre', 'fecha_proxima', 'veterinario__first_name', 'veterinario__last_name')),
+]
+
+
+def _resumen(tipo, fila, request=None):
+    """
+    Representación compacta y común a todos los tipos de evento.
+    """
+    if tipo == 'consulta':
+        titulo, detalle = fila['motivo_consulta'], fila['diagnostico']
+        responsable = _nombre(fila['veterinario__first_name'], fila['veterinario__last_name'])
+    elif tipo == 'documento':
+        titulo, detalle = fila['nombre_archivo'], fila['notas']
+        responsable = None
+    elif tipo == 'peso':
+        titulo, detalle = f"{fila['peso']} kg", fila['notas']
+        responsable = None
+    elif tipo == 'receta':
+        titulo, detalle = f"Receta #{fila['id']} ({fila['estado']})", fila['observaciones']
+        responsable = _nombre(fila['veterinario__first_name'], fila['veterinario__last_name'])
+    elif tipo == 'tratamiento':
+        titulo, detalle = fila['descripcion'], fila['instrucciones']
+        responsable = None
+    else:
+        proxima = fila['fecha_proxima']
+        titulo = fila['vacuna__nombre']
+        detalle = f"Próxima dosis: {proxima.isoformat()}" if proxima else None
+        responsable = _nombre(fila['veterinario__first_name'], fila['veterinario__last_name'])
+
+    evento = {
+        'tipo': tipo,
+        'id': fila['id'],
+        'fecha': fila['dia'].isoformat(),
+        'titulo': titulo,
+        'detalle': detalle,
+        'responsable': responsable,
+    }
+    if tipo == 'documento':
+        evento['tipo_documento'] = fila['tipo_documento__nombre']
+        evento['archivo'] = url_descarga_documento(fila['id'], request)
+    return evento
+
+
+def _flujo(fuente, mascota_id, cursor, limite):
+    queryset = fuente.queryset(mascota_id)
+    if cursor is not None:
+        queryset = queryset.filter(fuente.despues_de(cursor))
+    for fila in queryset.values('dia', *fuente.campos)[:limite]:
+        # Clave ascendente equivalente a (día desc, tipo asc, id desc)
+        yield (-fila['dia'].toordinal(), fuente.tipo, -fila['id']), fila
+
+
+def codificar_cursor(clave):
+    ordinal, tipo, menos_id = clave
+    contenido = [date.fromordinal(-ordinal).isoformat(), tipo, -menos_id]
+    return base64.urlsafe_b64encode(json.dumps(contenido).encode()).decode()
+
+
+def decodificar_cursor(cursor):
+    """
+    Devuelve (día, tipo, id) o lanza ValueError si el cursor no es válido.
+    """
+    try:
+        dia, tipo, ultimo_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return date.fromisoformat(dia), str(tipo), int(ultimo_id)
+    except (TypeError, KeyError) as exc:
+        raise ValueError('Cursor inválido') from exc
+
+
+def linea_de_tiempo(mascota_id, cursor=None, limite=20, request=None):
+    """
+    Devuelve (eventos, cursor_siguiente) para una página de la línea de tiempo.
+    Con ``request`` los documentos traen la URL de descarga absoluta.
+    """
+    flujos = [_flujo(fuente, mascota_id, cursor, limite + 1) for fuente in FUENTES]
+    eventos = []
+    ultima_clave = None
+    for clave, fila in heapq.merge(*flujos, key=lambda par: par[0]):
+        if len(eventos) == limite:
+            return eventos, codificar_cursor(ultima_clave)
+        eventos.append(_resumen(clave[1], fila, request))
+        ultima_clave = clave
+    return eventos, None
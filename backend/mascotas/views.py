@@ -1,7 +1,12 @@
 # mascotas/views.py
+from datetime import date
+
 from rest_framework import viewsets, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from core.descargas import DescargaArchivoMixin
+from historial_medico.models import HistorialMedico
 from historial_medico.serializers import ConsultaSerializer, TratamientoSerializer, MascotaVacunaSerializer
 
 from .models import Especie, Raza, Mascota, FotoMascota, RegistroPeso
@@ -9,6 +14,9 @@ from .serializers import (EspecieSerializer, RazaSerializer, MascotaSerializer,
                           FotoMascotaSerializer, RegistroPesoSerializer)
 from django_filters.rest_framework import DjangoFilterBackend
 from .filters import MascotaFilter, RegistroPesoFilter
+from .cache import obtener_historial, guardar_historial
+from .timeline import linea_de_tiempo, decodificar_cursor
+from .vitales import series_vitales, METODOS, PUNTOS_DEFECTO, PUNTOS_MAXIMO
 
 
 class EspecieViewSet(viewsets.ModelViewSet):
@@ -21,7 +29,7 @@ class RazaViewSet(viewsets.ModelViewSet):
     filterset_fields = ['especie']
 
 class MascotaViewSet(viewsets.ModelViewSet):
-    queryset = Mascota.objects.all()
+    queryset = Mascota.objects.select_related('cliente', 'especie', 'raza')
     serializer_class = MascotaSerializer
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_class = MascotaFilter
@@ -33,19 +41,84 @@ class MascotaViewSet(viewsets.ModelViewSet):
         """
         Devuelve el historial médico completo de una mascota
         """
+        # get_object primero: filtros y permisos se aplican igual con o sin caché
         mascota = self.get_object()
+        data = obtener_historial(mascota.id)
+        if data is not None:
+            return Response(data)
+        
         try:
             historial = mascota.historial
-            data = {
-                'mascota': self.get_serializer(mascota).data,
-                'consultas': ConsultaSerializer(historial.consultas.all(), many=True).data,
-                'tratamientos': TratamientoSerializer(historial.tratamientos.all(), many=True).data,
-                'vacunaciones': MascotaVacunaSerializer(mascota.vacunaciones.all(), many=True).data,
-                'registros_peso': RegistroPesoSerializer(mascota.registros_peso.all(), many=True).data,
-            }
-            return Response(data)
-        except:
+        except HistorialMedico.DoesNotExist:
             return Response({'error': 'Esta mascota no tiene historial médico'}, status=404)
+        
+        # Los related managers dejan cacheados historial y mascota en cada fila;
+        # el resto de los nombres que usan los serializers se trae con select_related
+        data = {
+            'mascota': self.get_serializer(mascota).data,
+            'consultas': ConsultaSerializer(
+                historial.consultas.select_related('veterinario'), many=True
+            ).data,
+            'tratamientos': TratamientoSerializer(historial.tratamientos.all(), many=True).data,
+            'vacunaciones': MascotaVacunaSerializer(
+                mascota.vacunaciones.select_related('vacuna', 'veterinario', 'lote__medicamento'), many=True
+            ).data,
+            'registros_peso': RegistroPesoSerializer(mascota.registros_peso.all(), many=True).data,
+        }
+        guardar_historial(mascota.id, data)
+        return Response(data)
+    
+    @action(detail=True, methods=['get'])
+    def timeline(self, request, pk=None):
+        """
+        Devuelve consultas, tratamientos, vacunaciones, recetas, documentos y pesos
+        de la mascota en un solo flujo cronológico (más reciente primero),
+        paginado por cursor con ?cursor= y ?limite=.
+        """
+        mascota = self.get_object()
+        try:
+            limite = min(max(int(request.query_params.get('limite', 20)), 1), 100)
+            cursor = request.query_params.get('cursor')
+            cursor = decodificar_cursor(cursor) if cursor else None
+        except ValueError:
+            return Response({'error': 'Parámetros de paginación inválidos'}, status=400)
+        
+        eventos, siguiente = linea_de_tiempo(mascota.id, cursor, limite, request)
+        return Response({
+            'results': eventos,
+            'next': replace_query_param(request.build_absolute_uri(), 'cursor', siguiente) if siguiente else None,
+        })
+    
+    @action(detail=True, methods=['get'])
+    def vitales(self, request, pk=None):
+        """
+        Series de peso y temperatura de la mascota (consultas, citas y registros
+        de peso sin duplicados), reducidas en el servidor a lo sumo a ?puntos=
+        valores con ?metodo=lttb|promedio, opcionalmente entre ?desde= y ?hasta=.
+        """
+        mascota = self.get_object()
+        try:
+            desde = request.query_params.get('desde')
+            desde = date.fromisoformat(desde) if desde else None
+            hasta = request.query_params.get('hasta')
+            hasta = date.fromisoformat(hasta) if hasta else None
+            puntos = int(request.query_params.get('puntos', PUNTOS_DEFECTO))
+        except ValueError:
+            return Response({'error': 'Parámetros inválidos'}, status=400)
+        metodo = request.query_params.get('metodo', 'lttb')
+        if metodo not in METODOS:
+            return Response({'error': f"metodo debe ser uno de: {', '.join(METODOS)}"}, status=400)
+        if desde and hasta and desde > hasta:
+            return Response({'error': 'desde no puede ser posterior a hasta'}, status=400)
+        puntos = min(max(puntos, 2), PUNTOS_MAXIMO)
+        
+        return Response({
+            'desde': desde.isoformat() if desde else None,
+            'hasta': hasta.isoformat() if hasta else None,
+            'metodo': metodo,
+            'puntos': puntos,
+            **series_vitales(mascota.id, desde, hasta, puntos, metodo),
+        })
     
     @action(detail=True, methods=['get'])
     def foto_principal(self, request, pk=None):
@@ -73,9 +146,10 @@ class MascotaViewSet(viewsets.ModelViewSet):
         
         return Response(serializer.data, status=201)
 
-class FotoMascotaViewSet(viewsets.ModelViewSet):
+class FotoMascotaViewSet(DescargaArchivoMixin, viewsets.ModelViewSet):
     queryset = FotoMascota.objects.all()
     serializer_class = FotoMascotaSerializer
+    campo_archivo = 'url_foto'
     
 class RegistroPesoViewSet(viewsets.ModelViewSet):
     queryset = RegistroPeso.objects.all()
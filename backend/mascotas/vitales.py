@@ -0,0 +1,249 @@
+# mascotas/vitales.py
+"""
+Series de tiempo de signos vitales (peso y temperatura) de una mascota.
+
+Las mediciones están repartidas en tres tablas: ``citas.Consulta``,
+``historial_medico.Consulta`` y ``mascotas.RegistroPeso``. Se combinan en una
+sola serie por signo, descartando duplicados de una misma visita:
+
+- una consulta del historial con ``cita_relacionada`` reemplaza a la cita de
+  la que se copió (``registrar_en_historial`` copia peso y temperatura);
+- un registro de peso del mismo día y valor que una medición de consulta es
+  la misma lectura anotada dos veces.
+
+Para no enviar miles de puntos al navegador, la serie se reduce en el
+servidor a ``puntos`` valores con LTTB (Largest-Triangle-Three-Buckets, que
+conserva la forma de la curva eligiendo puntos reales) o con el promedio por
+intervalos de tiempo iguales. Si NumPy está instalado los cálculos se
+vectorizan; si no, se usa la implementación en Python puro.
+"""
+from datetime import date
+
+from django.utils import timezone
+
+from citas.models import Consulta as ConsultaCita
+from historial_medico.models import Consulta
+from .models import RegistroPeso
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - dependencia opcional
+    np = None
+
+SIGNOS = ('peso', 'temperatura')
+METODOS = ('lttb', 'promedio')
+PUNTOS_DEFECTO = 200
+PUNTOS_MAXIMO = 2000
+
+
+def _lecturas(mascota_id, desde=None, hasta=None):
+    """
+    Devuelve {signo: [(x, valor, fuente, id), ...]} ordenado por x, donde x es
+    el día (ordinal) con la hora como fracción para las citas.
+    """
+    consultas = Consulta.objects.filter(historial__mascota_id=mascota_id)
+    citas = ConsultaCita.objects.filter(mascota_id=mascota_id).exclude(estado='CANCELADA')
+    pesos = RegistroPeso.objects.filter(mascota_id=mascota_id)
+    if desde:
+        consultas = consultas.filter(fecha__gte=desde)
+        citas = citas.filter(fecha__date__gte=desde)
+        pesos = pesos.filter(fecha_registro__gte=desde)
+    if hasta:
+        consultas = consultas.filter(fecha__lte=hasta)
+        citas = citas.filter(fecha__date__lte=hasta)
+        pesos = pesos.filter(fecha_registro__lte=hasta)
+
+    series = {signo: [] for signo in SIGNOS}
+    # (día, valor) de pesos medidos en consulta, para descartar el registro duplicado
+    pesos_de_consulta = set()
+    citas_registradas = set()
+
+    for fila in consultas.exclude(peso=None, temperatura=None).values(
+            'id', 'fecha', 'peso', 'temperatura', 'cita_relacionada'):
+        x = fila['fecha'].toordinal()
+        if fila['cita_relacionada'] is not None:
+            citas_registradas.add(fila['cita_relacionada'])
+        for signo in SIGNOS:
+            if fila[signo] is not None:
+                series[signo].append((x, float(fila[signo]), 'consulta', fila['id']))
+        if fila['peso'] is not None:
+            pesos_de_consulta.add((x, fila['peso']))
+
+    for fila in citas.exclude(peso=None, temperatura=None).values('id', 'fecha', 'peso', 'temperatura'):
+        if fila['id'] in citas_registradas:
+            continue
+        local = timezone.localtime(fila['fecha']) if timezone.is_aware(fila['fecha']) else fila['fecha']
+        dia = local.date().toordinal()
+        x = dia + (local.hour * 3600 + local.minute * 60 + local.second) / 86400
+        for signo in SIGNOS:
+            if fila[signo] is not None:
+                series[signo].append((x, float(fila[signo]), 'cita', fila['id']))
+        if fila['peso'] is not None:
+            pesos_de_consulta.add((dia, fila['peso']))
+
+    for fila in pesos.values('id', 'fecha_registro', 'peso'):
+        x = fila['fecha_registro'].toordinal()
+        if (x, fila['peso']) not in pesos_de_consulta:
+            series['peso'].append((x, float(fila['peso']), 'registro_peso', fila['id']))
+
+    for lecturas in series.values():
+        lecturas.sort(key=lambda lectura: (lectura[0], lectura[3]))
+    return series
+
+
+def _limites_lttb(n, puntos):
+    """
+    Límites de los ``puntos - 2`` intervalos interiores; el primer y el último
+    punto se conservan siempre.
+    """
+    ancho = (n - 2) / (puntos - 2)
+    limites = [int(i * ancho) + 1 for i in range(puntos - 1)]
+    limites[-1] = n - 1
+    return limites
+
+
+def _lttb_python(xs, ys, puntos):
+    n = len(xs)
+    limites = _limites_lttb(n, puntos)
+    elegidos = [0]
+    a = 0
+    for i in range(puntos - 2):
+        inicio, fin = limites[i], limites[i + 1]
+        # Promedio del intervalo siguiente (el último punto para el último intervalo)
+        if i + 2 < len(limites):
+            siguiente_fin = limites[i + 2]
+            cantidad = siguiente_fin - fin
+            promedio_x = sum(xs[fin:siguiente_fin]) / cantidad
+            promedio_y = sum(ys[fin:siguiente_fin]) / cantidad
+        else:
+            promedio_x, promedio_y = xs[n - 1], ys[n - 1]
+        mejor, mejor_area = inicio, -1.0
+        for j in range(inicio, fin):
+            area = abs((xs[a] - promedio_x) * (ys[j] - ys[a]) - (xs[a] - xs[j]) * (promedio_y - ys[a]))
+            if area > mejor_area:
+                mejor, mejor_area = j, area
+        elegidos.append(mejor)
+        a = mejor
+    elegidos.append(n - 1)
+    return elegidos
+
+
+def _lttb_numpy(xs, ys, puntos):
+    x = np.asarray(xs, dtype=float)
+    y = np.asarray(ys, dtype=float)
+    n = len(x)
+    limites = np.asarray(_limites_lttb(n, puntos))
+    # Promedios de todos los intervalos de una vez con sumas acumuladas
+    suma_x = np.concatenate(([0.0], np.cumsum(x)))
+    suma_y = np.concatenate(([0.0], np.cumsum(y)))
+    cantidades = np.diff(limites)
+    promedios_x = np.append((suma_x[limites[1:]] - suma_x[limites[:-1]]) / cantidades, x[-1])
+    promedios_y = np.append((suma_y[limites[1:]] - suma_y[limites[:-1]]) / cantidades, y[-1])
+
+    elegidos = np.empty(puntos, dtype=int)
+    elegidos[0], elegidos[-1] = 0, n - 1
+    a = 0
+    for i in range(puntos - 2):
+        inicio, fin = limites[i], limites[i + 1]
+        area = np.abs(
+            (x[a] - promedios_x[i + 1]) * (y[inicio:fin] - y[a])
+            - (x[a] - x[inicio:fin]) * (promedios_y[i + 1] - y[a])
+        )
+        a = inicio + int(area.argmax())
+        elegidos[i + 1] = a
+    return elegidos.tolist()
+
+
+def lttb(xs, ys, puntos):
+    """
+    Índices de los ``puntos`` valores que conservan mejor la forma de la serie.
+    """
+    if puntos >= len(xs):
+        return list(range(len(xs)))
+    if puntos <= 2:
+        return [0, len(xs) - 1]
+    if np is not None:
+        return _lttb_numpy(xs, ys, puntos)
+    return _lttb_python(xs, ys, puntos)
+
+
+def promedio_por_intervalo(xs, ys, puntos, inicio, fin):
+    """
+    Divide [inicio, fin] en ``puntos`` intervalos de igual duración y devuelve
+    (x medio, promedio, mínimo, máximo, cantidad) de cada intervalo no vacío.
+    """
+    ancho = max(fin - inicio, 1e-9) / puntos
+    if np is not None:
+        x = np.asarray(xs, dtype=float)
+        y = np.asarray(ys, dtype=float)
+        intervalos = np.minimum(((x - inicio) / ancho).astype(int), puntos - 1)
+        cantidades = np.bincount(intervalos, minlength=puntos)
+        sumas_x = np.bincount(intervalos, weights=x, minlength=puntos)
+        sumas_y = np.bincount(intervalos, weights=y, minlength=puntos)
+        minimos = np.full(puntos, np.inf)
+        maximos = np.full(puntos, -np.inf)
+        np.minimum.at(minimos, intervalos, y)
+        np.maximum.at(maximos, intervalos, y)
+        ocupados = np.nonzero(cantidades)[0]
+        return list(zip(
+            (sumas_x[ocupados] / cantidades[ocupados]).tolist(),
+            (sumas_y[ocupados] / cantidades[ocupados]).tolist(),
+            minimos[ocupados].tolist(),
+            maximos[ocupados].tolist(),
+            cantidades[ocupados].tolist(),
+        ))
+
+    acumulados = {}
+    for x, y in zip(xs, ys):
+        intervalo = min(int((x - inicio) / ancho), puntos - 1)
+        suma_x, suma_y, minimo, maximo, cantidad = acumulados.get(intervalo, (0.0, 0.0, y, y, 0))
+        acumulados[intervalo] = (suma_x + x, suma_y + y, min(minimo, y), max(maximo, y), cantidad + 1)
+    return [
+        (suma_x / cantidad, suma_y / cantidad, minimo, maximo, cantidad)
+        for _, (suma_x, suma_y, minimo, maximo, cantidad) in sorted(acumulados.items())
+    ]
+
+
+def _punto(x, valor):
+    return {'fecha': date.fromordinal(int(x)).isoformat(), 'valor': round(valor, 2)}
+
+
+def reducir_serie(lecturas, puntos, metodo='lttb', inicio=None, fin=None):
+    """
+    Reduce una lista de lecturas (x, valor, fuente, id) a lo sumo a ``puntos``
+    puntos. Con menos lecturas que ``puntos`` se devuelven todas.
+    """
+    if len(lecturas) <= puntos:
+        return [dict(_punto(x, valor), fuente=fuente, id=id_) for x, valor, fuente, id_ in lecturas]
+
+    xs = [lectura[0] for lectura in lecturas]
+    ys = [lectura[1] for lectura in lecturas]
+    if metodo == 'promedio':
+        inicio = xs[0] if inicio is None else inicio
+        fin = xs[-1] if fin is None else fin
+        return [
+            dict(_punto(x, valor), minimo=round(minimo, 2), maximo=round(maximo, 2), n=cantidad)
+            for x, valor, minimo, maximo, cantidad in promedio_por_intervalo(xs, ys, puntos, inicio, fin)
+        ]
+
+    resultado = []
+    for indice in lttb(xs, ys, puntos):
+        x, valor, fuente, id_ = lecturas[indice]
+        resultado.append(dict(_punto(x, valor), fuente=fuente, id=id_))
+    return resultado
+
+
+def series_vitales(mascota_id, desde=None, hasta=None, puntos=PUNTOS_DEFECTO, metodo='lttb'):
+    """
+    Devuelve {signo: {'total': lecturas, 'puntos': [...]}} para peso y temperatura.
+    """
+    inicio = desde.toordinal() if desde else None
+    # Los intervalos de ``promedio`` cubren hasta el final del último día
+    fin = hasta.toordinal() + 1 if hasta else None
+    return {
+        signo: {
+            'total': len(lecturas),
+            'puntos': reducir_serie(lecturas, puntos, metodo, inicio, fin),
+        }
+        for signo, lecturas in _lecturas(mascota_id, desde, hasta).items()
+    }
@@ -0,0 +1,20 @@
+# Generated by Django 5.0.6 on 2026-10-18 00:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("clientes", "0001_initial"),
+        ("mascotas", "0001_initial"),
+        ("notificaciones", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="notificacion",
+            index=models.Index(
+                fields=["-fecha_programada", "id"], name="notif_fecha_prog_id_idx"
+            ),
+        ),
+    ]
@@ -45,4 +45,6 @@ class Notificacion(BaseModel):
             models.Index(fields=['cliente']),
             models.Index(fields=['fecha_programada']),
             models.Index(fields=['estado']),
+            # Paginación por cursor sobre (-fecha_programada, id)
+            models.Index(fields=['-fecha_programada', 'id'], name='notif_fecha_prog_id_idx'),
         ]
\ No newline at end of file
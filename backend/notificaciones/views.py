@@ -4,7 +4,7 @@ from .models import Notificacion
 from .serializers import NotificacionSerializer
 
 class NotificacionViewSet(viewsets.ModelViewSet):
-    queryset = Notificacion.objects.all()
+    queryset = Notificacion.objects.all().order_by('-fecha_programada', 'id')
     serializer_class = NotificacionSerializer
     filterset_fields = ['cliente', 'mascota', 'tipo', 'medio', 'estado']
     search_fields = ['mensaje']
\ No newline at end of file
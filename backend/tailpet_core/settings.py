@@ -2,6 +2,8 @@ import datetime
 from pathlib import Path
 import os
 
+from corsheaders.defaults import default_headers
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -18,6 +20,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "rest_framework_simplejwt",
 
     # Third‑party
@@ -51,6 +54,9 @@ MIDDLEWARE = [
 
 # CORS (solo para desarrollo)
 CORS_ALLOW_ALL_ORIGINS = True
+# El calendario de citas revalida con If-None-Match y lee el ETag de la respuesta
+CORS_ALLOW_HEADERS = (*default_headers, "if-none-match")
+CORS_EXPOSE_HEADERS = ["ETag"]
 
 ROOT_URLCONF = "tailpet_core.urls"
 
@@ -87,9 +93,20 @@ DATABASES = {
     }
 }
 
+# Caché compartido entre workers: el historial completo de cada mascota y las
+# alertas de inventario se invalidan al confirmar cada escritura, y con un caché
+# local por proceso los demás workers seguirían sirviendo datos viejos
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('REDIS_CACHE_URL', 'redis://localhost:6379/1'),
+        'KEY_PREFIX': 'tailpet',
+    }
+}
+
 # REST framework
 REST_FRAMEWORK = {
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'core.pagination.PaginacionHibrida',
     'PAGE_SIZE': 10,
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
@@ -145,5 +162,23 @@ STATIC_ROOT = os.path.join(BASE_DIR, "staticfiles")
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "mediafiles")
 
+# Descargas autenticadas: delegar el envío al servidor web si está configurado
+# (p. ej. DESCARGAS_X_ACCEL_REDIRECT = "/media-protegida/" con un location internal en nginx)
+DESCARGAS_X_ACCEL_REDIRECT = None
+DESCARGAS_X_SENDFILE = False
+
+# Subidas de documentos por partes
+DOCUMENTOS_SUBIDA_TAMANO_MAXIMO = 2 * 1024 ** 3  # 2 GB
+DOCUMENTOS_SUBIDA_HORAS_EXPIRACION = 48
+
+# Extracción de texto de documentos (0 hilos: solo con manage.py extraer_texto_documentos)
+DOCUMENTOS_EXTRACCION_HILOS = 2
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+# Agenda de citas
+CITAS_HORARIO_INICIO = datetime.time(9, 0)
+CITAS_HORARIO_FIN = datetime.time(19, 0)
+CITAS_DIAS_ATENCION = (0, 1, 2, 3, 4, 5)  # lunes a sábado
+CITAS_PASO_MINUTOS = 15
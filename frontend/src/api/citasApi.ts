@@ -23,6 +23,69 @@ export interface ConsultaResponse {
   results: Consulta[];
 }
 
+export interface DisponibilidadVeterinario {
+  veterinario: number;
+  veterinario_nombre: string;
+  dias: { fecha: string; bloques: string[] }[];
+}
+
+export interface DisponibilidadResponse {
+  desde: string;
+  hasta: string;
+  duracion: number;
+  veterinarios: DisponibilidadVeterinario[];
+}
+
+// Feed del calendario: un arreglo por campo, alineados por índice
+export interface CalendarioResponse {
+  desde: string;
+  hasta: string;
+  citas: {
+    id: number[];
+    inicio: string[];
+    fin: string[];
+    estado: CitaCalendario['estado'][];
+    tipo: Consulta['tipo'][];
+    mascota: number[];
+    mascota_nombre: string[];
+    veterinario: number[];
+    veterinario_nombre: string[];
+  };
+}
+
+// Una cita del feed del calendario, ya como objeto
+export interface CitaCalendario {
+  id: number;
+  inicio: string;
+  fin: string;
+  estado: Consulta['estado'] | 'EN_CURSO';
+  tipo: Consulta['tipo'];
+  mascota: number;
+  mascota_nombre: string;
+  veterinario: number;
+  veterinario_nombre: string;
+}
+
+export interface CalendarioResultado {
+  etag: string | null;
+  // null cuando el servidor respondió 304: la ventana no cambió desde ese ETag
+  citas: CitaCalendario[] | null;
+}
+
+// Convierte las columnas del feed en una cita por elemento
+export const filasCalendario = (columnas: CalendarioResponse['citas']): CitaCalendario[] =>
+  columnas.id.map((id, i) => ({
+    id,
+    inicio: columnas.inicio[i],
+    fin: columnas.fin[i],
+    estado: columnas.estado[i],
+    tipo: columnas.tipo[i],
+    mascota: columnas.mascota[i],
+    mascota_nombre: columnas.mascota_nombre[i],
+    veterinario: columnas.veterinario[i],
+    veterinario_nombre: columnas.veterinario_nombre[i],
+  }));
+
 const citasApi = {
   getConsultas: async (params?: any): Promise<ConsultaResponse> => {
     const { data } = await axiosInstance.get<ConsultaResponse>('/citas/consultas/', { params });
@@ -48,6 +111,38 @@ const citasApi = {
     await axiosInstance.delete(`/citas/consultas/${id}/`);
   },
 
+  // Bloques libres por veterinario y día
+  getDisponibilidad: async (params: {
+    desde: string;
+    hasta?: string;
+    duracion?: number;
+    veterinario?: number;
+  }): Promise<DisponibilidadResponse> => {
+    const { data } = await axiosInstance.get<DisponibilidadResponse>('/citas/consultas/disponibilidad/', { params });
+    return data;
+  },
+
+  // Citas de una ventana [desde, hasta) para las vistas de mes/semana. Con el
+  // ETag de la respuesta anterior el servidor contesta 304 si nada cambió.
+  getCalendario: async (
+    params: {
+      desde: string;
+      hasta: string;
+      veterinario?: number;
+    },
+    etag?: string | null
+  ): Promise<CalendarioResultado> => {
+    const response = await axiosInstance.get<CalendarioResponse>('/citas/consultas/calendario/', {
+      params,
+      headers: etag ? { 'If-None-Match': etag } : undefined,
+      validateStatus: (status) => (status >= 200 && status < 300) || status === 304,
+    });
+    return {
+      etag: response.headers['etag'] ?? null,
+      citas: response.status === 304 ? null : filasCalendario(response.data.citas),
+    };
+  },
+
   // Consultas por mascota
   getConsultasByMascota: async (mascotaId: number): Promise<ConsultaResponse> => {
     const { data } = await axiosInstance.get<ConsultaResponse>('/citas/consultas/', {
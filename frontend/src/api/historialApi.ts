@@ -79,6 +79,7 @@ export interface Documento {
   tipo_documento: number;
   nombre_archivo: string;
   url_archivo: File | string;
+  url_descarga?: string;
   fecha_subida?: string;
   usuario?: number;
   notas?: string;
@@ -260,6 +261,71 @@ const historialApi = {
     await axiosInstance.delete(`/historial-medico/documentos/${id}/`);
   },
 
+  // Subida por partes: reanuda desde lo ya recibido si la conexión se corta
+  subirDocumentoPorPartes: async (
+    archivo: File,
+    datos: { mascota: number; tipo_documento: number; historial?: number; notas?: string },
+    tamanoParte: number = 5 * 1024 * 1024
+  ): Promise<Documento> => {
+    const { data: subida } = await axiosInstance.post('/historial-medico/subidas-documento/', {
+      ...datos,
+      nombre_archivo: archivo.name,
+      tamano_total: archivo.size,
+    });
+    const url = `/historial-medico/subidas-documento/${subida.id}/`;
+    let recibido = 0;
+    while (recibido < archivo.size) {
+      const fin = Math.min(recibido + tamanoParte, archivo.size);
+      try {
+        const { data } = await axiosInstance.put(`${url}parte/`, archivo.slice(recibido, fin), {
+          headers: {
+            'Content-Type': 'application/octet-stream',
+            'Content-Range': `bytes ${recibido}-${fin - 1}/${archivo.size}`,
+          },
+        });
+        recibido = data.recibido;
+      } catch (error) {
+        const { data } = await axiosInstance.get(url);
+        if (data.recibido === recibido) throw error;
+        recibido = data.recibido;
+      }
+    }
+    const { data: documento } = await axiosInstance.post<Documento>(`${url}finalizar/`);
+    return documento;
+  },
+
+  buscarDocumentos: async (texto: string, mascotaId?: number): Promise<any> => {
+    const { data } = await axiosInstance.get('/historial-medico/documentos/buscar/', {
+      params: { q: texto, mascota: mascotaId },
+    });
+    return data;
+  },
+
+  descargarDocumento: async (id: number): Promise<Blob> => {
+    const { data } = await axiosInstance.get<Blob>(`/historial-medico/documentos/${id}/descargar/`, {
+      responseType: 'blob',
+    });
+    return data;
+  },
+
+  // Importación de registros históricos (solo administradores)
+  importarHistorico: async (
+    tipo: 'clientes' | 'mascotas' | 'consultas' | 'vacunaciones' | 'pesos',
+    archivo: File,
+    veterinario?: string
+  ): Promise<any> => {
+    const formData = new FormData();
+    formData.append('tipo', tipo);
+    formData.append('archivo', archivo);
+    if (veterinario) formData.append('veterinario', veterinario);
+    const { data } = await axiosInstance.post('/historial-medico/importaciones/', formData, {
+      headers: {
+        'Content-Type': 'multipart/form-data',
+      },
+    });
+    return data;
+  },
+
   // Recetas
   getRecetasByMascota: async (mascotaId: number): Promise<PaginatedResponse<Receta>> => {
     const { data } = await axiosInstance.get<PaginatedResponse<Receta>>(`/historial-medico/recetas/?mascota=${mascotaId}`);
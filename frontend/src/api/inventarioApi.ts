@@ -21,6 +21,9 @@ export interface Medicamento {
   precio_compra: number;
   precio_venta: number;
   stock_minimo: number;
+  stock_actual?: number;
+  stock_vencido?: number;
+  stock_disponible?: number;
   activo: boolean;
   requiere_receta: boolean;
   es_vacuna?: boolean;
@@ -54,6 +57,83 @@ export interface MovimientoInventario {
   afecta_stock: boolean;
 }
 
+export interface AlertaStockBajo {
+  id: number;
+  nombre: string;
+  presentacion: string;
+  stock_minimo: number;
+  stock_actual: number;
+  stock_vencido: number;
+  stock_disponible: number;
+  proveedor_nombre: string;
+}
+
+export interface AlertaLote {
+  id: number;
+  medicamento_id: number;
+  medicamento_nombre: string;
+  numero_lote: string;
+  fecha_vencimiento: string;
+  cantidad: number;
+  dias_para_vencer?: number;
+}
+
+export interface AlertasInventario {
+  fecha: string;
+  dias: number;
+  stock_bajo: AlertaStockBajo[];
+  por_vencer: AlertaLote[];
+  vencidos: AlertaLote[];
+}
+
+export interface StockHistorico {
+  fecha: string;
+  medicamentos: {
+    medicamento_id: number;
+    nombre: string;
+    stock: number;
+    lotes?: { lote_id: number; numero_lote: string; fecha_vencimiento: string; cantidad: number }[];
+  }[];
+}
+
+export interface MovimientoKardex {
+  id: number;
+  fecha: string;
+  tipo: 'ENTRADA' | 'SALIDA' | 'AJUSTE';
+  cantidad: number;
+  efecto: number;
+  saldo: number;
+  afecta_stock: boolean;
+  lote_id: number | null;
+  numero_lote: string | null;
+  documento_referencia: string | null;
+  motivo: string;
+  usuario_nombre: string;
+}
+
+export interface PaginaKardex {
+  saldo_inicial: number;
+  saldo_final: number;
+  results: MovimientoKardex[];
+  next: string | null;
+}
+
+export interface LineaRecepcion {
+  medicamento: number;
+  numero_lote: string;
+  fecha_vencimiento: string;
+  cantidad: number;
+  precio_compra: number;
+}
+
+export interface Recepcion {
+  proveedor: number;
+  documento_referencia?: string;
+  motivo?: string;
+  fecha_ingreso?: string;
+  lineas: LineaRecepcion[];
+}
+
 export interface PaginatedResponse<T> {
   count: number;
   next: string | null;
@@ -143,6 +223,33 @@ const inventarioApi = {
     return data;
   },
 
+  // Stock bajo, lotes por vencer y vencidos, calculados en el servidor
+  getAlertas: async (dias?: number): Promise<AlertasInventario> => {
+    const { data } = await axiosInstance.get<AlertasInventario>('/inventario/alertas/', {
+      params: dias !== undefined ? { dias } : undefined
+    });
+    return data;
+  },
+
+  // Stock en una fecha pasada (YYYY-MM-DD: al final de ese día)
+  getStockHistorico: async (fecha: string, params?: { medicamento?: number; por_lote?: boolean }): Promise<StockHistorico> => {
+    const { data } = await axiosInstance.get<StockHistorico>('/inventario/stock-historico/', {
+      params: { fecha, ...params }
+    });
+    return data;
+  },
+
+  // Kardex con saldo; la página siguiente se pide con la URL de `next`
+  getKardexMedicamento: async (id: number, params?: { desde?: string; limite?: number }): Promise<PaginaKardex> => {
+    const { data } = await axiosInstance.get<PaginaKardex>(`/inventario/medicamentos/${id}/kardex/`, { params });
+    return data;
+  },
+
+  getKardexLote: async (id: number, params?: { desde?: string; limite?: number }): Promise<PaginaKardex> => {
+    const { data } = await axiosInstance.get<PaginaKardex>(`/inventario/lotes/${id}/kardex/`, { params });
+    return data;
+  },
+
   // Lotes
   getLotes: async (params?: any): Promise<PaginatedResponse<LoteMedicamento>> => {
     const { data } = await axiosInstance.get<PaginatedResponse<LoteMedicamento>>('/inventario/lotes/', { params });
@@ -190,6 +297,12 @@ const inventarioApi = {
     return data;
   },
 
+  // Entrega completa de un proveedor en una sola petición (todo o nada)
+  registrarRecepcion: async (recepcion: Recepcion): Promise<{ lotes: { id: number; medicamento: number; numero_lote: string; cantidad: number }[]; unidades: number }> => {
+    const { data } = await axiosInstance.post('/inventario/recepciones/', recepcion);
+    return data;
+  },
+
   // Métodos específicos para vacunas
   
   // Obtener lotes disponibles para vacunas
@@ -191,6 +191,35 @@ export const getHistorialMascota = async (mascotaId: number): Promise<any> => {
   }
 };
 
+// Línea de tiempo paginada por cursor
+export const getTimelineMascota = async (mascotaId: number, cursor?: string, limite?: number): Promise<any> => {
+  try {
+    const { data } = await axiosInstance.get(`/mascotas/mascotas/${mascotaId}/timeline/`, {
+      params: { cursor, limite }
+    });
+    return data;
+  } catch (error) {
+    console.error(`Error fetching timeline for mascota ${mascotaId}:`, error);
+    throw error;
+  }
+};
+
+// Series de peso y temperatura reducidas en el servidor
+export const getVitalesMascota = async (
+  mascotaId: number,
+  opciones: { desde?: string; hasta?: string; puntos?: number; metodo?: 'lttb' | 'promedio' } = {}
+): Promise<any> => {
+  try {
+    const { data } = await axiosInstance.get(`/mascotas/mascotas/${mascotaId}/vitales/`, {
+      params: opciones
+    });
+    return data;
+  } catch (error) {
+    console.error(`Error fetching vitales for mascota ${mascotaId}:`, error);
+    throw error;
+  }
+};
+
 // Registro de pesos
 export const getPesosMascota = async (mascotaId: number): Promise<any> => {
   try {
@@ -1,5 +1,5 @@
 // src/pages/citas/CitasList.tsx
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { Link, useNavigate } from 'react-router-dom';
 import {
   Container,
@@ -50,8 +50,8 @@ import {
 import { AdapterDateFns } from '@mui/x-date-pickers/AdapterDateFns';
 import { LocalizationProvider, DatePicker } from '@mui/x-date-pickers';
 import { es } from 'date-fns/locale';
-import { format, isToday, isTomorrow, differenceInDays } from 'date-fns';
-import citasApi, { Consulta } from '../../api/citasApi';
+import { format, isToday, isTomorrow, differenceInDays, addDays } from 'date-fns';
+import citasApi, { CitaCalendario } from '../../api/citasApi';
 import consultaApi from '../../api/consultaApi';
 import { useAuth } from '../../context/AuthContext';
 
@@ -69,12 +69,19 @@ const ESTADOS_CONSULTA = [
   { value: 'CANCELADA', label: 'Cancelada', color: 'error' },
 ];
 
+// Sin fecha filtrada se muestra la ventana [hoy - DIAS_ANTES, hoy + DIAS_DESPUES)
+// del feed del calendario (máximo 62 días por petición)
+const DIAS_ANTES = 7;
+const DIAS_DESPUES = 30;
+
 const CitasList: React.FC = () => {
   const theme = useTheme();
   const navigate = useNavigate();
   const isMobile = useMediaQuery(theme.breakpoints.down('md'));
   
-  const [consultas, setConsultas] = useState<Consulta[]>([]);
+  const [consultas, setConsultas] = useState<CitaCalendario[]>([]);
+  // Última ventana pedida con su ETag, para revalidar sin volver a descargarla
+  const calendarioRef = useRef<{ clave: string; etag: string | null; citas: CitaCalendario[] } | null>(null);
   const [loading, setLoading] = useState(true);
   const [refreshing, setRefreshing] = useState(false);
   const [error, setError] = useState<string | null>(null);
@@ -87,7 +94,6 @@ const CitasList: React.FC = () => {
   const [filterStatus, setFilterStatus] = useState<string>('');
   const [filterType, setFilterType] = useState<string>('');
   const [searchTerm, setSearchTerm] = useState<string>('');
-  const [filtersApplied, setFiltersApplied] = useState(false);
   
   const { user } = useAuth();
 
@@ -135,37 +141,26 @@ const CitasList: React.FC = () => {
     }
     
     try {
-      let params: Record<string, any> = {};
-      
-      if (filterDate) {
-        params.fecha = format(filterDate, 'yyyy-MM-dd');
-      }
-      
-      if (filterStatus) {
-        params.estado = filterStatus;
-      }
-      
-      if (filterType) {
-        params.tipo = filterType;
-      }
+      const desde = filterDate ?? addDays(new Date(), -DIAS_ANTES);
+      const hasta = filterDate ? addDays(filterDate, 1) : addDays(new Date(), DIAS_DESPUES);
+      const params: { desde: string; hasta: string; veterinario?: number } = {
+        desde: format(desde, 'yyyy-MM-dd'),
+        hasta: format(hasta, 'yyyy-MM-dd'),
+      };
       
       // Si el usuario es veterinario, solo mostrar sus consultas
       if (user?.rol === 'VETERINARIO') {
         params.veterinario = user.id;
       }
       
-      const response = await citasApi.getConsultas(params);
-      setConsultas(response.results);
+      const clave = JSON.stringify(params);
+      const anterior = calendarioRef.current?.clave === clave ? calendarioRef.current : null;
+      const { etag, citas } = await citasApi.getCalendario(params, anterior?.etag);
+      const vigentes = citas ?? anterior?.citas ?? [];
+      calendarioRef.current = { clave, etag, citas: vigentes };
+      setConsultas(vigentes);
       setError(null);
       
-      // Verificar si hay filtros aplicados
-      setFiltersApplied(
-        !!filterDate || 
-        !!filterStatus || 
-        !!filterType || 
-        !!searchTerm
-      );
-      
       // Reiniciar paginación
       setPage(0);
     } catch (err) {
@@ -181,7 +176,12 @@ const CitasList: React.FC = () => {
 
   useEffect(() => {
     fetchConsultas(false);
-  }, [filterDate, filterStatus, filterType, user?.id]);
+  }, [filterDate, user?.id]);
+
+  // Estado y tipo se filtran sobre la ventana ya cargada
+  useEffect(() => {
+    setPage(0);
+  }, [filterStatus, filterType]);
 
   const getStatusColor = (status: string) => {
     const estado = ESTADOS_CONSULTA.find(e => e.value === status);
@@ -193,16 +193,24 @@ const CitasList: React.FC = () => {
     return tipo ? tipo.color : 'default';
   };
 
+  const filtersApplied = !!filterDate || !!filterStatus || !!filterType || !!searchTerm;
+
   const filterConsultas = () => {
-    if (!searchTerm) return consultas;
+    const termino = searchTerm.toLowerCase();
     
     return consultas.filter(consulta => 
-      consulta.mascota_nombre?.toLowerCase().includes(searchTerm.toLowerCase()) ||
-      consulta.veterinario_nombre?.toLowerCase().includes(searchTerm.toLowerCase()) ||
-      consulta.motivo.toLowerCase().includes(searchTerm.toLowerCase())
+      (!filterStatus || consulta.estado === filterStatus) &&
+      (!filterType || consulta.tipo === filterType) &&
+      (!termino ||
+        consulta.mascota_nombre.toLowerCase().includes(termino) ||
+        consulta.veterinario_nombre.toLowerCase().includes(termino))
     );
   };
 
+  // Horario de la cita, p. ej. "10:00 - 10:30"
+  const formatHorario = (consulta: CitaCalendario) =>
+    `${format(new Date(consulta.inicio), 'HH:mm')} - ${format(new Date(consulta.fin), 'HH:mm')}`;
+
   const filteredConsultas = filterConsultas();
   
   // Consultas paginadas
@@ -312,7 +320,7 @@ const CitasList: React.FC = () => {
                       }}
                     >
                       <CalendarIcon color="primary" sx={{ fontSize: 18 }} />
-                      {formatFechaRelativa(consulta.fecha)}
+                      {formatFechaRelativa(consulta.inicio)}
                     </Typography>
                     <Typography variant="h6" sx={{ mt: 1 }}>
                       {consulta.mascota_nombre}
@@ -358,7 +366,7 @@ const CitasList: React.FC = () => {
                   </Typography>
                   
                   <Typography variant="body2" color="text.secondary">
-                    <strong>Motivo:</strong> {consulta.motivo}
+                    <strong>Horario:</strong> {formatHorario(consulta)}
                   </Typography>
                 </Box>
                 
@@ -511,7 +519,7 @@ const CitasList: React.FC = () => {
               <TableCell sx={{ fontWeight: 600 }}>Fecha</TableCell>
               <TableCell sx={{ fontWeight: 600 }}>Mascota</TableCell>
               <TableCell sx={{ fontWeight: 600 }}>Veterinario</TableCell>
-              <TableCell sx={{ fontWeight: 600 }}>Motivo</TableCell>
+              <TableCell sx={{ fontWeight: 600 }}>Horario</TableCell>
               <TableCell sx={{ fontWeight: 600 }}>Tipo</TableCell>
               <TableCell sx={{ fontWeight: 600 }}>Estado</TableCell>
               <TableCell align="center" sx={{ fontWeight: 600 }}>Acciones</TableCell>
@@ -543,7 +551,7 @@ const CitasList: React.FC = () => {
                         sx={{ opacity: 0.7 }}
                       />
                       <Typography variant="body2">
-                        {formatFechaRelativa(consulta.fecha)}
+                        {formatFechaRelativa(consulta.inicio)}
                       </Typography>
                     </Box>
                   </TableCell>
@@ -554,15 +562,8 @@ const CitasList: React.FC = () => {
                   </TableCell>
                   <TableCell>{consulta.veterinario_nombre}</TableCell>
                   <TableCell>
-                    <Typography
-                      sx={{
-                        maxWidth: 200,
-                        overflow: 'hidden',
-                        textOverflow: 'ellipsis',
-                        whiteSpace: 'nowrap',
-                      }}
-                    >
-                      {consulta.motivo}
+                    <Typography variant="body2" sx={{ whiteSpace: 'nowrap' }}>
+                      {formatHorario(consulta)}
                     </Typography>
                   </TableCell>
                   <TableCell>
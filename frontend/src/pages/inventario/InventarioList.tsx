@@ -38,7 +38,7 @@ import {
   AddBox as AddBoxIcon,
   Delete as DeleteIcon
 } from '@mui/icons-material';
-import inventarioApi, { Medicamento, LoteMedicamento } from '../../api/inventarioApi';
+import inventarioApi, { Medicamento, LoteMedicamento, AlertasInventario } from '../../api/inventarioApi';
 import { useAuth } from '../../context/AuthContext';
 
 interface TabPanelProps {
@@ -82,6 +82,8 @@ const InventarioList: React.FC = () => {
   
   const [medicamentos, setMedicamentos] = useState<Medicamento[]>([]);
   const [lotes, setLotes] = useState<LoteMedicamento[]>([]);
+  const [lotesCargados, setLotesCargados] = useState(false);
+  const [alertas, setAlertas] = useState<AlertasInventario | null>(null);
   const [searchTerm, setSearchTerm] = useState('');
   
   // Estado para el modal de entrada de inventario
@@ -96,12 +98,23 @@ const InventarioList: React.FC = () => {
     motivo: 'Entrada de inventario'
   });
   
+const fetchLotes = async () => {
+  const lotesData = await inventarioApi.getLotes();
+  setLotes(lotesData.results.map(lote => ({
+    ...lote,
+    precio_compra: Number(lote.precio_compra),
+    cantidad: Number(lote.cantidad)
+  })));
+  setLotesCargados(true);
+};
+
+// El stock y las alertas vienen calculados del servidor; los lotes se cargan al abrir su pestaña
 const fetchData = async () => {
   setLoading(true);
   try {
-    const [medicamentosData, lotesData] = await Promise.all([
+    const [medicamentosData, alertasData] = await Promise.all([
       inventarioApi.getMedicamentos({ activo: true }),
-      inventarioApi.getLotes()
+      inventarioApi.getAlertas()
     ]);
     
     // Asegurar que los precios sean números
@@ -112,14 +125,11 @@ const fetchData = async () => {
       stock_minimo: Number(med.stock_minimo)
     }));
     
-    const lotesConNumeros = lotesData.results.map(lote => ({
-      ...lote,
-      precio_compra: Number(lote.precio_compra),
-      cantidad: Number(lote.cantidad)
-    }));
-    
     setMedicamentos(medicamentosConNumeros);
-    setLotes(lotesConNumeros);
+    setAlertas(alertasData);
+    if (lotesCargados) {
+      await fetchLotes();
+    }
     setError(null);
   } catch (error) {
     console.error('Error al cargar inventario:', error);
@@ -135,6 +145,12 @@ const fetchData = async () => {
   
   const handleTabChange = (event: React.SyntheticEvent, newValue: number) => {
     setTabValue(newValue);
+    if (newValue === 1 && !lotesCargados) {
+      fetchLotes().catch(error => {
+        console.error('Error al cargar lotes:', error);
+        setError('Error al cargar los lotes');
+      });
+    }
   };
   
   // Filtrar medicamentos por término de búsqueda
@@ -156,18 +172,13 @@ const fetchData = async () => {
     return date.toLocaleDateString();
   };
   
-  // Verificar si un medicamento tiene stock bajo
-  const hasLowStock = (medicamentoId: number | undefined) => {
-    if (!medicamentoId) return false;
-    
-    const medicamento = medicamentos.find(m => m.id === medicamentoId);
-    if (!medicamento) return false;
-    
-    const medicamentoLotes = lotes.filter(l => l.medicamento === medicamentoId);
-    const totalStock = medicamentoLotes.reduce((sum, lote) => sum + lote.cantidad, 0);
-    
-    return totalStock < medicamento.stock_minimo;
-  };
+  // Medicamentos con stock bajo según las alertas del servidor
+  const idsStockBajo = new Set((alertas?.stock_bajo ?? []).map(m => m.id));
+  const hasLowStock = (medicamentoId: number | undefined) =>
+    medicamentoId !== undefined && idsStockBajo.has(medicamentoId);
+  
+  const stockDisponible = (medicamento: Medicamento) =>
+    medicamento.stock_disponible ?? medicamento.stock_actual ?? 0;
   
   // Abrir diálogo de entrada de inventario
   const handleOpenEntradaDialog = (medicamento: Medicamento) => {
@@ -273,6 +284,10 @@ const fetchData = async () => {
         >
           <Tab label="Medicamentos" {...a11yProps(0)} />
           <Tab label="Lotes" {...a11yProps(1)} />
+          <Tab
+            label={`Alertas (${(alertas?.stock_bajo.length ?? 0) + (alertas?.por_vencer.length ?? 0) + (alertas?.vencidos.length ?? 0)})`}
+            {...a11yProps(2)}
+          />
         </Tabs>
         
         <TabPanel value={tabValue} index={0}>
@@ -300,12 +315,12 @@ const fetchData = async () => {
                       <TableCell align="center">
                         <Chip 
                           label={
-                            med.activo && lotes.filter(l => l.medicamento === med.id).reduce((sum, l) => sum + l.cantidad, 0) > 0
+                            med.activo && stockDisponible(med) > 0
                               ? 'Disponible'
                               : 'No disponible'
                           }
                           color={
-                            med.activo && lotes.filter(l => l.medicamento === med.id).reduce((sum, l) => sum + l.cantidad, 0) > 0
+                            med.activo && stockDisponible(med) > 0
                               ? 'success'
                               : 'error'
                           }
@@ -313,11 +328,7 @@ const fetchData = async () => {
                         />
                       </TableCell>
                       <TableCell align="center">
-                        {
-                          lotes
-                            .filter(l => l.medicamento === med.id)
-                            .reduce((sum, l) => sum + l.cantidad, 0)
-                        }
+                        {stockDisponible(med)}
                         {hasLowStock(med.id) && (
                           <Chip 
                             icon={<WarningIcon />}
@@ -409,6 +420,88 @@ const fetchData = async () => {
             </Table>
           </TableContainer>
         </TabPanel>
+        <TabPanel value={tabValue} index={2}>
+          <Typography variant="h6" gutterBottom>Stock bajo</Typography>
+          <TableContainer sx={{ mb: 3 }}>
+            <Table size="small">
+              <TableHead>
+                <TableRow>
+                  <TableCell>Medicamento</TableCell>
+                  <TableCell>Proveedor</TableCell>
+                  <TableCell align="right">Disponible</TableCell>
+                  <TableCell align="right">Vencido</TableCell>
+                  <TableCell align="right">Stock mínimo</TableCell>
+                </TableRow>
+              </TableHead>
+              <TableBody>
+                {alertas && alertas.stock_bajo.length > 0 ? (
+                  alertas.stock_bajo.map((med) => (
+                    <TableRow key={med.id} hover>
+                      <TableCell>
+                        <Link to={`/inventario/medicamentos/${med.id}`}>{med.nombre}</Link>
+                      </TableCell>
+                      <TableCell>{med.proveedor_nombre}</TableCell>
+                      <TableCell align="right">{med.stock_disponible}</TableCell>
+                      <TableCell align="right">{med.stock_vencido}</TableCell>
+                      <TableCell align="right">{med.stock_minimo}</TableCell>
+                    </TableRow>
+                  ))
+                ) : (
+                  <TableRow>
+                    <TableCell colSpan={5} align="center">No hay medicamentos con stock bajo</TableCell>
+                  </TableRow>
+                )}
+              </TableBody>
+            </Table>
+          </TableContainer>
+          
+          {[
+            { titulo: `Por vencer (próximos ${alertas?.dias ?? 30} días)`, lotes: alertas?.por_vencer ?? [], color: 'warning' as const },
+            { titulo: 'Vencidos con stock', lotes: alertas?.vencidos ?? [], color: 'error' as const }
+          ].map(({ titulo, lotes: lotesAlerta, color }) => (
+            <Box key={titulo} sx={{ mb: 3 }}>
+              <Typography variant="h6" gutterBottom>{titulo}</Typography>
+              <TableContainer>
+                <Table size="small">
+                  <TableHead>
+                    <TableRow>
+                      <TableCell>Medicamento</TableCell>
+                      <TableCell>Lote</TableCell>
+                      <TableCell>Vencimiento</TableCell>
+                      <TableCell align="right">Cantidad</TableCell>
+                    </TableRow>
+                  </TableHead>
+                  <TableBody>
+                    {lotesAlerta.length > 0 ? (
+                      lotesAlerta.map((lote) => (
+                        <TableRow key={lote.id} hover>
+                          <TableCell>{lote.medicamento_nombre}</TableCell>
+                          <TableCell>
+                            <Link to={`/inventario/lotes/${lote.id}`}>{lote.numero_lote}</Link>
+                          </TableCell>
+                          <TableCell>
+                            <Chip
+                              label={lote.dias_para_vencer !== undefined
+                                ? `${formatDate(lote.fecha_vencimiento)} (${lote.dias_para_vencer} días)`
+                                : formatDate(lote.fecha_vencimiento)}
+                              color={color}
+                              size="small"
+                            />
+                          </TableCell>
+                          <TableCell align="right">{lote.cantidad}</TableCell>
+                        </TableRow>
+                      ))
+                    ) : (
+                      <TableRow>
+                        <TableCell colSpan={4} align="center">Sin lotes</TableCell>
+                      </TableRow>
+                    )}
+                  </TableBody>
+                </Table>
+              </TableContainer>
+            </Box>
+          ))}
+        </TabPanel>
       </Paper>
       
       {/* Diálogo de entrada de inventario */}